@@ -1,6 +1,12 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo import monitoring
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from collections.abc import Hashable
+from app.utils.journal import JournalStore
+import asyncio
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,18 +14,143 @@ load_dotenv()
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "krishi")
 
+# Connection pool settings, passed straight to the Motor client
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000")),
+}
+# zlib ships with Python; snappy and zstd need python-snappy / zstandard
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
+# Indexes created at startup: collection -> [(keys, options)]
+INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], {"unique": True}),
+        ([("email", ASCENDING)], {"unique": True}),
+        ([("user_type", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("location", GEOSPHERE)], {}),
+        ([("location_updated_at", ASCENDING)], {}),
+    ],
+    "orders": [
+        ([("buyer_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "revoked_tokens": [
+        ([("digest", ASCENDING)], {"unique": True}),
+        # TTL index: a revocation is dropped once the token would have expired anyway
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "products": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("updated_at", ASCENDING)], {}),
+    ],
+    "weather_cache": [
+        ([("key", ASCENDING)], {"unique": True}),
+        # TTL index: MongoDB drops entries once expires_at has passed
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by pymongo's monitoring events"""
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        
+    def pool_created(self, event):
+        pass
+        
+    def pool_ready(self, event):
+        pass
+        
+    def pool_cleared(self, event):
+        self.pool_clears += 1
+        
+    def pool_closed(self, event):
+        pass
+        
+    def connection_created(self, event):
+        self.created += 1
+        self.open += 1
+        
+    def connection_ready(self, event):
+        pass
+        
+    def connection_closed(self, event):
+        self.closed += 1
+        self.open = max(0, self.open - 1)
+        
+    def connection_check_out_started(self, event):
+        pass
+        
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+        
+    def connection_checked_in(self, event):
+        self.checked_out = max(0, self.checked_out - 1)
+        
+    def snapshot(self):
+        max_size = POOL_OPTIONS["maxPoolSize"]
+        return {
+            **POOL_OPTIONS,
+            "compressors": MONGO_COMPRESSORS,
+            "open_connections": self.open,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "utilization": round(self.checked_out / max_size, 3) if max_size else None,
+            "connections_created": self.created,
+            "connections_closed": self.closed,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "pool_clears": self.pool_clears
+        }
+
+pool_stats = PoolStats()
+
 client: AsyncIOMotorClient = None
 database = None
 
+async def ensure_indexes(db):
+    """Create the indexes in INDEXES; existing ones are left untouched"""
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection_name].create_index(keys, **options)
+            except PyMongoError as e:
+                print(f"⚠️ Could not create index {keys} on {collection_name}: {e}")
+
 async def connect_to_mongo():
     global client, database
     try:
-        client = AsyncIOMotorClient(MONGODB_URL)
+        client = AsyncIOMotorClient(
+            MONGODB_URL,
+            compressors=MONGO_COMPRESSORS or None,
+            event_listeners=[pool_stats],
+            **POOL_OPTIONS
+        )
         database = client[DATABASE_NAME]
         # Test connection
         await client.admin.command('ping')
         print(f"✅ Connected to MongoDB at {MONGODB_URL}")
         print(f"📊 Using database: {DATABASE_NAME}")
+        await ensure_indexes(database)
+        print("🗂️ Database indexes ready")
     except Exception as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
         print("🔧 Starting without database - some features may not work")
@@ -31,81 +162,349 @@ async def close_mongo_connection():
     if client:
         client.close()
         print("Disconnected from MongoDB")
+    # Flush and compact any mock collection journals
+    await asyncio.get_running_loop().run_in_executor(None, JournalStore.close_all)
+
+_mock_database = None
+_mock_database_lock = threading.Lock()
 
 def get_database():
     if database is None:
-        # Return a mock database for basic functionality
-        print("⚠️ Database not available, using persistent mock data")
-        return MockDatabase()
+        # Return the process-wide mock database for basic functionality
+        return get_mock_database()
     return database
 
+def get_mock_database():
+    """Lazily create the single MockDatabase shared by every request"""
+    global _mock_database
+    if _mock_database is None:
+        with _mock_database_lock:
+            if _mock_database is None:
+                print("⚠️ Database not available, using persistent mock data")
+                _mock_database = MockDatabase()
+    return _mock_database
+
+async def get_database_stats(db):
+    """Connection pool and per-index usage statistics"""
+    if isinstance(db, MockDatabase):
+        return {
+            "backend": "mock",
+            "collections": {name: collection.index_stats() for name, collection in db.collections.items()}
+        }
+    collections = {}
+    for collection_name in INDEXES:
+        try:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        except PyMongoError as e:
+            collections[collection_name] = {"error": str(e)}
+            continue
+        collections[collection_name] = {
+            "indexes": {
+                stat["name"]: {
+                    "key": dict(stat.get("key", {})),
+                    "accesses": stat.get("accesses", {}).get("ops", 0),
+                    "since": stat.get("accesses", {}).get("since")
+                }
+                for stat in stats
+            }
+        }
+    return {"backend": "mongodb", "pool": pool_stats.snapshot(), "collections": collections}
+
 class MockDatabase:
     """Mock database for when MongoDB is not available"""
     def __init__(self):
-        self.users = MockCollection()
+        self.collections = {}
         
-class MockCollection:
-    """Mock collection that simulates database operations with persistent storage"""
-    def __init__(self):
-        self._data = {}
-        self._load_data()
+    def __getitem__(self, name):
+        collection = self.collections.get(name)
+        if collection is None:
+            # Collections are created on first use, with the same indexes as MongoDB
+            collection = MockCollection(f'mock_{name}.json')
+            for keys, options in INDEXES.get(name, []):
+                collection.declare_compound_index(keys, **options)
+            self.collections[name] = collection
+        return collection
         
-    def _load_data(self):
-        """Load data from file if exists"""
-        try:
-            import json
-            with open('mock_users.json', 'r') as f:
-                self._data = json.load(f)
-        except:
-            self._data = {}
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'collections':
+            raise AttributeError(name)
+        return self[name]
+
+class _HashIndex:
+    """Equality index: field value -> ids of documents holding it"""
+    def __init__(self, field, unique=False):
+        self.field = field
+        self.unique = unique
+        self.entries = {}
+        self.hits = 0
+        
+    def add(self, doc_id, doc):
+        value = doc.get(self.field) if isinstance(doc, dict) else None
+        if value is not None and isinstance(value, Hashable):
+            self.entries.setdefault(value, set()).add(doc_id)
             
-    def _save_data(self):
-        """Save data to file"""
+    def remove(self, doc_id, doc):
+        value = doc.get(self.field) if isinstance(doc, dict) else None
+        if value is not None and isinstance(value, Hashable):
+            ids = self.entries.get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.entries[value]
+                    
+    def lookup(self, value):
+        return self.entries.get(value, ())
+        
+def _comparable(value):
+    # ObjectIds come back from the journal as hex strings, which sort the same way
+    return str(value) if type(value).__name__ == 'ObjectId' else value
+    
+_OPERATORS = {
+    '$gt': lambda a, b: a > b,
+    '$gte': lambda a, b: a >= b,
+    '$lt': lambda a, b: a < b,
+    '$lte': lambda a, b: a <= b,
+    '$ne': lambda a, b: a != b,
+}
+
+def _field_matches(actual, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for op, operand in condition.items():
+            if op == '$in':
+                if _comparable(actual) not in [_comparable(v) for v in operand]:
+                    return False
+                continue
+            if actual is None and op != '$ne':
+                return False
+            try:
+                if not _OPERATORS[op](_comparable(actual), _comparable(operand)):
+                    return False
+            except TypeError:
+                return False
+        return True
+    return actual == condition
+    
+class MockCursor:
+    """Subset of Motor's cursor API over the documents matching a query"""
+    def __init__(self, collection, query, projection=None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = 0
+        self._results = None
+        
+    def sort(self, key, direction=1):
+        self._sort = list(key) if isinstance(key, list) else [(key, direction)]
+        return self
+        
+    def skip(self, count):
+        self._skip = count
+        return self
+        
+    def limit(self, count):
+        self._limit = count
+        return self
+        
+    def batch_size(self, count):
+        # Everything is in memory already; kept for API compatibility
+        self._batch_size = count
+        return self
+        
+    def _project(self, doc):
+        if not self._projection:
+            return doc
+        included = {field for field, keep in self._projection.items() if keep}
+        if included:
+            if self._projection.get('_id', 1):
+                included.add('_id')
+            return {field: doc[field] for field in doc if field in included}
+        return {field: value for field, value in doc.items() if field not in self._projection}
+        
+    def _run(self):
+        docs = [doc for _, doc in self._collection._candidates(self._query)]
+        for field, direction in reversed(self._sort):
+            # Missing fields sort first, like MongoDB's null ordering
+            docs.sort(key=lambda doc: (doc.get(field) is not None, _comparable(doc.get(field))), reverse=direction < 0)
+        end = self._skip + self._limit if self._limit else None
+        return iter([self._project(doc) for doc in docs[self._skip:end]])
+        
+    def __aiter__(self):
+        return self
+        
+    async def __anext__(self):
+        if self._results is None:
+            self._results = self._run()
         try:
-            import json
-            with open('mock_users.json', 'w') as f:
-                json.dump(self._data, f, default=str)
-        except:
-            pass
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration
+            
+    async def to_list(self, length=None):
+        docs = []
+        async for doc in self:
+            docs.append(doc)
+            if length and len(docs) >= length:
+                break
+        return docs
+        
+class MockCollection:
+    """Mock collection that simulates database operations with persistent storage"""
+    def __init__(self, path='mock_users.json'):
+        # Writes are journaled by a background thread (see app.utils.journal)
+        self._store = JournalStore.open(path)
+        self._indexes = {}
+        self.scans = 0
+        self._store.subscribe(self._on_change)
+        
+    @property
+    def _data(self):
+        return self._store.data
+        
+    def declare_compound_index(self, keys, unique=False, **options):
+        """Mirror a MongoDB index definition; only single-field ones are used for lookups"""
+        if isinstance(keys, str):
+            keys = [(keys, ASCENDING)]
+        if len(keys) == 1 and keys[0][1] in (ASCENDING, DESCENDING):
+            self.declare_index(keys[0][0], unique)
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+        
+    async def create_index(self, keys, unique=False, **options):
+        """Same signature as Motor's create_index"""
+        return self.declare_compound_index(keys, unique, **options)
+        
+    def declare_index(self, field, unique=False):
+        """Create a hash index on field, built from the current documents"""
+        if field in self._indexes:
+            self._indexes[field].unique = self._indexes[field].unique or unique
+            return
+        index = _HashIndex(field, unique)
+        for doc_id, doc in self._data.items():
+            index.add(doc_id, doc)
+        self._indexes[field] = index
+        
+    def _on_change(self, doc_id, old, new):
+        for index in self._indexes.values():
+            if old is not None:
+                index.remove(doc_id, old)
+            if new is not None:
+                index.add(doc_id, new)
+                
+    @staticmethod
+    def _matches(doc, query):
+        return isinstance(doc, dict) and all(_field_matches(doc.get(key), value) for key, value in query.items())
+        
+    def _plan(self, query):
+        """Pick the most selective index usable for query, or None to scan"""
+        best = None
+        for key, value in query.items():
+            index = self._indexes.get(key)
+            if index is None or value is None or not isinstance(value, Hashable):
+                continue
+            size = len(index.lookup(value))
+            if best is None or (index.unique, -size) > (best[0].unique, -best[2]):
+                best = (index, value, size)
+        return best
+        
+    def _candidates(self, query):
+        """Yield (id, doc) pairs matching query, through an index when possible"""
+        # Apply whatever other worker processes appended to the journal
+        self._store.refresh()
+        plan = self._plan(query) if query else None
+        if plan is None:
+            self.scans += 1
+            items = list(self._data.items())
+        else:
+            index, value, _ = plan
+            index.hits += 1
+            items = [(doc_id, self._data[doc_id]) for doc_id in sorted(index.lookup(value))]
+        for doc_id, doc in items:
+            if self._matches(doc, query):
+                yield doc_id, doc
+                
+    def _first(self, query):
+        """Return (id, doc) of the first document matching query"""
+        return next(self._candidates(query), (None, None))
+        
+    def _check_unique(self, doc, doc_id=None):
+        for field, index in self._indexes.items():
+            value = doc.get(field)
+            if not index.unique or value is None or not isinstance(value, Hashable):
+                continue
+            if any(other != doc_id for other in index.lookup(value)):
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {field}_1 dup key: {{{field}: {value!r}}}")
+                
+    def index_stats(self):
+        """Usage counters for the collection's indexes"""
+        return {
+            "indexes": {
+                field: {"unique": index.unique, "keys": len(index.entries), "hits": index.hits}
+                for field, index in self._indexes.items()
+            },
+            "collection_scans": self.scans,
+            "documents": len(self._data)
+        }
         
     async def find_one(self, query):
         """Find one document matching query"""
-        for doc in self._data.values():
-            if isinstance(doc, dict):
-                if 'username' in query and doc.get('username') == query['username']:
-                    return doc
-                if 'email' in query and doc.get('email') == query['email']:
-                    return doc
-        return None
-        
-    async def find(self, query=None):
-        """Find all documents matching query"""
-        if query is None:
-            return list(self._data.values())
-        results = []
-        for doc in self._data.values():
-            if isinstance(doc, dict):
-                match = True
-                for key, value in query.items():
-                    if doc.get(key) != value:
-                        match = False
-                        break
-                if match:
-                    results.append(doc)
-        return results
+        return self._first(query)[1]
+        
+    def find(self, query=None, projection=None):
+        """Cursor over the documents matching query"""
+        return MockCursor(self, query or {}, projection)
         
     async def insert_one(self, document):
         from bson import ObjectId
+        self._store.refresh()
+        self._check_unique(document)
         doc_id = ObjectId()
         document['_id'] = doc_id
-        self._data[str(doc_id)] = document
-        self._save_data()
+        await asyncio.wrap_future(self._store.put(str(doc_id), document))
         return type('MockResult', (), {'inserted_id': doc_id})()
         
-    async def update_one(self, query, update):
-        self._save_data()
-        return type('MockResult', (), {'modified_count': 1})()
+    async def insert_many(self, documents):
+        from bson import ObjectId
+        self._store.refresh()
+        ids = []
+        futures = []
+        for document in documents:
+            self._check_unique(document)
+            document['_id'] = ObjectId()
+            ids.append(document['_id'])
+            futures.append(self._store.put(str(document['_id']), document))
+        # Submitted together, so the journal commits them in one batch
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return type('MockResult', (), {'inserted_ids': ids})()
+        
+    async def update_one(self, query, update, upsert=False):
+        doc_id, doc = self._first(query)
+        if doc is None:
+            if upsert:
+                # Like MongoDB, the inserted document includes the query's equality fields
+                fields = {key: value for key, value in query.items() if not isinstance(value, dict)}
+                result = await self.insert_one({**fields, **update.get('$set', update)})
+                return type('MockResult', (), {'matched_count': 0, 'modified_count': 0, 'upserted_id': result.inserted_id})()
+            return type('MockResult', (), {'matched_count': 0, 'modified_count': 0})()
+        # Copy on write so snapshots never see a half-applied update
+        updated = {**doc, **update.get('$set', {})} if '$set' in update else {'_id': doc.get('_id'), **update}
+        self._check_unique(updated, doc_id)
+        await asyncio.wrap_future(self._store.put(doc_id, updated))
+        return type('MockResult', (), {'matched_count': 1, 'modified_count': int(updated != doc)})()
+        
+    async def replace_one(self, query, replacement, upsert=False):
+        return await self.update_one(query, replacement, upsert)
         
     async def delete_one(self, query):
-        self._save_data()
-        return type('MockResult', (), {'deleted_count': 1})()
\ No newline at end of file
+        doc_id, doc = self._first(query)
+        if doc is None:
+            return type('MockResult', (), {'deleted_count': 0})()
+        await asyncio.wrap_future(self._store.delete(doc_id))
+        return type('MockResult', (), {'deleted_count': 1})()
+        
+    async def delete_many(self, query):
+        doc_ids = [doc_id for doc_id, _ in self._candidates(query)]
+        # Submitted together, so the journal commits them in one batch
+        await asyncio.gather(*(asyncio.wrap_future(self._store.delete(doc_id)) for doc_id in doc_ids))
+        return type('MockResult', (), {'deleted_count': len(doc_ids)})()
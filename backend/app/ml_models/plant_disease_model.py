@@ -1,7 +1,14 @@
 import random
 import io
+import os
 from typing import Dict, List
 
+from app.utils.workers import BoundedExecutor
+
+IMAGE_ANALYSIS_WORKERS = int(os.getenv("IMAGE_ANALYSIS_WORKERS", str(min(2, os.cpu_count() or 1))))
+IMAGE_ANALYSIS_MAX_QUEUE = int(os.getenv("IMAGE_ANALYSIS_MAX_QUEUE", "8"))
+IMAGE_ANALYSIS_TIMEOUT = float(os.getenv("IMAGE_ANALYSIS_TIMEOUT", "20"))
+
 try:
     import numpy as np
     import cv2
@@ -128,4 +135,22 @@ class PlantDiseaseDetector:
                 'model_type': 'error_fallback'
             }
 
-plant_disease_model = PlantDiseaseDetector()
\ No newline at end of file
+plant_disease_model = PlantDiseaseDetector()
+
+# Decode, resize, color conversion and edge detection are CPU bound and hold
+# the GIL, so they run in worker processes. Spawned rather than forked, since
+# the server process has live threads and sockets.
+image_pool = BoundedExecutor("image-analysis", IMAGE_ANALYSIS_WORKERS, IMAGE_ANALYSIS_MAX_QUEUE,
+                             use_processes=True, start_method="spawn")
+
+def analyze_image(image_bytes: bytes, crop_type: str = 'tomato') -> Dict:
+    """Module-level entry point, so the call can be sent to a worker process"""
+    return plant_disease_model.analyze_image(image_bytes, crop_type)
+
+async def analyze_image_async(image_bytes: bytes, crop_type: str = 'tomato') -> Dict:
+    """analyze_image on the image worker pool
+
+    Raises PoolSaturated when the queue is full and asyncio.TimeoutError
+    after IMAGE_ANALYSIS_TIMEOUT seconds.
+    """
+    return await image_pool.run(analyze_image, image_bytes, crop_type, timeout=IMAGE_ANALYSIS_TIMEOUT)
\ No newline at end of file
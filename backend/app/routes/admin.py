@@ -1,77 +1,112 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.utils.auth import verify_token
-from app.database import get_database
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from app.utils.auth import require_admin
+from app.utils.user_export import list_users, export_users
+from app.database import get_database, get_database_stats
+from app.utils.stats import platform_stats
+from app.utils.rollups import get_rollups, month_label, state_of, ALL_STATES, UNKNOWN_STATE
+from app.utils.response_cache import response_cache
+from typing import Optional
 import random
 
 router = APIRouter()
 
+def _growth_rate(previous: float, current: float) -> str:
+    if not previous:
+        return "+0%" if not current else "+100%"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
 @router.get("/stats")
-async def get_admin_stats():
-    """Enhanced admin dashboard statistics with sustainability metrics"""
+async def get_admin_stats(admin: dict = Depends(require_admin)):
+    """Enhanced admin dashboard statistics with sustainability metrics - Admin only"""
     
-    # Core metrics
-    total_users = random.randint(1200, 2500)
-    total_farmers = random.randint(800, 1500)
-    total_consumers = random.randint(400, 1000)
-    total_orders = random.randint(500, 1200)
-    total_revenue = random.randint(150000, 350000)
+    # Core metrics, maintained incrementally by registrations, logins, orders and listings
+    stats = platform_stats.snapshot()
+    orders = stats["orders"]
+    today = stats["today"]
     
-    # Sustainability metrics
-    carbon_saved = random.randint(2500, 5000)  # kg CO2
-    water_saved = random.randint(50000, 120000)  # liters
-    organic_percentage = random.randint(65, 85)
-    local_sourcing_percentage = random.randint(70, 90)
+    # Growth curves and regional totals come from the rollup store
+    rollups = get_rollups()
+    monthly = rollups.series("month", 4)
+    previous_month, this_month = monthly[-2][1], monthly[-1][1]
+    by_state = rollups.totals_by_state("month")
+    top_states = sorted(
+        (state for state in by_state if state != UNKNOWN_STATE),
+        key=lambda state: (by_state[state]["orders"], by_state[state]["farmers"]),
+        reverse=True
+    )[:4]
     
     return {
         "user_metrics": {
-            "total_users": total_users,
-            "total_farmers": total_farmers,
-            "total_consumers": total_consumers,
-            "active_users_today": random.randint(150, 300),
-            "new_registrations_today": random.randint(15, 45),
-            "user_growth_rate": f"+{random.randint(12, 25)}%"
+            "total_users": stats["total_users"],
+            "total_farmers": stats["users"].get("farmer", 0),
+            "total_consumers": stats["users"].get("consumer", 0),
+            "active_users_today": stats["active_users_today"],
+            "new_registrations_today": int(today.get("registrations", 0)),
+            "user_growth_rate": _growth_rate(previous_month["users"], this_month["users"])
         },
         "business_metrics": {
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "orders_today": random.randint(25, 75),
-            "revenue_today": random.randint(5000, 15000),
-            "avg_order_value": round(total_revenue / total_orders, 2),
-            "revenue_growth_rate": f"+{random.randint(18, 35)}%"
+            "total_orders": int(orders.get("count", 0)),
+            "total_revenue": round(orders.get("revenue", 0), 2),
+            "orders_today": int(today.get("orders", 0)),
+            "revenue_today": round(today.get("revenue", 0), 2),
+            "avg_order_value": stats["avg_order_value"],
+            "revenue_growth_rate": _growth_rate(previous_month["revenue"], this_month["revenue"])
         },
         "sustainability_metrics": {
-            "total_carbon_saved_kg": carbon_saved,
-            "total_water_saved_liters": water_saved,
-            "organic_products_percentage": organic_percentage,
-            "local_sourcing_percentage": local_sourcing_percentage,
-            "farmers_supported": random.randint(450, 800),
-            "avg_delivery_distance_km": random.randint(15, 35),
-            "sustainability_score": random.randint(85, 95)
+            "total_carbon_saved_kg": round(orders.get("carbon_saved_kg", 0), 2),
+            "organic_products_percentage": stats["organic_percentage"],
+            "local_sourcing_percentage": stats["local_sourcing_percentage"],
+            "farmers_supported": stats["farmers_supported"],
+            "avg_delivery_distance_km": stats["avg_delivery_distance_km"]
         },
+        # Response times and uptime are those of the worker process answering
         "platform_health": {
-            "api_uptime_percentage": 99.8,
-            "avg_response_time_ms": random.randint(150, 350),
-            "active_listings": random.randint(2500, 4500),
-            "successful_deliveries_percentage": random.randint(92, 98)
+            "uptime_seconds": stats["uptime_seconds"],
+            "avg_response_time_ms": stats["avg_response_time_ms"],
+            "active_listings": stats["listings"]
         },
+        "stats_reconciled_at": stats["reconciled_at"],
         "regional_data": {
             "top_states": [
-                {"state": "Punjab", "farmers": random.randint(150, 250), "orders": random.randint(200, 350)},
-                {"state": "Haryana", "farmers": random.randint(120, 200), "orders": random.randint(150, 280)},
-                {"state": "UP", "farmers": random.randint(180, 300), "orders": random.randint(220, 400)},
-                {"state": "Maharashtra", "farmers": random.randint(100, 180), "orders": random.randint(130, 250)}
+                {"state": state, "farmers": int(by_state[state]["farmers"]), "orders": int(by_state[state]["orders"])}
+                for state in top_states
             ]
         },
         "trends": {
             "monthly_growth": [
-                {"month": "Jan", "users": random.randint(100, 200), "orders": random.randint(50, 120)},
-                {"month": "Feb", "users": random.randint(120, 220), "orders": random.randint(60, 140)},
-                {"month": "Mar", "users": random.randint(140, 250), "orders": random.randint(70, 160)},
-                {"month": "Apr", "users": random.randint(160, 280), "orders": random.randint(80, 180)}
+                {"month": month_label(bucket), "users": int(totals["users"]), "orders": int(totals["orders"])}
+                for bucket, totals in monthly
             ]
         }
     }
 
+@router.get("/trends")
+async def get_trends(
+    resolution: str = Query("day", pattern="^(minute|hour|day|month)$"),
+    periods: int = Query(30, ge=1, le=1440),
+    state: Optional[str] = None,
+    admin: dict = Depends(require_admin)
+):
+    """Registrations, orders and revenue per time bucket, optionally for one state - Admin only"""
+    # Abbreviations and cities are accepted, e.g. UP or Bangalore
+    state = state_of(state) if state else ALL_STATES
+    series = get_rollups().series(resolution, periods, state)
+    return {
+        "resolution": resolution,
+        "state": state,
+        "series": [{"bucket": bucket, **totals} for bucket, totals in series]
+    }
+
+@router.get("/db-stats")
+async def get_db_stats(admin: dict = Depends(require_admin)):
+    """Database connection pool utilization and index usage - Admin only"""
+    return await get_database_stats(get_database())
+
+@router.get("/cache-stats")
+async def get_cache_stats(admin: dict = Depends(require_admin)):
+    """Response cache hit ratio, size and invalidations - Admin only"""
+    return response_cache.metrics()
+
 @router.get("/users")
 async def get_users_list(page: int = 1, limit: int = 10):
     """Get paginated users list"""
@@ -96,27 +131,24 @@ async def get_users_list(page: int = 1, limit: int = 10):
     }
 
 @router.get("/all-users")
-async def get_all_users():
-    """Get all users for admin"""
+async def get_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    admin: dict = Depends(require_admin)
+):
+    """Get all users - Admin only; page with limit/after or stream with format=ndjson|csv"""
     try:
         db = get_database()
         
         # Try to get from database first
         if hasattr(db, 'users'):
-            users = await db.users.find({})
-            user_list = []
-            for user in users:
-                user_data = {
-                    "id": str(user.get("_id", "")),
-                    "username": user.get("username", ""),
-                    "email": user.get("email", ""),
-                    "full_name": user.get("full_name", ""),
-                    "user_type": user.get("user_type", ""),
-                    "phone": user.get("phone", ""),
-                    "created_at": user.get("created_at", ""),
-                    "is_active": user.get("is_active", True)
-                }
-                user_list.append(user_data)
+            if format:
+                return export_users(db, format, after, limit)
+            user_list, next_cursor = await list_users(db, limit, after)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
             return user_list
         else:
             # Return mock data if database not available
@@ -142,6 +174,8 @@ async def get_all_users():
                     "is_active": True
                 }
             ]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_all_users: {str(e)}")
         # Return mock data on error
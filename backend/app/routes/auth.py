@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Form
+from fastapi import APIRouter, HTTPException, Depends, status, Form, Query, Response
 from fastapi.security import HTTPBearer
 from datetime import datetime, timedelta
+from typing import Optional
 from app.schemas.user import UserCreate, UserResponse, Token
-from app.utils.auth import get_password_hash, verify_password, create_access_token, verify_token
+from app.utils.auth import get_password_hash_async, verify_password_async, create_access_token, verify_token, revoke_token, password_pool, token_cache, require_admin
+from app.utils.user_cache import user_cache
+from app.utils.user_export import list_users, export_users
+from app.utils.stats import platform_stats
+from app.utils.rollups import get_rollups
 from app.database import get_database
 from bson import ObjectId
 import logging
@@ -37,13 +42,14 @@ async def register_user(user: UserCreate):
                 raise HTTPException(status_code=400, detail="Email already registered. Please use a different email or login with existing account.")
         
         # Create user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         user_doc = {
             "username": user.username.strip(),
             "email": user.email.strip().lower(),
             "full_name": user.full_name.strip(),
             "user_type": user.user_type,
             "phone": getattr(user, 'phone', None),
+            "state": user.state,
             "hashed_password": hashed_password,
             "created_at": datetime.utcnow(),
             "is_active": True
@@ -51,6 +57,13 @@ async def register_user(user: UserCreate):
         
         print(f"✅ Creating user: {user_doc['username']}")
         result = await db.users.insert_one(user_doc)
+        # Drop any cached "unknown user" entry for this name
+        user_cache.invalidate(user_doc["username"])
+        user_cache.invalidate(user.username)
+        platform_stats.record_registration(user_doc["user_type"])
+        get_rollups().ingest(user_doc["state"], user_doc["created_at"], users=1,
+                       farmers=int(user_doc["user_type"] == "farmer"),
+                       consumers=int(user_doc["user_type"] == "consumer"))
         print(f"🎉 User created successfully with ID: {result.inserted_id}")
         
         return {
@@ -91,7 +104,7 @@ async def login_user(username: str = Form(), password: str = Form()):
             raise HTTPException(status_code=401, detail="Username not found. Please register first.")
         
         # Verify password
-        if not verify_password(password, user["hashed_password"]):
+        if not await verify_password_async(password, user["hashed_password"]):
             print(f"❌ Login failed: Incorrect password for user {username}")
             raise HTTPException(status_code=401, detail="Incorrect password. Please try again.")
         
@@ -107,6 +120,7 @@ async def login_user(username: str = Form(), password: str = Form()):
             expires_delta=access_token_expires
         )
         
+        platform_stats.record_login(user["username"])
         print(f"✅ Login successful for user: {username}")
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
@@ -117,10 +131,10 @@ async def login_user(username: str = Form(), password: str = Form()):
 
 @router.get("/profile", response_model=dict)
 async def get_user_profile(token: str = Depends(security)):
-    username = verify_token(token.credentials)
+    username = await verify_token(token.credentials)
     db = get_database()
     
-    user = await db.users.find_one({"username": username})
+    user = await user_cache.get(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -134,33 +148,34 @@ async def get_user_profile(token: str = Depends(security)):
     }
 
 @router.get("/users", response_model=list)
-async def get_all_users(token: str = Depends(security)):
-    """Get all registered users - Admin only"""
+async def get_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    token: str = Depends(security)
+):
+    """Get all registered users - Admin only
+    
+    Pass limit (and after= the X-Next-Cursor header) to page, or format=ndjson|csv to stream an export.
+    """
     try:
         # Verify token and get current user
-        username = verify_token(token.credentials)
+        username = await verify_token(token.credentials)
         db = get_database()
         
         # Check if current user is admin
-        current_user = await db.users.find_one({"username": username})
+        current_user = await user_cache.get(db, username)
         if not current_user or current_user.get("user_type") != "admin":
             raise HTTPException(status_code=403, detail="Access denied. Admin privileges required.")
         
-        users = await db.users.find({})
+        if format:
+            print(f"📤 Admin {username} exporting users as {format}")
+            return export_users(db, format, after, limit)
         
-        user_list = []
-        for user in users:
-            user_data = {
-                "id": str(user.get("_id", "")),
-                "username": user.get("username", ""),
-                "email": user.get("email", ""),
-                "full_name": user.get("full_name", ""),
-                "user_type": user.get("user_type", ""),
-                "phone": user.get("phone", ""),
-                "created_at": user.get("created_at", ""),
-                "is_active": user.get("is_active", True)
-            }
-            user_list.append(user_data)
+        user_list, next_cursor = await list_users(db, limit, after)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         print(f"📊 Admin {username} retrieved {len(user_list)} users")
         return user_list
@@ -172,7 +187,7 @@ async def get_all_users(token: str = Depends(security)):
 
 @router.put("/profile", response_model=dict)
 async def update_user_profile(full_name: str = None, email: str = None, token: str = Depends(security)):
-    username = verify_token(token.credentials)
+    username = await verify_token(token.credentials)
     db = get_database()
     
     update_data = {}
@@ -183,5 +198,22 @@ async def update_user_profile(full_name: str = None, email: str = None, token: s
     
     if update_data:
         await db.users.update_one({"username": username}, {"$set": update_data})
+        user_cache.invalidate(username)
     
-    return {"message": "Profile updated successfully"}
\ No newline at end of file
+    return {"message": "Profile updated successfully"}
+
+@router.post("/logout", response_model=dict)
+async def logout_user(token: str = Depends(security)):
+    """Revoke the current access token"""
+    username = await revoke_token(token.credentials)
+    print(f"👋 User logged out: {username}")
+    return {"message": "Logged out successfully", "success": True}
+
+@router.get("/metrics", response_model=dict)
+async def get_auth_metrics(admin: dict = Depends(require_admin)):
+    """Runtime metrics for the authentication service - Admin only"""
+    return {
+        "password_pool": password_pool.metrics(),
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats()
+    }
@@ -1,54 +1,127 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.utils.geo import GeoGridIndex, CoalescingUpdates, distance_matrix, haversine_km, nearest_in_matrix
+from app.utils.auth import get_current_user
+from app.database import get_database
+import numpy as np
+import asyncio
 import random
-import math
+import time
+import os
 
 router = APIRouter()
 
-# Mock users data with locations
+# Mock users data with locations; ids are strings like the usernames of real users,
+# prefixed so that no real username can collide with them
 MOCK_USERS = [
-    {"id": 1, "name": "Ram Singh", "type": "farmer", "lat": 28.6139, "lng": 77.2090, "city": "Delhi", "crops": ["Wheat", "Rice"]},
-    {"id": 2, "name": "Shyam Kumar", "type": "consumer", "lat": 28.6200, "lng": 77.2100, "city": "Delhi", "interests": ["Organic", "Fresh"]},
-    {"id": 3, "name": "Gita Devi", "type": "farmer", "lat": 28.6000, "lng": 77.2000, "city": "Delhi", "crops": ["Vegetables", "Fruits"]},
-    {"id": 4, "name": "Mohan Lal", "type": "consumer", "lat": 28.6300, "lng": 77.2200, "city": "Delhi", "interests": ["Local", "Seasonal"]},
-    {"id": 5, "name": "Priya Sharma", "type": "farmer", "lat": 28.5900, "lng": 77.1900, "city": "Delhi", "crops": ["Organic Vegetables"]},
+    {"id": "mock-1", "name": "Ram Singh", "type": "farmer", "lat": 28.6139, "lng": 77.2090, "city": "Delhi", "crops": ["Wheat", "Rice"]},
+    {"id": "mock-2", "name": "Shyam Kumar", "type": "consumer", "lat": 28.6200, "lng": 77.2100, "city": "Delhi", "interests": ["Organic", "Fresh"]},
+    {"id": "mock-3", "name": "Gita Devi", "type": "farmer", "lat": 28.6000, "lng": 77.2000, "city": "Delhi", "crops": ["Vegetables", "Fruits"]},
+    {"id": "mock-4", "name": "Mohan Lal", "type": "consumer", "lat": 28.6300, "lng": 77.2200, "city": "Delhi", "interests": ["Local", "Seasonal"]},
+    {"id": "mock-5", "name": "Priya Sharma", "type": "farmer", "lat": 28.5900, "lng": 77.1900, "city": "Delhi", "crops": ["Organic Vegetables"]},
 ]
 
+# Distance matrix limits: full matrices are capped, top-k results scale further
+MAX_MATRIX_POINTS = 20000
+MAX_MATRIX_CELLS = 250000
+MAX_MATRIX_TOP_K = 100
+
+LOCATION_MAX_PENDING = int(os.getenv("LOCATION_MAX_PENDING", "1000"))
+LOCATION_SYNC_INTERVAL = float(os.getenv("LOCATION_SYNC_INTERVAL", "5"))
+# Sync overlap, covering writes whose location_updated_at lagged slightly behind a sync
+LOCATION_SYNC_SLACK = 5.0
+
+users_by_id = {user["id"]: user for user in MOCK_USERS}
+user_locations = GeoGridIndex()
+for _user in MOCK_USERS:
+    user_locations.insert(_user["id"], _user["lat"], _user["lng"])
+
+def _apply_location(user_id, lat, lng, details):
+    users_by_id[user_id] = {**users_by_id.get(user_id, {"id": user_id}), **details, "lat": lat, "lng": lng}
+
+location_updates = CoalescingUpdates(user_locations, LOCATION_MAX_PENDING, on_apply=_apply_location)
+# user id -> location_updated_at of the location last submitted to the grid
+_location_times = {}
+_locations_synced_at = 0.0
+_locations_lock = asyncio.Lock()
+
+def _user_details(user: dict) -> dict:
+    details = {"name": user.get("full_name") or user.get("username"), "type": user.get("user_type")}
+    if user.get("city"):
+        details["city"] = user["city"]
+    return details
+
+def _submit_location(user_id: str, lat: float, lng: float, details: dict, updated_at: float):
+    """Queue a move unless the grid already has a newer location for the user"""
+    if updated_at < _location_times.get(user_id, -1.0):
+        return
+    _location_times[user_id] = updated_at
+    location_updates.submit(user_id, lat, lng, details)
+
+async def sync_locations():
+    """Index locations saved since the last sync, by any worker, into this worker's grid"""
+    global _locations_synced_at
+    async with _locations_lock:
+        started = time.time()
+        if _locations_synced_at:
+            query = {"location_updated_at": {"$gte": _locations_synced_at - LOCATION_SYNC_SLACK}}
+        else:
+            query = {"location": {"$ne": None}}
+        projection = {"username": 1, "full_name": 1, "user_type": 1, "city": 1, "location": 1,
+                      "location_updated_at": 1}
+        async for user in get_database().users.find(query, projection):
+            try:
+                lng, lat = user["location"]["coordinates"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            updated_at = user.get("location_updated_at")
+            if not isinstance(updated_at, (int, float)):
+                updated_at = 0.0
+            _submit_location(user["username"], lat, lng, _user_details(user), updated_at)
+        _locations_synced_at = started
+
+async def _ensure_locations():
+    """Load saved locations on first use; run_location_sync keeps them current"""
+    if not _locations_synced_at:
+        await sync_locations()
+
+async def run_location_sync(interval: float = LOCATION_SYNC_INTERVAL):
+    """Load saved locations now, then pick up other workers' updates every ``interval`` seconds"""
+    while True:
+        try:
+            await sync_locations()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Location sync failed: {e}")
+        await asyncio.sleep(interval)
+
 def calculate_distance(lat1, lng1, lat2, lng2):
     """Calculate distance between two points in kilometers"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lng1_rad = math.radians(lng1)
-    lat2_rad = math.radians(lat2)
-    lng2_rad = math.radians(lng2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlng = lng2_rad - lng1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return haversine_km(lat1, lng1, lat2, lng2)
 
 @router.get("/nearby-users")
-async def get_nearby_users(latitude: float, longitude: float, radius: float = 50):
-    """Get nearby users within specified radius"""
+async def get_nearby_users(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius: float = Query(50, ge=0),
+    k: Optional[int] = Query(None, ge=1, le=500)
+):
+    """Get nearby users within specified radius, or only the k nearest of them"""
     try:
-        nearby_users = []
-        
-        for user in MOCK_USERS:
-            distance = calculate_distance(latitude, longitude, user["lat"], user["lng"])
-            
-            if distance <= radius:
-                user_data = {
-                    **user,
-                    "distance": round(distance, 2)
-                }
-                nearby_users.append(user_data)
+        await _ensure_locations()
+        location_updates.flush()
+        if k:
+            matches = user_locations.nearest(latitude, longitude, k, radius)
+        else:
+            matches = user_locations.within(latitude, longitude, radius)
         
-        # Sort by distance
-        nearby_users.sort(key=lambda x: x["distance"])
+        # Already sorted by distance
+        nearby_users = [
+            {**users_by_id[user_id], "distance": round(distance, 2)}
+            for distance, user_id in matches
+        ]
         
         return {
             "users": nearby_users,
@@ -60,18 +133,105 @@ async def get_nearby_users(latitude: float, longitude: float, radius: float = 50
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _parse_points(points, name: str) -> list:
+    """[(lat, lng)] from [{"lat", "lng"}], [{"latitude", "longitude"}] or [[lat, lng]]"""
+    if not isinstance(points, list) or not points:
+        raise HTTPException(status_code=422, detail=f"{name} must be a non-empty list")
+    if len(points) > MAX_MATRIX_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_MATRIX_POINTS} {name}")
+    parsed = []
+    for point in points:
+        try:
+            if isinstance(point, dict):
+                lat = float(point["lat"] if "lat" in point else point["latitude"])
+                lng = float(point["lng"] if "lng" in point else point["longitude"])
+            else:
+                lat, lng = map(float, point)
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=422, detail=f"Invalid point in {name}: {point!r}")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise HTTPException(status_code=422, detail=f"Coordinates out of range in {name}: {point!r}")
+        parsed.append((lat, lng))
+    return parsed
+
+@router.post("/distance-matrix")
+async def get_distance_matrix(request_data: dict):
+    """Distances in km between many origins and destinations, optionally only the top_k nearest per origin"""
+    origins = _parse_points(request_data.get("origins"), "origins")
+    destinations = _parse_points(request_data.get("destinations"), "destinations")
+    top_k = request_data.get("top_k")
+    
+    if top_k is not None:
+        if not isinstance(top_k, int) or not 1 <= top_k <= MAX_MATRIX_TOP_K:
+            raise HTTPException(status_code=422, detail=f"top_k must be between 1 and {MAX_MATRIX_TOP_K}")
+        indices, distances = await run_in_threadpool(nearest_in_matrix, origins, destinations, top_k)
+        distances = np.round(distances, 3)
+        return {
+            "nearest": [
+                [{"destination": int(i), "distance_km": float(d)} for i, d in zip(row_indices, row_distances)]
+                for row_indices, row_distances in zip(indices.tolist(), distances.tolist())
+            ],
+            "origins": len(origins),
+            "destinations": len(destinations),
+            "top_k": min(top_k, len(destinations))
+        }
+    
+    if len(origins) * len(destinations) > MAX_MATRIX_CELLS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Matrix larger than {MAX_MATRIX_CELLS} cells; request top_k instead"
+        )
+    
+    def compute():
+        return [row for _, block in distance_matrix(origins, destinations) for row in np.round(block, 3).tolist()]
+    
+    return {
+        "distances_km": await run_in_threadpool(compute),
+        "origins": len(origins),
+        "destinations": len(destinations)
+    }
+
 @router.post("/update-location")
-async def update_user_location(location_data: dict):
-    """Update user's location"""
+async def update_user_location(location_data: dict, user: dict = Depends(get_current_user)):
+    """Update the current user's location"""
+    user_id = user["username"]
+    claimed = location_data.get("username") or location_data.get("user_id")
+    if claimed is not None and str(claimed) != user_id:
+        raise HTTPException(status_code=403, detail="You can only update your own location")
+    lat, lng = _parse_points([location_data], "location")[0]
     try:
-        # In a real app, this would update the database
+        # Load saved locations first so they never overwrite this newer one
+        await _ensure_locations()
+        details = _user_details(user)
+        updated_at = time.time()
+        # GeoJSON point, served by the 2dsphere index on users.location; the epoch
+        # timestamp lets other workers' syncs find it. Cached profile fields are
+        # unaffected by location, so no invalidation
+        result = await get_database().users.update_one(
+            {"username": user_id},
+            {"$set": {
+                "location": {"type": "Point", "coordinates": [lng, lat]},
+                "location_updated_at": updated_at
+            }}
+        )
+        persisted = result.matched_count > 0
+        for field in ("name", "city"):
+            if location_data.get(field):
+                details[field] = location_data[field]
+        _submit_location(user_id, lat, lng, details, updated_at)
         return {
             "message": "Location updated successfully",
-            "location": location_data
+            "location": location_data,
+            "persisted": persisted
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/index-stats")
+async def get_location_index_stats():
+    """Spatial index size and update coalescing counters"""
+    return location_updates.stats()
+
 @router.get("/user-stats/{user_id}")
 async def get_user_location_stats(user_id: str):
     """Get user's location-based statistics"""
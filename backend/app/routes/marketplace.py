@@ -1,9 +1,30 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import Optional
+from datetime import date, datetime
+import asyncio
 import random
+import os
+import time
+from app.utils.catalog import CatalogEngine
+from app.utils.stats import platform_stats
+from app.utils.rollups import get_rollups, state_of, UNKNOWN_STATE
+from app.utils.response_cache import cache_response, response_cache
+from app.utils.responses import FastJSONResponse
+from app.database import get_database
+from pymongo.errors import DuplicateKeyError
+from app.schemas.marketplace import ListingCreate, ListingUpdate
+from app.utils.auth import require_seller
 
 router = APIRouter()
 
+# Product reads are cached until the next catalog write, or at most this long
+PRODUCTS_CACHE_TTL = int(os.getenv("PRODUCTS_CACHE_TTL", "60"))
+# How often each worker applies listings written by the others
+LISTING_SYNC_INTERVAL = float(os.getenv("LISTING_SYNC_INTERVAL", "5"))
+# Sync overlap, covering writes whose updated_at lagged slightly behind a sync
+LISTING_SYNC_SLACK = 5.0
+LISTING_ID_ATTEMPTS = 5
+
 # Enhanced mock products data with sustainability metrics and proper images
 MOCK_PRODUCTS = [
     # GRAINS
@@ -233,77 +254,193 @@ MOCK_PRODUCTS = [
     }
 ]
 
+# Indexed view over MOCK_PRODUCTS, built once at import. Listings created or
+# edited through the API are stored in the products collection, and every
+# worker applies them through _save_listing, which keeps both in sync.
+catalog = CatalogEngine(MOCK_PRODUCTS)
+_mock_positions = {p["id"]: i for i, p in enumerate(MOCK_PRODUCTS)}
+_listings_synced_at = 0.0
+
+MAX_BATCH_ORDERS = 1000
+
+# Listing fields and their defaults' types; string fields default to "" and numbers to 0
+LISTING_FIELDS = {
+    "name": str, "price": float, "category": str, "seller": str, "image": str,
+    "location": str, "distance_km": float, "sustainability_score": int,
+    "carbon_footprint": float, "organic": bool, "rating": float,
+    "harvest_date": str, "quantity_kg": float, "description": str
+}
+
+def _build_listing(data: ListingUpdate, base: Optional[dict] = None) -> dict:
+    """Merge validated listing fields over ``base``"""
+    listing = dict(base) if base else {field: kind() for field, kind in LISTING_FIELDS.items()}
+    if not base:
+        listing["harvest_date"] = date.today().isoformat()
+    listing.update(data.model_dump(exclude_unset=True, exclude_none=True))
+    return listing
+
+def _save_listing(product: dict):
+    """Write a listing to the catalog, mirror it into MOCK_PRODUCTS and count new ones"""
+    catalog.upsert(product)
+    position = _mock_positions.get(product["id"])
+    if position is None:
+        _mock_positions[product["id"]] = len(MOCK_PRODUCTS)
+        MOCK_PRODUCTS.append(product)
+        platform_stats.record_listing()
+    else:
+        MOCK_PRODUCTS[position] = product
+    response_cache.invalidate("catalog")
+
+async def _store_listing(product: dict, new: bool):
+    """Persist a listing; new listings get the next id the products collection accepts"""
+    db = get_database()
+    if not new:
+        await db.products.replace_one({"id": product["id"]}, {**product, "updated_at": time.time()}, upsert=True)
+        return
+    for _ in range(LISTING_ID_ATTEMPTS):
+        newest = await db.products.find({}, {"id": 1}).sort("id", -1).limit(1).to_list(1)
+        product["id"] = max([p["id"] for p in MOCK_PRODUCTS] + [doc["id"] for doc in newest]) + 1
+        try:
+            # The unique index on id settles races between workers
+            await db.products.insert_one({**product, "updated_at": time.time()})
+            return
+        except DuplicateKeyError:
+            continue
+    raise HTTPException(status_code=503, detail="Could not allocate a product id. Please try again.")
+
+async def sync_listings():
+    """Apply listings stored since the last sync, by any worker, to this worker's catalog"""
+    global _listings_synced_at
+    started = time.time()
+    query = {"updated_at": {"$gte": _listings_synced_at - LISTING_SYNC_SLACK}} if _listings_synced_at else {}
+    async for doc in get_database().products.find(query, {"_id": 0, "updated_at": 0}):
+        if catalog.get(doc["id"]) != doc:
+            _save_listing(doc)
+    _listings_synced_at = started
+
+async def run_listing_sync(interval: float = LISTING_SYNC_INTERVAL):
+    """Load stored listings now, then pick up other workers' writes every ``interval`` seconds"""
+    while True:
+        try:
+            await sync_listings()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Listing sync failed: {e}")
+        await asyncio.sleep(interval)
+
+def _parse_fields(fields: Optional[str]) -> Optional[list]:
+    """Validate a comma-separated ``fields`` projection"""
+    if not fields:
+        return None
+    projection = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in projection if f != "id" and f not in LISTING_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}")
+    return projection
+
 @router.get("/products")
+@cache_response(ttl=PRODUCTS_CACHE_TTL, tags=("catalog",))
 async def get_products(
     category: Optional[str] = None, 
     search: Optional[str] = None,
     organic_only: bool = False,
     max_distance: Optional[int] = None,
     sort_by: str = "name",
-    min_sustainability: Optional[int] = None
+    min_sustainability: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Enhanced product search with sustainability filters"""
-    products = MOCK_PRODUCTS.copy()
-    
-    # Apply filters
-    if category:
-        products = [p for p in products if p["category"] == category]
-    
-    if search:
-        products = [p for p in products if search.lower() in p["name"].lower() or search.lower() in p["description"].lower()]
+    """Enhanced product search with sustainability filters
     
-    if organic_only:
-        products = [p for p in products if p["organic"]]
-    
-    if max_distance:
-        products = [p for p in products if p["distance_km"] <= max_distance]
+    Pass ``limit`` to page through results; each page returns a
+    ``next_cursor`` to send back as ``cursor`` for the following page.
+    ``fields`` is a comma-separated list of product fields to return.
+    """
+    filters = {
+        "category": category,
+        "search": search,
+        "organic_only": organic_only,
+        "max_distance": max_distance,
+        "min_sustainability": min_sustainability
+    }
+    projection = _parse_fields(fields)
+    bits, scores = catalog.match(**filters)
     
-    if min_sustainability:
-        products = [p for p in products if p["sustainability_score"] >= min_sustainability]
+    after = None
+    if cursor:
+        try:
+            after = catalog.decode_cursor(cursor, sort_by, scores)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    # Sort products
-    if sort_by == "price_low":
-        products.sort(key=lambda x: x["price"])
-    elif sort_by == "price_high":
-        products.sort(key=lambda x: x["price"], reverse=True)
-    elif sort_by == "distance":
-        products.sort(key=lambda x: x["distance_km"])
-    elif sort_by == "sustainability":
-        products.sort(key=lambda x: x["sustainability_score"], reverse=True)
-    elif sort_by == "rating":
-        products.sort(key=lambda x: x["rating"], reverse=True)
-    elif sort_by == "freshness":
-        products.sort(key=lambda x: x["harvest_date"], reverse=True)
+    # Fetch one extra slot to know whether another page follows
+    slots = catalog.ordered(bits, sort_by, scores, after=after, limit=limit + 1 if limit else None)
+    next_cursor = None
+    if limit and len(slots) > limit:
+        slots = slots[:limit]
+        next_cursor = catalog.encode_cursor(slots[-1], sort_by, scores)
     
-    # Calculate total carbon savings
-    total_carbon_saved = sum(2.5 - p["carbon_footprint"] for p in products if p["carbon_footprint"] < 2.5)
+    products = catalog.products_at(slots)
+    if projection:
+        products = [{field: p[field] for field in projection} for p in products]
     
-    return {
+    # Listings hold only JSON types, so skip FastAPI's per-value jsonable_encoder pass
+    return FastJSONResponse({
         "products": products,
-        "total_products": len(products),
+        "total_products": bits.bit_count(),
+        "next_cursor": next_cursor,
         "filters_applied": {
             "category": category,
             "organic_only": organic_only,
             "max_distance": max_distance,
             "min_sustainability": min_sustainability
         },
-        "sustainability_metrics": {
-            "avg_sustainability_score": round(sum(p["sustainability_score"] for p in products) / len(products), 1) if products else 0,
-            "organic_percentage": round(sum(1 for p in products if p["organic"]) / len(products) * 100, 1) if products else 0,
-            "avg_distance_km": round(sum(p["distance_km"] for p in products) / len(products), 1) if products else 0,
-            "total_carbon_saved_kg": round(total_carbon_saved, 2)
-        }
-    }
+        "sustainability_metrics": catalog.sustainability_metrics(**filters, bits=bits)
+    })
 
 @router.get("/products/{product_id}")
+@cache_response(ttl=PRODUCTS_CACHE_TTL, tags=("catalog",))
 async def get_product(product_id: int):
     """Get single product"""
-    product = next((p for p in MOCK_PRODUCTS if p["id"] == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+def _is_admin(user: dict) -> bool:
+    return user.get("user_type") == "admin"
+
+@router.post("/products")
+async def create_listing(product_data: ListingCreate, user: dict = Depends(require_seller)):
+    """Add a product listing to the marketplace - farmers and admins"""
+    product = _build_listing(product_data)
+    # Farmers always list as themselves; admins may list for any seller
+    if not _is_admin(user) or not product["seller"]:
+        product["seller"] = user.get("full_name") or user["username"]
+    product["seller_username"] = user["username"]
+    await _store_listing(product, new=True)
+    _save_listing(product)
+    return product
+
+@router.put("/products/{product_id}")
+async def update_listing(product_id: int, product_data: ListingUpdate, user: dict = Depends(require_seller)):
+    """Update fields of an existing product listing - its seller or an admin"""
+    existing = catalog.get(product_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if not _is_admin(user) and existing.get("seller_username") != user["username"]:
+        raise HTTPException(status_code=403, detail="You can only update your own listings")
+    if not _is_admin(user):
+        product_data.seller = None  # the seller of a listing is fixed for farmers
+    product = _build_listing(product_data, existing)
+    await _store_listing(product, new=False)
+    _save_listing(product)
+    return product
+
 @router.get("/categories")
+@cache_response(ttl=3600)
 async def get_categories():
     """Get product categories"""
     return {
@@ -317,46 +454,122 @@ async def get_categories():
         ]
     }
 
+def _order_items(order_data: dict) -> list:
+    """Validate the items of one order"""
+    items = order_data.get('items', []) if isinstance(order_data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise HTTPException(status_code=422, detail="Order items must be a list of objects")
+    for item in items:
+        product_id = item.get('product_id')
+        if isinstance(product_id, float) and product_id.is_integer():
+            # JSON clients may send 3.0 for 3; accepted as before
+            item['product_id'] = int(product_id)
+        elif not isinstance(product_id, (int, float, str, type(None))):
+            raise HTTPException(status_code=422, detail="Invalid product_id")
+        if not isinstance(item.get('quantity', 1), (int, float)):
+            raise HTTPException(status_code=422, detail="Invalid quantity")
+    return items
+
+def _seller_ids(items: list) -> set:
+    sellers = set()
+    for item in items:
+        seller = item.get('seller_id') or (catalog.get(item.get('product_id')) or {}).get('seller')
+        if seller is not None:
+            sellers.add(seller)
+    return sellers
+
+def _order_state(items: list) -> Optional[str]:
+    """State the order is attributed to: that of the first product whose location names one"""
+    for item in items:
+        product = catalog.get(item.get('product_id'))
+        state = state_of(product.get('location')) if product else UNKNOWN_STATE
+        if state != UNKNOWN_STATE:
+            return state
+    return None
+
+def _price_orders(orders: list) -> tuple:
+    """Order responses and order documents for many orders, priced together in one catalog pass"""
+    item_lists = [_order_items(order_data) for order_data in orders]
+    totals = catalog.price_orders(item_lists)
+    
+    results = []
+    documents = []
+    for i, items in enumerate(item_lists):
+        total_items = int(totals["items"][i])
+        total_carbon_footprint = float(totals["carbon_footprint"][i])
+        avg_distance = float(totals["distance"][i]) / total_items if total_items > 0 else 0
+        carbon_saved = (2.5 * total_items) - total_carbon_footprint  # vs conventional supply chain
+        organic_items = float(totals["organic_items"][i])
+        
+        order_id = random.randint(1000, 9999)
+        results.append({
+            "order_id": order_id,
+            "status": "confirmed",
+            "message": "Order placed successfully",
+            "estimated_delivery": "2-3 days",
+            "total_amount": round(float(totals["amount"][i]), 2),
+            "sustainability_impact": {
+                "carbon_footprint_kg": round(total_carbon_footprint, 2),
+                "carbon_saved_kg": round(max(0, carbon_saved), 2),
+                "avg_distance_km": round(avg_distance, 1),
+                "organic_percentage": round((organic_items / total_items) * 100, 1) if total_items > 0 else 0,
+                "sustainability_score": random.randint(80, 95)
+            },
+            "farmer_support": {
+                "farmers_supported": len(set(item.get('seller_id') for item in items)),
+                "fair_trade_premium": "15% above market rate"
+            }
+        })
+        order_data = orders[i]
+        documents.append({
+            "order_id": order_id,
+            "buyer_id": order_data.get('buyer_id') or order_data.get('username'),
+            "status": "confirmed",
+            "items": items,
+            "total_amount": results[-1]["total_amount"],
+            "total_items": total_items,
+            "organic_items": organic_items,
+            "total_distance_km": float(totals["distance"][i]),
+            "carbon_footprint_kg": total_carbon_footprint,
+            "carbon_saved_kg": max(0, carbon_saved),
+            "seller_ids": sorted(map(str, _seller_ids(items))),
+            "state": _order_state(items),
+            "created_at": datetime.utcnow()
+        })
+    return results, documents
+
+async def _save_orders(documents: list):
+    """Persist orders and count them in the platform statistics"""
+    try:
+        await get_database().orders.insert_many(documents)
+    except Exception as e:
+        print(f"❌ Failed to save orders: {e}")
+        raise HTTPException(status_code=503, detail="Could not save the order. Please try again.")
+    platform_stats.record_orders(documents)
+    for document in documents:
+        get_rollups().ingest(document["state"], document["created_at"], orders=1, revenue=document["total_amount"])
+
 @router.post("/orders")
 async def create_order(order_data: dict):
     """Enhanced order creation with sustainability tracking"""
-    
-    order_id = random.randint(1000, 9999)
-    
-    # Calculate sustainability impact
-    total_carbon_footprint = 0
-    total_distance = 0
-    organic_items = 0
-    total_items = len(order_data.get('items', []))
-    
-    for item in order_data.get('items', []):
-        product = next((p for p in MOCK_PRODUCTS if p['id'] == item.get('product_id')), None)
-        if product:
-            quantity = item.get('quantity', 1)
-            total_carbon_footprint += product['carbon_footprint'] * quantity
-            total_distance += product['distance_km']
-            if product['organic']:
-                organic_items += 1
-    
-    avg_distance = total_distance / total_items if total_items > 0 else 0
-    carbon_saved = (2.5 * total_items) - total_carbon_footprint  # vs conventional supply chain
-    
+    results, documents = _price_orders([order_data])
+    await _save_orders(documents)
+    return results[0]
+
+@router.post("/orders/batch")
+async def create_orders_batch(batch_data: dict):
+    """Place many orders at once, e.g. for a cooperative"""
+    orders = batch_data.get("orders")
+    if not isinstance(orders, list) or not orders:
+        raise HTTPException(status_code=422, detail="orders must be a non-empty list")
+    if len(orders) > MAX_BATCH_ORDERS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ORDERS} orders per batch")
+    results, documents = _price_orders(orders)
+    await _save_orders(documents)
     return {
-        "order_id": order_id,
-        "status": "confirmed",
-        "message": "Order placed successfully",
-        "estimated_delivery": "2-3 days",
-        "sustainability_impact": {
-            "carbon_footprint_kg": round(total_carbon_footprint, 2),
-            "carbon_saved_kg": round(max(0, carbon_saved), 2),
-            "avg_distance_km": round(avg_distance, 1),
-            "organic_percentage": round((organic_items / total_items) * 100, 1) if total_items > 0 else 0,
-            "sustainability_score": random.randint(80, 95)
-        },
-        "farmer_support": {
-            "farmers_supported": len(set(item.get('seller_id') for item in order_data.get('items', []))),
-            "fair_trade_premium": "15% above market rate"
-        }
+        "orders": results,
+        "total_orders": len(results),
+        "total_amount": round(sum(r["total_amount"] for r in results), 2)
     }
 
 @router.get("/orders")
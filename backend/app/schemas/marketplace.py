@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -47,4 +47,28 @@ class OrderResponse(BaseModel):
     delivery_address: str
     phone: str
     created_at: datetime
-    estimated_delivery: Optional[datetime] = None
\ No newline at end of file
+    estimated_delivery: Optional[datetime] = None
+
+# Marketplace listings (the catalog behind /api/marketplace/products).
+# Strict: "false" is not a bool, dicts are not names, and NaN/inf are rejected.
+class ListingUpdate(BaseModel):
+    model_config = ConfigDict(strict=True)
+
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    price: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    category: Optional[str] = Field(None, min_length=1, max_length=50)
+    seller: Optional[str] = Field(None, max_length=200)
+    image: Optional[str] = Field(None, max_length=2000)
+    location: Optional[str] = Field(None, max_length=200)
+    distance_km: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    sustainability_score: Optional[int] = Field(None, ge=0, le=100)
+    carbon_footprint: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    organic: Optional[bool] = None
+    rating: Optional[float] = Field(None, ge=0, le=5, allow_inf_nan=False)
+    harvest_date: Optional[str] = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    quantity_kg: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    description: Optional[str] = Field(None, max_length=5000)
+
+class ListingCreate(ListingUpdate):
+    name: str = Field(..., min_length=1, max_length=200)
+    category: str = Field(..., min_length=1, max_length=50)
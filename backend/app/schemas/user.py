@@ -8,6 +8,7 @@ class UserBase(BaseModel):
     full_name: str
     user_type: str = "farmer"
     phone: Optional[str] = None
+    state: Optional[str] = None
 
 class UserCreate(UserBase):
     password: str
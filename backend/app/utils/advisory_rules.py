@@ -0,0 +1,262 @@
+"""Declarative rules behind the crop health and weather advisories.
+
+Everything the advisory endpoints say is data in the tables below: score
+factors per crop, season and soil, recommendation lists, risk rules, and
+weather threshold rules. A new crop, soil or threshold is a table edit.
+
+The tables are compiled once at import: weather conditions become
+operator functions, and rule groups keep their order so output order is
+stable. The deterministic part of every answer is memoized per input
+tuple, so a request costs a few cache lookups; only the random
+environmental variability is computed per call. For batches, crop,
+season and soil are encoded as integer arrays and scored in one NumPy
+pass over factor tables compiled from the same data.
+"""
+import operator
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+BASE_HEALTH_SCORE = 85
+MIN_HEALTH_SCORE = 60
+MAX_HEALTH_SCORE = 95
+MAX_RECOMMENDATIONS = 6
+
+# Score adjustment per crop and season
+CROP_SEASON_FACTORS = {
+    "wheat": {"winter": 10, "summer": -5, "monsoon": 0},
+    "rice": {"winter": -10, "summer": 5, "monsoon": 15},
+    "corn": {"winter": -5, "summer": 10, "monsoon": 5},
+    "tomato": {"winter": 5, "summer": -10, "monsoon": -5},
+}
+
+SOIL_FACTORS = {
+    "loamy": 5,
+    "clay": -3,
+    "sandy": -2,
+}
+
+GENERAL_RECOMMENDATIONS = (
+    "Optimal {crop} cultivation detected for {season} season",
+    "Apply organic fertilizer every 2 weeks for better yield",
+    "Monitor soil moisture levels daily using smart sensors",
+)
+
+SEASON_RECOMMENDATIONS = {
+    "winter": ("Protect crops from frost damage", "Reduce watering frequency in cold weather"),
+    "summer": ("Increase irrigation frequency due to high temperatures", "Use mulching to retain soil moisture"),
+    "monsoon": ("Ensure proper drainage to prevent waterlogging", "Monitor for fungal diseases due to high humidity"),
+}
+
+SOIL_RECOMMENDATIONS = {
+    "clay": ("Improve soil drainage with organic matter",),
+    "sandy": ("Add compost to improve water retention",),
+}
+
+# (score below, recommendations); the first matching band applies
+HEALTH_BANDS = (
+    (75, ("Consider soil pH testing immediately",
+          "Consult agricultural expert for detailed analysis",
+          "Implement integrated pest management")),
+    (85, ("Regular pest monitoring recommended",
+          "Consider nutrient supplementation")),
+)
+
+LOW_HEALTH_RISK = (80, "Nutrient deficiency detected")
+
+# (season, soil) -> risk, in output order
+SEASON_SOIL_RISKS = (
+    (("monsoon", "clay"), "High waterlogging risk"),
+    (("summer", "sandy"), "Water stress risk"),
+)
+
+# Weather rule groups. Within a group the first rule whose conditions all
+# hold fires (if/elif semantics); every group is checked in order.
+# A rule is ({field: (op, value)}, priority_alerts, advisory).
+WEATHER_RULES = (
+    (  # temperature
+        ({"temperature": (">", 35)},
+         ("🌡️ HEAT ALERT: Extreme temperature detected",),
+         ("Increase irrigation frequency to 2-3 times daily",
+          "Provide shade nets for sensitive crops",
+          "Avoid field work during 11 AM - 4 PM")),
+        ({"temperature": (">", 30)}, (), ("High temperature - increase watering frequency",)),
+        ({"temperature": ("<", 15)},
+         ("❄️ FROST WARNING: Protect sensitive crops",),
+         ("Cover young plants with protective sheets",
+          "Delay irrigation until temperature rises")),
+    ),
+    (  # humidity
+        ({"humidity": (">", 85)}, (),
+         ("Very high humidity - high fungal disease risk",
+          "Improve air circulation around plants",
+          "Apply preventive fungicide spray")),
+        ({"humidity": (">", 75)}, (), ("High humidity - monitor for fungal diseases",)),
+        ({"humidity": ("<", 50)}, (), ("Low humidity - increase soil moisture retention",)),
+    ),
+    (  # rainfall
+        ({"rainfall": (">", 50)},
+         ("🌧️ HEAVY RAIN ALERT: Waterlogging risk",),
+         ("Ensure proper field drainage immediately",
+          "Postpone fertilizer application",
+          "Harvest mature crops before rain")),
+        ({"rainfall": (">", 20)}, (),
+         ("Moderate rainfall expected - check drainage systems",
+          "Good time for transplanting if soil is ready")),
+        ({"rainfall": ("==", 0), "temperature": (">", 30)}, (),
+         ("No rain with high temperature - ensure adequate irrigation",)),
+    ),
+    (  # wind
+        ({"wind_speed": (">", 20)}, (),
+         ("High wind speed - avoid pesticide spraying",
+          "Provide support to tall crops")),
+    ),
+    (  # UV index
+        ({"uv_index": (">", 8)}, (), ("High UV levels - consider shade protection for sensitive crops",)),
+    ),
+)
+
+WEATHER_FIELDS = ("temperature", "humidity", "rainfall", "wind_speed", "uv_index")
+
+GENERAL_FARMING_TIPS = (
+    "Best sowing time: Early morning (6-8 AM) when temperature is optimal",
+    "Avoid field operations during extreme weather conditions",
+    "Monitor crop health daily using mobile apps for early detection",
+)
+
+# Months -> extra tips
+SEASONAL_FARMING_TIPS = (
+    ((12, 1, 2), ("Winter season: Focus on rabi crop management",
+                  "Apply organic manure for better soil health")),
+    ((6, 7, 8, 9), ("Monsoon season: Ensure proper drainage in fields",
+                    "Monitor for pest outbreaks due to high humidity")),
+)
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+
+
+def _compile_weather_rules():
+    """Rule groups as tuples of ((field index, op function, value), ...) conditions"""
+    compiled = []
+    for group in WEATHER_RULES:
+        rules = []
+        for conditions, alerts, advisory in group:
+            checks = tuple(
+                (WEATHER_FIELDS.index(field), _OPERATORS[op], value)
+                for field, (op, value) in conditions.items()
+            )
+            rules.append((checks, alerts, advisory))
+        compiled.append(tuple(rules))
+    return tuple(compiled)
+
+
+_COMPILED_WEATHER_RULES = _compile_weather_rules()
+_SEASONAL_TIPS_BY_MONTH = {
+    month: GENERAL_FARMING_TIPS + tips for months, tips in SEASONAL_FARMING_TIPS for month in months
+}
+
+
+@lru_cache(maxsize=4096)
+def crop_profile(crop: str, season: str, soil_type: str) -> Tuple[int, Tuple[str, ...], Tuple[str, ...]]:
+    """(score before variability, static recommendations, season/soil risks)"""
+    score = BASE_HEALTH_SCORE + CROP_SEASON_FACTORS.get(crop, {}).get(season, 0) + SOIL_FACTORS.get(soil_type, 0)
+    recommendations = (
+        tuple(text.format(crop=crop, season=season) for text in GENERAL_RECOMMENDATIONS)
+        + SEASON_RECOMMENDATIONS.get(season, ())
+        + SOIL_RECOMMENDATIONS.get(soil_type, ())
+    )
+    risks = tuple(risk for (risk_season, risk_soil), risk in SEASON_SOIL_RISKS
+                  if risk_season == season and risk_soil == soil_type)
+    return score, recommendations, risks
+
+
+@lru_cache(maxsize=None)
+def _health_band(health_score: int) -> Tuple[str, ...]:
+    for below, recommendations in HEALTH_BANDS:
+        if health_score < below:
+            return recommendations
+    return ()
+
+
+def assess_crop_health(crop: str, season: str, soil_type: str, variability: int) -> Dict:
+    """Health score, status, recommendations and risks for one prediction"""
+    score = crop_profile(crop, season, soil_type)[0]
+    return assessment_for(crop, season, soil_type, max(MIN_HEALTH_SCORE, min(MAX_HEALTH_SCORE, score + variability)))
+
+
+def assessment_for(crop: str, season: str, soil_type: str, health_score: int) -> Dict:
+    """Assessment fields for an already computed health score"""
+    _, recommendations, risks = crop_profile(crop, season, soil_type)
+    recommendations = (recommendations + _health_band(health_score))[:MAX_RECOMMENDATIONS]
+    low_health_below, low_health_risk = LOW_HEALTH_RISK
+    risk_factors = ((low_health_risk,) if health_score < low_health_below else ()) + risks
+    return {
+        "health_score": health_score,
+        "status": "excellent" if health_score > 90 else "healthy" if health_score > 80 else "needs_attention",
+        "recommendations": list(recommendations),
+        "risk_factors": list(risk_factors),
+        "next_check": "5 days" if health_score < 80 else "7 days"
+    }
+
+
+def _encoding(names) -> Dict[str, int]:
+    # Unknown values map to one extra index whose factors are zero
+    return {name: i for i, name in enumerate(names)}
+
+
+_CROP_INDEX = _encoding(CROP_SEASON_FACTORS)
+_SEASON_INDEX = _encoding(sorted({season for factors in CROP_SEASON_FACTORS.values() for season in factors}))
+_SOIL_INDEX = _encoding(SOIL_FACTORS)
+_CROP_SEASON_MATRIX = np.zeros((len(_CROP_INDEX) + 1, len(_SEASON_INDEX) + 1), dtype=np.int64)
+for _crop, _factors in CROP_SEASON_FACTORS.items():
+    for _season, _factor in _factors.items():
+        _CROP_SEASON_MATRIX[_CROP_INDEX[_crop], _SEASON_INDEX[_season]] = _factor
+_SOIL_VECTOR = np.array([SOIL_FACTORS[soil] for soil in _SOIL_INDEX] + [0], dtype=np.int64)
+
+
+def _encode(values: Sequence[str], index: Dict[str, int]) -> np.ndarray:
+    return np.fromiter((index.get(value, len(index)) for value in values), dtype=np.intp, count=len(values))
+
+
+def score_batch(crops: Sequence[str], seasons: Sequence[str], soil_types: Sequence[str],
+                variability: np.ndarray) -> np.ndarray:
+    """Health scores for many plots at once; same result as assess_crop_health per plot"""
+    scores = (
+        BASE_HEALTH_SCORE
+        + _CROP_SEASON_MATRIX[_encode(crops, _CROP_INDEX), _encode(seasons, _SEASON_INDEX)]
+        + _SOIL_VECTOR[_encode(soil_types, _SOIL_INDEX)]
+        + variability
+    )
+    return np.clip(scores, MIN_HEALTH_SCORE, MAX_HEALTH_SCORE)
+
+
+@lru_cache(maxsize=8192)
+def _weather_advice(values: Tuple) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    alerts: Tuple[str, ...] = ()
+    advisory: Tuple[str, ...] = ()
+    for group in _COMPILED_WEATHER_RULES:
+        for checks, rule_alerts, rule_advisory in group:
+            if all(values[i] is not None and op(values[i], value) for i, op, value in checks):
+                alerts += rule_alerts
+                advisory += rule_advisory
+                break
+    return alerts, advisory
+
+
+def weather_advice(weather: Dict) -> Tuple[List[str], List[str]]:
+    """(priority_alerts, advisory) for a weather reading"""
+    alerts, advisory = _weather_advice(tuple(weather.get(field) for field in WEATHER_FIELDS))
+    return list(alerts), list(advisory)
+
+
+def farming_tips(month: int) -> List[str]:
+    return list(_SEASONAL_TIPS_BY_MONTH.get(month, GENERAL_FARMING_TIPS))
+
+
+def cache_info() -> Dict:
+    """Memoization statistics, for tuning cache sizes"""
+    return {
+        "crop_profiles": crop_profile.cache_info()._asdict(),
+        "weather_advice": _weather_advice.cache_info()._asdict()
+    }
@@ -4,14 +4,31 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
+from app.utils.workers import BoundedExecutor, PoolSaturated
+from app.utils.user_cache import user_cache
+from app.database import get_database
+from collections import OrderedDict
+import asyncio
+import hashlib
 import os
+import threading
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# bcrypt releases the GIL, so a thread pool keeps hashing off the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# How long a verified token is trusted before the shared revocation list is checked again
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "30"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+password_pool = BoundedExecutor("password-hash", PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -19,6 +36,24 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_password_job(fn, *args):
+    try:
+        return await password_pool.run(fn, *args, timeout=PASSWORD_HASH_TIMEOUT)
+    except (PoolSaturated, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing logins. Please try again shortly.",
+            headers={"Retry-After": "2"}
+        )
+
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password on the password worker pool"""
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash on the password worker pool"""
+    return await _run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -29,12 +64,146 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+class TokenCache:
+    """LRU cache of verified tokens, keyed by digest
+
+    Entries live until the token's exp but at most ``ttl`` seconds, so a
+    revocation made by another worker is seen within ``ttl``.
+    """
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self._entries = OrderedDict()  # digest -> (username, exp)
+        self._revoked = {}  # digest -> exp
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    @staticmethod
+    def digest(token: str):
+        return hashlib.sha256(token.encode()).hexdigest()
+        
+    def get(self, digest):
+        """Username for a cached, unexpired token, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[digest]
+            self.misses += 1
+            return None
+            
+    def put(self, digest, username, exp):
+        if not self.max_size or exp is None:
+            return
+        with self._lock:
+            self._entries[digest] = (username, min(float(exp), time.time() + self.ttl))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                
+    def revoke(self, digest, exp):
+        """Reject the token in this process until it would have expired anyway"""
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._prune(now)
+            self._revoked[digest] = float(exp)
+            
+    def is_revoked(self, digest):
+        exp = self._revoked.get(digest)
+        if exp is None:
+            return False
+        if exp > time.time():
+            return True
+        with self._lock:
+            self._prune(time.time())
+        return False
+        
+    def _prune(self, now):
+        # Caller holds _lock; expired tokens fail verification anyway
+        self._revoked = {d: e for d, e in self._revoked.items() if e > now}
+        
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "revoked": len(self._revoked)
+        }
+
+token_cache = TokenCache()
+
+def _decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def _expiry(payload: dict) -> float:
+    exp = payload.get("exp")
+    return float(exp) if exp is not None else time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+async def verify_token(token: str):
+    digest = TokenCache.digest(token)
+    if token_cache.is_revoked(digest):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    username = token_cache.get(digest)
+    if username is not None:
+        return username
+    payload = _decode_token(token)
+    # Revocations are shared through the database: other workers and earlier runs
+    revoked = await get_database().revoked_tokens.find_one({"digest": digest})
+    if revoked and revoked.get("exp", float("inf")) > time.time():
+        token_cache.revoke(digest, _expiry(payload))
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    token_cache.put(digest, payload["sub"], payload.get("exp"))
+    return payload["sub"]
+
+async def revoke_token(token: str):
+    """Invalidate a token (e.g. on logout) in every worker and return its username"""
+    payload = _decode_token(token)
+    digest, exp = TokenCache.digest(token), _expiry(payload)
+    token_cache.revoke(digest, exp)
+    db = get_database()
+    # expires_at feeds MongoDB's TTL index; exp is what lookups and pruning compare
+    await db.revoked_tokens.update_one(
+        {"digest": digest},
+        {"$set": {"exp": exp, "expires_at": datetime.utcfromtimestamp(exp)}},
+        upsert=True
+    )
+    await db.revoked_tokens.delete_many({"exp": {"$lte": time.time()}})
+    return payload["sub"]
+
+async def get_current_user(token=Depends(security)) -> dict:
+    """User record for the bearer token; 401 if the token's user does not exist"""
+    username = await verify_token(token.credentials)
+    user = await user_cache.get(get_database(), username)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+async def require_admin(user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for admin-only routes"""
+    if user.get("user_type") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied. Admin privileges required.")
+    return user
+
+async def require_seller(user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for routes that manage listings: farmers and admins"""
+    if user.get("user_type") not in ("farmer", "admin"):
+        raise HTTPException(status_code=403, detail="Access denied. Seller account required.")
+    return user
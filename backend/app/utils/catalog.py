@@ -0,0 +1,547 @@
+"""In-memory indexed catalog for marketplace listings.
+
+Listings are stored in slots, and a removed listing's slot is handed to the
+next listing stored, so updates keep their place in catalog order. Every filter the products endpoint
+supports is answered from an index (bitsets for categories and the organic
+flag, value bitmaps for distance and sustainability ranges) and every
+``sort_by`` order is kept as a presorted array of slots, so a query is a
+handful of bitset intersections followed by a walk over one sorted array.
+Free-text search goes through an incrementally maintained inverted index,
+sustainability metrics come from per-facet partial aggregates, and order
+pricing gathers from dense per-slot NumPy columns.
+"""
+import base64
+import bisect
+import itertools
+import json
+import math
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.search import SearchIndex
+
+# Bit offsets set in every byte value, used to enumerate bitset members
+_BYTE_BITS = [tuple(b for b in range(8) if value >> b & 1) for value in range(256)]
+
+# sort_by -> (field, descending). Unknown values keep catalog order, or
+# relevance order when the query has search text.
+SORT_FIELDS: Dict[str, Tuple[str, bool]] = {
+    "price_low": ("price", False),
+    "price_high": ("price", True),
+    "distance": ("distance_km", False),
+    "sustainability": ("sustainability_score", True),
+    "rating": ("rating", True),
+    "freshness": ("harvest_date", True),
+}
+
+# Listing fields mirrored into NumPy columns for vectorized order pricing,
+# plus the sustainability score for metrics over partially matched facets
+PRICING_COLUMNS = ("price", "carbon_footprint", "distance_km", "organic")
+COLUMNS = PRICING_COLUMNS + ("sustainability_score",)
+
+
+def _is_number(value) -> bool:
+    """Finite int or float; bools are rejected even though they are ints"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Yield the set bit positions of ``bits`` in ascending order"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for offset in _BYTE_BITS[byte]:
+                yield base + offset
+
+
+def slots_of(bits: int) -> np.ndarray:
+    """Set bit positions of ``bits`` as an ascending NumPy array"""
+    data = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder="little"))
+
+
+def bits_from(positions: Iterable[int]) -> int:
+    """Bitset with the given positions set"""
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray((max(positions) >> 3) + 1)
+    for pos in positions:
+        data[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(data, "little")
+
+
+class _ValueBitmap:
+    """Bitsets of the slots holding each value of a numeric field
+
+    Values are grouped into whole-unit buckets, bucket ``b`` holding the
+    values in ``(b - 1, b]``. A range filter ORs one bitset per bucket and
+    only looks at individual values in the bucket the limit falls into,
+    which integer limits on ``at_most`` never need.
+    """
+
+    def __init__(self):
+        self._buckets: List[int] = []
+        self._bucket_bits: Dict[int, int] = {}
+        self._value_bits: Dict[int, Dict[float, int]] = {}
+
+    def add(self, value, pos: int):
+        bucket = math.ceil(value)
+        values = self._value_bits.get(bucket)
+        if values is None:
+            bisect.insort(self._buckets, bucket)
+            values = self._value_bits[bucket] = {}
+        bit = 1 << pos
+        self._bucket_bits[bucket] = self._bucket_bits.get(bucket, 0) | bit
+        values[value] = values.get(value, 0) | bit
+
+    def remove(self, value, pos: int):
+        bucket = math.ceil(value)
+        values = self._value_bits.get(bucket)
+        if values is None:
+            return
+        mask = ~(1 << pos)
+        bits = values.get(value, 0) & mask
+        if bits:
+            values[value] = bits
+        else:
+            values.pop(value, None)
+        if values:
+            self._bucket_bits[bucket] &= mask
+            return
+        del self._value_bits[bucket], self._bucket_bits[bucket]
+        del self._buckets[bisect.bisect_left(self._buckets, bucket)]
+
+    def at_most(self, limit) -> int:
+        whole = math.floor(limit)
+        result = 0
+        for bucket in self._buckets[:bisect.bisect_right(self._buckets, whole)]:
+            result |= self._bucket_bits[bucket]
+        if limit != whole:
+            for value, bits in self._value_bits.get(whole + 1, {}).items():
+                if value <= limit:
+                    result |= bits
+        return result
+
+    def at_least(self, limit) -> int:
+        first = math.ceil(limit)
+        result = 0
+        for bucket in self._buckets[bisect.bisect_right(self._buckets, first):]:
+            result |= self._bucket_bits[bucket]
+        for value, bits in self._value_bits.get(first, {}).items():
+            if value >= limit:
+                result |= bits
+        return result
+
+
+class FacetAggregates:
+    """Sustainability sums kept per (category, organic, distance, sustainability) facet
+
+    Distance buckets are whole kilometres rounded up, so ``distance_km <= n``
+    for an integer ``n`` selects exactly the buckets ``<= n``. Sustainability
+    buckets are ``SUSTAINABILITY_BUCKET`` points wide, so a floor on a bucket
+    boundary selects whole buckets too. Facet keys and totals live in NumPy
+    rows, so combining them is a vectorized mask and sum over the facets.
+    """
+
+    CARBON_BASELINE = 2.5  # kg CO2 of the conventional supply chain
+    SUSTAINABILITY_BUCKET = 10
+
+    def __init__(self):
+        # (category, organic, distance bucket, sustainability bucket) -> row
+        self._rows: Dict[Tuple[str, bool, int, int], int] = {}
+        self._category_codes: Dict[str, int] = {}
+        # Per row: category code, organic, distance bucket, sustainability bucket
+        self._keys = np.zeros((16, 4), dtype=np.int64)
+        # Per row: count, sustainability, distance, carbon saved, organic
+        self._totals = np.zeros((16, 5))
+
+    @classmethod
+    def contribution(cls, product: dict) -> Tuple[float, ...]:
+        organic = 1 if product["organic"] else 0
+        carbon_saved = max(0.0, cls.CARBON_BASELINE - product["carbon_footprint"])
+        return 1, product["sustainability_score"], product["distance_km"], carbon_saved, organic
+
+    @classmethod
+    def aligned(cls, min_sustainability: Optional[int]) -> bool:
+        """True when a sustainability floor falls on a bucket boundary"""
+        return not min_sustainability or min_sustainability % cls.SUSTAINABILITY_BUCKET == 0
+
+    def _row(self, product: dict) -> int:
+        key = (product["category"], bool(product["organic"]), math.ceil(product["distance_km"]),
+               int(product["sustainability_score"] // self.SUSTAINABILITY_BUCKET))
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = len(self._rows)
+            if row >= len(self._totals):
+                self._keys = np.concatenate([self._keys, np.zeros_like(self._keys)])
+                self._totals = np.concatenate([self._totals, np.zeros_like(self._totals)])
+            code = self._category_codes.setdefault(key[0], len(self._category_codes))
+            self._keys[row] = (code, *key[1:])
+        return row
+
+    def add(self, product: dict):
+        row = self._row(product)
+        self._totals[row] += self.contribution(product)
+
+    def remove(self, product: dict):
+        row = self._row(product)
+        self._totals[row] -= self.contribution(product)
+
+    def combine(self, category: Optional[str] = None, organic_only: bool = False,
+                max_distance: Optional[int] = None, min_sustainability: Optional[int] = None) -> List[float]:
+        """Totals over every facet matching the filters; the floor must be :meth:`aligned`"""
+        count = len(self._rows)
+        keys = self._keys[:count]
+        mask = np.ones(count, dtype=bool)
+        if category:
+            mask &= keys[:, 0] == self._category_codes.get(category, -1)
+        if organic_only:
+            mask &= keys[:, 1] == 1
+        if max_distance:
+            mask &= keys[:, 2] <= max_distance
+        if min_sustainability:
+            mask &= keys[:, 3] * self.SUSTAINABILITY_BUCKET >= min_sustainability
+        return self._totals[:count][mask].sum(axis=0).tolist()
+
+
+def summarize(totals: List[float]) -> dict:
+    """Render aggregate totals as the endpoint's sustainability_metrics block"""
+    count, sustainability, distance, carbon_saved, organic = totals
+    return {
+        "avg_sustainability_score": round(sustainability / count, 1) if count else 0,
+        "organic_percentage": round(organic / count * 100, 1) if count else 0,
+        "avg_distance_km": round(distance / count, 1) if count else 0,
+        "total_carbon_saved_kg": round(carbon_saved, 2)
+    }
+
+
+class _SortedSlots:
+    """Slots kept in ``sort_by`` order; ties are broken by slot so the order is total"""
+
+    def __init__(self, field: str, descending: bool):
+        self.field = field
+        self.descending = descending
+        self.slots: List[int] = []
+
+    def key(self, product: dict, pos: int):
+        return product[self.field], pos
+
+    def before(self, a: tuple, b: tuple) -> bool:
+        """True when sort key ``a`` comes strictly before ``b``"""
+        if a[0] != b[0]:
+            return a[0] > b[0] if self.descending else a[0] < b[0]
+        return a[1] < b[1]
+
+    def bisect(self, key: tuple, key_of: Callable[[int], tuple]) -> int:
+        """Index of the first slot whose key does not come before ``key``"""
+        lo, hi = 0, len(self.slots)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.before(key_of(self.slots[mid]), key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def build(self, products: List[Optional[dict]]):
+        live = [pos for pos, product in enumerate(products) if product is not None]
+        live.sort(key=lambda pos: products[pos][self.field], reverse=self.descending)
+        self.slots = live
+
+    def bisect_after(self, key: tuple, key_of: Callable[[int], tuple]) -> int:
+        """Index of the first slot whose key comes strictly after ``key``"""
+        lo, hi = 0, len(self.slots)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.before(key, key_of(self.slots[mid])):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def insert(self, key: tuple, key_of: Callable[[int], tuple]):
+        self.slots.insert(self.bisect(key, key_of), key[1])
+
+    def remove(self, key: tuple, key_of: Callable[[int], tuple]):
+        index = self.bisect(key, key_of)
+        if index < len(self.slots) and self.slots[index] == key[1]:
+            del self.slots[index]
+
+
+class CatalogEngine:
+    """Indexed product catalog answering filtered, sorted listing queries"""
+
+    def __init__(self, products: Optional[List[dict]] = None):
+        self._products: List[Optional[dict]] = []
+        self._free: List[int] = []
+        self._id_to_pos: Dict[int, int] = {}
+        self._alive = 0
+        self._category_bits: Dict[str, int] = {}
+        self._organic_bits = 0
+        self._distance = _ValueBitmap()
+        self._sustainability = _ValueBitmap()
+        self._search = SearchIndex()
+        self._aggregates = FacetAggregates()
+        self._columns = np.zeros((len(COLUMNS), max(16, len(products or []))))
+        self._orders = {name: _SortedSlots(field, desc) for name, (field, desc) in SORT_FIELDS.items()}
+        for product in products or []:
+            self._index(product)
+        for order in self._orders.values():
+            order.build(self._products)
+
+    def __len__(self):
+        return len(self._id_to_pos)
+
+    def _index(self, product: dict) -> int:
+        if self._free:
+            pos = self._free.pop()
+            self._products[pos] = product
+        else:
+            pos = len(self._products)
+            self._products.append(product)
+        bit = 1 << pos
+        self._search.add(pos, product)
+        self._id_to_pos[product["id"]] = pos
+        self._alive |= bit
+        self._category_bits[product["category"]] = self._category_bits.get(product["category"], 0) | bit
+        if product["organic"]:
+            self._organic_bits |= bit
+        self._distance.add(product["distance_km"], pos)
+        self._sustainability.add(product["sustainability_score"], pos)
+        self._aggregates.add(product)
+        if pos >= self._columns.shape[1]:
+            grown = np.zeros((len(COLUMNS), self._columns.shape[1] * 2))
+            grown[:, :pos] = self._columns[:, :pos]
+            self._columns = grown
+        self._columns[:, pos] = [float(product[field]) for field in COLUMNS]
+        return pos
+
+    def _key_of(self, order: _SortedSlots) -> Callable[[int], tuple]:
+        return lambda pos: order.key(self._products[pos], pos)
+
+    def get(self, product_id) -> Optional[dict]:
+        """Listing with ``product_id``, or None"""
+        pos = self._id_to_pos.get(product_id)
+        return None if pos is None else self._products[pos]
+
+    def price_orders(self, orders: List[List[dict]]) -> Dict[str, np.ndarray]:
+        """Per-order totals for many orders' items in one vectorized pass
+
+        Each item is a dict with ``product_id`` and an optional ``quantity``.
+        Unknown products count towards ``items`` but contribute nothing else.
+        Returns arrays indexed by order: items, amount, carbon_footprint,
+        distance and organic_items.
+        """
+        order_index, slots, quantities = [], [], []
+        for i, items in enumerate(orders):
+            for item in items:
+                order_index.append(i)
+                slots.append(self._id_to_pos.get(item.get("product_id"), -1))
+                quantities.append(item.get("quantity", 1))
+        order_index = np.asarray(order_index, dtype=np.intp)
+        slots = np.asarray(slots, dtype=np.intp)
+        quantities = np.asarray(quantities, dtype=float)
+        count = len(orders)
+        known = slots >= 0
+        owner, slots, quantities = order_index[known], slots[known], quantities[known]
+        price, carbon, distance, organic = self._columns[:len(PRICING_COLUMNS), slots]
+        return {
+            "items": np.bincount(order_index, minlength=count),
+            "amount": np.bincount(owner, weights=price * quantities, minlength=count),
+            "carbon_footprint": np.bincount(owner, weights=carbon * quantities, minlength=count),
+            "distance": np.bincount(owner, weights=distance, minlength=count),
+            "organic_items": np.bincount(owner, weights=organic, minlength=count),
+        }
+
+    def upsert(self, product: dict):
+        """Add a listing, or replace the listing with the same id"""
+        self.remove(product["id"])
+        pos = self._index(product)
+        for order in self._orders.values():
+            order.insert(order.key(product, pos), self._key_of(order))
+
+    def remove(self, product_id: int) -> Optional[dict]:
+        """Drop a listing from every index and free its slot for the next listing"""
+        pos = self._id_to_pos.pop(product_id, None)
+        if pos is None:
+            return None
+        product = self._products[pos]
+        for order in self._orders.values():
+            order.remove(order.key(product, pos), self._key_of(order))
+        mask = ~(1 << pos)
+        self._alive &= mask
+        self._category_bits[product["category"]] &= mask
+        self._organic_bits &= mask
+        self._distance.remove(product["distance_km"], pos)
+        self._sustainability.remove(product["sustainability_score"], pos)
+        self._aggregates.remove(product)
+        self._products[pos] = None
+        self._search.remove(pos)
+        self._free.append(pos)
+        return product
+
+    def filter_bits(
+        self,
+        category: Optional[str] = None,
+        organic_only: bool = False,
+        max_distance: Optional[int] = None,
+        min_sustainability: Optional[int] = None,
+    ) -> int:
+        """Bitset of live slots matching every structured filter"""
+        bits = self._alive
+        if category:
+            bits &= self._category_bits.get(category, 0)
+        if organic_only:
+            bits &= self._organic_bits
+        if max_distance:
+            bits &= self._distance.at_most(max_distance)
+        if min_sustainability:
+            bits &= self._sustainability.at_least(min_sustainability)
+        return bits
+
+    def ordered(
+        self,
+        bits: int,
+        sort_by: str,
+        scores: Optional[Dict[int, float]] = None,
+        after: Optional[tuple] = None,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """Slots in ``bits`` arranged in ``sort_by`` order, or by search score
+
+        ``after`` is a sort key from :meth:`sort_key`; only slots strictly
+        after it are returned, at most ``limit`` of them.
+        """
+        order = self._orders.get(sort_by)
+        if order is None:
+            if scores is not None:
+                slots = sorted(iter_bits(bits), key=lambda pos: (-scores[pos], pos))
+                if after is not None:
+                    slots = [pos for pos in slots if (-scores[pos], pos) > (-after[0], after[1])]
+                return slots[:limit]
+            if after is not None:
+                bits &= ~((1 << (after[0] + 1)) - 1)
+            return list(itertools.islice(iter_bits(bits), limit))
+        key_of = self._key_of(order)
+        count = bits.bit_count()
+        if count * 16 < len(order.slots):
+            # Few matches: sorting them beats walking the whole order
+            products = self._products
+            slots = sorted(iter_bits(bits), key=lambda pos: products[pos][order.field], reverse=order.descending)
+            if after is not None:
+                slots = [pos for pos in slots if order.before(after, key_of(pos))]
+            return slots[:limit]
+        start = 0 if after is None else order.bisect_after(after, key_of)
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        size = len(data)
+        walk = (pos for pos in itertools.islice(order.slots, start, None)
+                if (pos >> 3) < size and data[pos >> 3] >> (pos & 7) & 1)
+        return list(itertools.islice(walk, limit))
+
+    def _sort_mode(self, sort_by: str, scores: Optional[Dict[int, float]]) -> str:
+        if sort_by in self._orders:
+            return sort_by
+        return "relevance" if scores is not None else "catalog"
+
+    def sort_key(self, pos: int, sort_by: str, scores: Optional[Dict[int, float]] = None) -> tuple:
+        """Position of ``pos`` in the total order used by :meth:`ordered`"""
+        order = self._orders.get(sort_by)
+        if order is not None:
+            return order.key(self._products[pos], pos)
+        if scores is not None:
+            return scores[pos], pos
+        return (pos,)
+
+    def encode_cursor(self, pos: int, sort_by: str, scores: Optional[Dict[int, float]] = None) -> str:
+        """Opaque keyset cursor resuming right after ``pos``"""
+        payload = [self._sort_mode(sort_by, scores), *self.sort_key(pos, sort_by, scores)]
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str, sort_by: str, scores: Optional[Dict[int, float]] = None) -> tuple:
+        """Sort key stored in ``cursor``; ValueError if it does not fit this query"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            mode, *key = json.loads(raw)
+        except (ValueError, TypeError):
+            raise ValueError("Malformed cursor")
+        if mode != self._sort_mode(sort_by, scores):
+            raise ValueError("Cursor was issued for a different sort order")
+        pos = key[-1] if key else None
+        if not isinstance(pos, int) or isinstance(pos, bool) or not 0 <= pos < len(self._products):
+            raise ValueError("Malformed cursor")
+        order = self._orders.get(sort_by)
+        if order is not None:
+            if len(key) != 2 or not order.slots:
+                raise ValueError("Malformed cursor")
+            sample = self._products[order.slots[0]][order.field]
+            valid = isinstance(key[0], str) if isinstance(sample, str) else _is_number(key[0])
+            if not valid:
+                raise ValueError("Malformed cursor")
+        elif scores is not None:
+            if len(key) != 2 or not _is_number(key[0]):
+                raise ValueError("Malformed cursor")
+        elif len(key) != 1:
+            raise ValueError("Malformed cursor")
+        return tuple(key)
+
+    def match(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        organic_only: bool = False,
+        max_distance: Optional[int] = None,
+        min_sustainability: Optional[int] = None,
+    ) -> Tuple[int, Optional[Dict[int, float]]]:
+        """Bitset of matching slots, plus search scores when there is search text"""
+        bits = self.filter_bits(category, organic_only, max_distance, min_sustainability)
+        scores = None
+        if search:
+            scores = self._search.search(search)
+            bits &= bits_from(scores)
+        return bits, scores
+
+    def products_at(self, slots: Iterable[int]) -> List[dict]:
+        products = self._products
+        return [products[pos] for pos in slots]
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        organic_only: bool = False,
+        max_distance: Optional[int] = None,
+        min_sustainability: Optional[int] = None,
+        sort_by: str = "name",
+    ) -> List[dict]:
+        """Listings matching the filters, in ``sort_by`` order"""
+        bits, scores = self.match(category, search, organic_only, max_distance, min_sustainability)
+        return self.products_at(self.ordered(bits, sort_by, scores))
+
+    def sustainability_metrics(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        organic_only: bool = False,
+        max_distance: Optional[int] = None,
+        min_sustainability: Optional[int] = None,
+        bits: Optional[int] = None,
+    ) -> dict:
+        """Sustainability metrics for the listings matching the filters
+
+        Filters that line up with facets are answered from the aggregate
+        store. Search text and off-boundary sustainability floors need the
+        matching slots, taken from ``bits`` when the caller already has them,
+        and are summed from the per-slot columns in one vectorized gather.
+        """
+        if not search and FacetAggregates.aligned(min_sustainability):
+            return summarize(self._aggregates.combine(category, organic_only, max_distance, min_sustainability))
+        if bits is None:
+            bits, _ = self.match(category, search, organic_only, max_distance, min_sustainability)
+        _, carbon, distance, organic, sustainability = self._columns[:, slots_of(bits)]
+        carbon_saved = np.maximum(0.0, FacetAggregates.CARBON_BASELINE - carbon)
+        return summarize([len(sustainability), float(sustainability.sum()), float(distance.sum()),
+                          float(carbon_saved.sum()), float(organic.sum())])
@@ -0,0 +1,226 @@
+"""Grid-based spatial index for nearby-user lookups.
+
+Points are bucketed into fixed-size latitude/longitude cells. A radius
+query turns the search circle into its exact bounding box, visits only
+the cells overlapping it, skips points outside the box, and runs the
+haversine formula on what is left. A k-nearest query runs radius queries
+with a doubling radius until it finds k points, which keeps the answer
+exact. Points can be inserted, moved and removed at any time, and
+:class:`CoalescingUpdates` batches high-frequency moves into one index
+update per point.
+
+For many-to-many distances, :func:`distance_matrix` evaluates the same
+formula with NumPy over blocks of origin rows, so memory stays bounded by
+the block size rather than the full matrix.
+"""
+import math
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+# 0.1 degree cells are about 11 km tall, close to a typical search radius
+DEFAULT_CELL_DEGREES = 0.1
+
+# Matrix cells computed per block: ~8 MB of float64 per temporary
+MATRIX_BLOCK_CELLS = 1_000_000
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometers"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_block(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """(len(origins), len(destinations)) distances in km; inputs are (n, 2) arrays of radians"""
+    lat1 = origins[:, 0:1]
+    lat2 = destinations[:, 0]
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((destinations[:, 1] - origins[:, 1:2]) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(origins, destinations, block_cells: int = MATRIX_BLOCK_CELLS) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (first_row, block) pieces of the origins x destinations distance matrix
+
+    ``origins`` and ``destinations`` are sequences of (lat, lng) in degrees.
+    """
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    rows = max(1, block_cells // max(1, len(destinations)))
+    for start in range(0, len(origins), rows):
+        yield start, haversine_block(origins[start:start + rows], destinations)
+
+
+def nearest_in_matrix(origins, destinations, k: int, block_cells: int = MATRIX_BLOCK_CELLS) -> Tuple[np.ndarray, np.ndarray]:
+    """(indices, distances) of the k nearest destinations per origin, nearest first"""
+    k = min(k, len(destinations))
+    indices = np.empty((len(origins), k), dtype=np.int64)
+    distances = np.empty((len(origins), k), dtype=np.float64)
+    for start, block in distance_matrix(origins, destinations, block_cells):
+        if k < block.shape[1]:
+            candidates = np.argpartition(block, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(block.shape[1]), block.shape)
+        candidate_distances = np.take_along_axis(block, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind="stable")
+        end = start + block.shape[0]
+        indices[start:end] = np.take_along_axis(candidates, order, axis=1)
+        distances[start:end] = np.take_along_axis(candidate_distances, order, axis=1)
+    return indices, distances
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing every point within radius_km"""
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - math.degrees(angle)
+    max_lat = lat + math.degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole: every longitude is in range
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    min_lng, max_lng = lng - delta_lng, lng + delta_lng
+    if min_lng < -180 or max_lng > 180:
+        # Crosses the antimeridian; searching all longitudes is a safe superset
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+class GeoGridIndex:
+    """Points bucketed into lat/lng grid cells, with radius and k-nearest queries"""
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, point_id):
+        return point_id in self._points
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def insert(self, point_id: Hashable, lat: float, lng: float):
+        """Add a point, or move it if ``point_id`` is already indexed"""
+        self.remove(point_id)
+        self._points[point_id] = (lat, lng)
+        self._cells.setdefault(self._cell(lat, lng), {})[point_id] = (lat, lng)
+
+    move = insert
+
+    def remove(self, point_id: Hashable):
+        """Drop a point if present"""
+        position = self._points.pop(point_id, None)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        bucket = self._cells[cell]
+        del bucket[point_id]
+        if not bucket:
+            del self._cells[cell]
+
+    def position(self, point_id: Hashable) -> Optional[Tuple[float, float]]:
+        return self._points.get(point_id)
+
+    def _cells_in(self, min_lat, max_lat, min_lng, max_lng):
+        low_i, low_j = self._cell(min_lat, min_lng)
+        high_i, high_j = self._cell(max_lat, max_lng)
+        if (high_i - low_i + 1) * (high_j - low_j + 1) > len(self._cells):
+            # Large box over a sparse grid: walking occupied cells is cheaper
+            for (i, j), bucket in self._cells.items():
+                if low_i <= i <= high_i and low_j <= j <= high_j:
+                    yield bucket
+            return
+        for i in range(low_i, high_i + 1):
+            for j in range(low_j, high_j + 1):
+                bucket = self._cells.get((i, j))
+                if bucket:
+                    yield bucket
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Hashable]]:
+        """(distance_km, id) of every point within radius_km, nearest first"""
+        if radius_km < 0 or not self._points:
+            return []
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        results = []
+        for bucket in self._cells_in(min_lat, max_lat, min_lng, max_lng):
+            for point_id, (point_lat, point_lng) in bucket.items():
+                if not (min_lat <= point_lat <= max_lat and min_lng <= point_lng <= max_lng):
+                    continue
+                distance = haversine_km(lat, lng, point_lat, point_lng)
+                if distance <= radius_km:
+                    results.append((distance, point_id))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_km: float = MAX_DISTANCE_KM) -> List[Tuple[float, Hashable]]:
+        """(distance_km, id) of the k nearest points within max_radius_km, nearest first"""
+        if k <= 0 or not self._points:
+            return []
+        max_radius_km = min(max_radius_km, MAX_DISTANCE_KM)
+        cell_km = math.radians(self.cell_degrees) * EARTH_RADIUS_KM
+        # Start where the average occupied cell would already hold k points
+        per_cell = len(self._points) / len(self._cells)
+        radius = min(max_radius_km, cell_km * max(0.5, math.sqrt(k / per_cell)))
+        while True:
+            results = self.within(lat, lng, radius)
+            if len(results) >= k or radius >= max_radius_km:
+                return results[:k]
+            radius = min(max_radius_km, radius * 2)
+
+
+class CoalescingUpdates:
+    """Buffers moves for a GeoGridIndex, keeping only the latest per point
+
+    Bursts of position reports from moving sellers and delivery agents
+    collapse into a single index move per point. Call :meth:`flush`
+    before querying; it also runs on its own once ``max_pending`` points
+    are waiting.
+    """
+
+    def __init__(self, index: GeoGridIndex, max_pending: int = 1000,
+                 on_apply: Optional[Callable[[Hashable, float, float, dict], None]] = None):
+        self.index = index
+        self.max_pending = max_pending
+        self.on_apply = on_apply
+        self._pending: Dict[Hashable, Tuple[float, float, dict]] = {}
+        self.submitted = 0
+        self.applied = 0
+        self.flushes = 0
+
+    def submit(self, point_id: Hashable, lat: float, lng: float, details: Optional[dict] = None):
+        """Queue a move; replaces any move still pending for ``point_id``"""
+        self._pending[point_id] = (lat, lng, details or {})
+        self.submitted += 1
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+
+    def flush(self) -> int:
+        """Apply pending moves to the index and return how many were applied"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        for point_id, (lat, lng, details) in pending.items():
+            self.index.move(point_id, lat, lng)
+            if self.on_apply is not None:
+                self.on_apply(point_id, lat, lng, details)
+        self.applied += len(pending)
+        self.flushes += 1
+        return len(pending)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "applied": self.applied,
+            "coalesced": self.submitted - self.applied - len(self._pending),
+            "flushes": self.flushes,
+            "indexed_points": len(self.index)
+        }
@@ -0,0 +1,322 @@
+"""Append-only journal storage for the mock database.
+
+Documents live in memory. Every change is applied there immediately and
+appended as one JSON line to a journal file by a background writer
+thread, which batches whatever accumulated while the previous fsync was
+running (group commit). Once the journal grows past a threshold, or
+periodically while idle, the writer compacts it into a snapshot. Loading
+reads the snapshot and replays the journal on top of it. Journal records
+are idempotent puts and deletes, so replaying one that is already in the
+snapshot is harmless. Listeners see every applied change, which is how
+the mock collections keep their secondary indexes current.
+
+Several worker processes can share one store. Each batch is a single
+O_APPEND write tagged with the writer's origin, and :meth:`refresh` (one
+``stat`` call when nothing changed) picks up records other workers
+appended by memory-mapping the journal and parsing only the new tail.
+Compaction replaces both files under an exclusive lock, which other
+workers notice as a new journal inode and answer with a full reload.
+"""
+import json
+import mmap
+import os
+import threading
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking, run a single worker
+    fcntl = None
+
+COMPACT_AFTER_RECORDS = int(os.getenv("JOURNAL_COMPACT_AFTER", "1000"))
+COMPACT_INTERVAL_SECONDS = float(os.getenv("JOURNAL_COMPACT_INTERVAL", "300"))
+
+
+@contextmanager
+def file_lock(lock_path: str, exclusive: bool):
+    """flock on ``lock_path``, shared or exclusive; a no-op where fcntl is unavailable"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class JournalStore:
+    """In-memory documents made durable by a write-ahead journal and snapshots"""
+
+    _open: Dict[str, "JournalStore"] = {}
+    _open_lock = threading.Lock()
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.lock_path = self.journal_path + ".lock"
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.data: Dict[str, dict] = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: List[Tuple[dict, Future]] = []
+        self._inflight: List[Tuple[dict, Future]] = []
+        self._journal_records = 0
+        self._journal_inode = None
+        self._offset = 0
+        self._writer: Optional[threading.Thread] = None
+        self._closing = False
+        self._listeners: List[Callable[[str, Optional[dict], Optional[dict]], None]] = []
+        self.stats = {"commits": 0, "records": 0, "compactions": 0, "reloads": 0, "replayed": 0}
+        with self._file_lock(exclusive=False):
+            self._load()
+
+    @classmethod
+    def open(cls, snapshot_path: str) -> "JournalStore":
+        """Shared store for ``snapshot_path``; one writer per file per process"""
+        path = os.path.abspath(snapshot_path)
+        with cls._open_lock:
+            store = cls._open.get(path)
+            if store is None:
+                store = cls._open[path] = cls(path)
+            return store
+
+    @classmethod
+    def close_all(cls):
+        with cls._open_lock:
+            stores = list(cls._open.values())
+        for store in stores:
+            store.close()
+
+    def _file_lock(self, exclusive: bool):
+        """Inter-process lock: shared for appends and loads, exclusive for compaction"""
+        return file_lock(self.lock_path, exclusive)
+
+    @staticmethod
+    def _read_mapped(f, offset: int = 0) -> bytes:
+        """Bytes of open file ``f`` from ``offset`` on, read through a memory map"""
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[offset:size]
+
+    def _load(self):
+        """Replace in-memory state with snapshot plus journal"""
+        old = self.data
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                self.data = json.loads(self._read_mapped(f) or b"{}")
+        except (OSError, ValueError):
+            self.data = {}
+        self._journal_records = 0
+        self._offset = 0
+        try:
+            self._journal_inode = os.stat(self.journal_path).st_ino
+            self._replay_tail(skip_own=False, notify=False)
+        except OSError:
+            self._journal_inode = None
+        for listener in self._listeners:
+            for doc_id, doc in old.items():
+                listener(doc_id, doc, None)
+            for doc_id, doc in self.data.items():
+                listener(doc_id, None, doc)
+
+    def _replay_tail(self, skip_own: bool = True, notify: bool = True):
+        """Apply complete journal lines past the current offset"""
+        with open(self.journal_path, "rb") as f:
+            if os.fstat(f.fileno()).st_ino != self._journal_inode:
+                return  # replaced since we looked; the next refresh reloads
+            chunk = self._read_mapped(f, self._offset)
+        end = chunk.rfind(b"\n") + 1
+        # "origin" is the last key of every record
+        own_suffix = f'"origin": "{self.origin}"}}'.encode()
+        for line in chunk[:end].splitlines():
+            if skip_own and line.endswith(own_suffix):
+                continue  # applied in memory when it was submitted
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn line from an interrupted append
+            self._journal_records += 1
+            self._apply(record, notify)
+            self.stats["replayed"] += 1
+        self._offset += end
+
+    def _sync(self):
+        """Catch up with the files; caller holds ``_lock``, and the file lock to reload"""
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            return
+        if st.st_ino != self._journal_inode:
+            # Another worker compacted: reload, then redo our unwritten changes
+            self._load()
+            for record, _ in self._inflight + self._pending:
+                self._apply(record)
+            self.stats["reloads"] += 1
+        elif st.st_size > self._offset:
+            self._replay_tail()
+
+    def refresh(self):
+        """Pick up changes other worker processes wrote since the last call"""
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            return
+        if st.st_ino != self._journal_inode:
+            with self._file_lock(exclusive=False), self._lock:
+                self._sync()
+        elif st.st_size > self._offset:
+            with self._lock:
+                self._sync()
+
+    def subscribe(self, listener: Callable[[str, Optional[dict], Optional[dict]], None]):
+        """Call ``listener(doc_id, old_doc, new_doc)`` after every applied change"""
+        self._listeners.append(listener)
+
+    def _apply(self, record: dict, notify: bool = True):
+        doc_id = record["id"]
+        old = self.data.get(doc_id)
+        if record["op"] == "put":
+            new = self.data[doc_id] = record["doc"]
+        else:
+            self.data.pop(doc_id, None)
+            new = None
+        if notify:
+            for listener in self._listeners:
+                listener(doc_id, old, new)
+
+    def put(self, doc_id: str, doc: dict) -> Future:
+        """Store ``doc``; the future resolves once the change is durable"""
+        return self._submit({"op": "put", "id": doc_id, "doc": doc, "origin": self.origin})
+
+    def delete(self, doc_id: str) -> Future:
+        """Remove a document; the future resolves once the change is durable"""
+        return self._submit({"op": "del", "id": doc_id, "origin": self.origin})
+
+    def _submit(self, record: dict) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._apply(record)
+            self._pending.append((record, future))
+            if self._writer is None:
+                self._start_writer()
+            self._wakeup.notify()
+        return future
+
+    def _start_writer(self):
+        # Caller holds self._lock
+        self._writer = threading.Thread(target=self._run, name=f"journal:{self.journal_path}", daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending and not self._closing:
+                        self._wakeup.wait(COMPACT_INTERVAL_SECONDS)
+                    batch, self._pending = self._pending, []
+                    self._inflight = batch
+                    closing = self._closing
+                try:
+                    if batch:
+                        self._commit(batch)
+                    if self._journal_records >= COMPACT_AFTER_RECORDS or (not batch and self._journal_records):
+                        self._compact()
+                except Exception as e:
+                    # The writer must outlive any error, or pending futures never resolve
+                    print(f"⚠️ Journal writer error for {self.journal_path}: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                if closing and not batch:
+                    return
+        finally:
+            with self._lock:
+                if self._writer is threading.current_thread():
+                    self._writer = None
+                    if self._pending:
+                        # Writes submitted while this writer was stopping
+                        self._start_writer()
+
+    def _commit(self, batch: List[Tuple[dict, Future]]):
+        try:
+            lines = "".join(json.dumps(record, default=str) + "\n" for record, _ in batch).encode()
+            with self._file_lock(exclusive=False):
+                fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    # One write per batch keeps lines from different workers whole
+                    os.write(fd, lines)
+                    os.fsync(fd)
+                    inode, end = os.fstat(fd).st_ino, os.lseek(fd, 0, os.SEEK_CUR)
+                finally:
+                    os.close(fd)
+                with self._lock:
+                    if self._journal_inode is None:
+                        # This write created the journal
+                        self._journal_inode = inode
+                    if inode == self._journal_inode and self._offset == end - len(lines):
+                        # Nobody appended since we last read: skip our own lines
+                        self._offset = end
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._inflight = []
+        self._journal_records += len(batch)
+        self.stats["commits"] += 1
+        self.stats["records"] += len(batch)
+        for _, future in batch:
+            future.set_result(None)
+
+    def _compact(self):
+        """Write the current state as a snapshot and start an empty journal"""
+        try:
+            with self._file_lock(exclusive=True):
+                with self._lock:
+                    self._sync()
+                    # Serialized under the lock: documents must not change mid-dump
+                    snapshot = json.dumps(self.data, default=str).encode()
+                self._write_atomic(self.snapshot_path, snapshot)
+                self._write_atomic(self.journal_path, b"")
+                with self._lock:
+                    self._journal_inode = os.stat(self.journal_path).st_ino
+                    self._offset = 0
+        except Exception as e:
+            # The journal still holds every change, so compaction can simply retry later
+            print(f"⚠️ Journal compaction failed for {self.snapshot_path}: {e}")
+            return
+        self._journal_records = 0
+        self.stats["compactions"] += 1
+
+    @staticmethod
+    def _write_atomic(path: str, content: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """Flush pending writes, compact and stop the writer thread
+
+        The store stays usable; a later write starts a new writer.
+        """
+        with self._lock:
+            self._closing = True
+            writer = self._writer
+            self._wakeup.notify()
+        if writer is not None:
+            writer.join()
+        with self._lock:
+            self._closing = False
+            if self._writer is writer:
+                self._writer = None
@@ -0,0 +1,92 @@
+"""Per-language advisory catalogs.
+
+Each ``app/locales/<language>.json`` file holds the seasonal
+recommendations for one language and a ``messages`` map that translates
+the English advisory texts from ``advisory_rules``. Catalogs are loaded
+once at import and every string is interned, so all responses share one
+copy of each text. The recommendations response for each (season,
+language) pair is serialized once, together with a strong ETag, and
+requests only pick the stored bytes.
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import orjson
+
+LOCALES_DIR = Path(os.getenv("LOCALES_DIR", Path(__file__).resolve().parent.parent / "locales"))
+DEFAULT_LANGUAGE = "en"
+DEFAULT_SEASON = "winter"
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    if isinstance(value, dict):
+        return {sys.intern(key): _intern(item) for key, item in value.items()}
+    return value
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _serialize(content) -> bytes:
+    # Same encoding as the app's default response class
+    return orjson.dumps(content)
+
+
+def load_catalogs(directory: Path = LOCALES_DIR) -> Dict[str, dict]:
+    catalogs = {}
+    for path in sorted(directory.glob("*.json")):
+        with open(path, encoding="utf-8") as f:
+            catalog = _intern(json.load(f))
+        catalogs[catalog.get("language", path.stem)] = catalog
+    if DEFAULT_LANGUAGE not in catalogs:
+        raise RuntimeError(f"No {DEFAULT_LANGUAGE} advisory catalog in {directory}")
+    return catalogs
+
+
+CATALOGS = load_catalogs()
+
+# (season, language) -> (body, etag)
+_RECOMMENDATION_BODIES: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+for _language, _catalog in CATALOGS.items():
+    for _season, _content in _catalog.get("recommendations", {}).items():
+        _body = _serialize(_content)
+        _RECOMMENDATION_BODIES[(_season, _language)] = (_body, _etag(_body))
+
+
+def language_of(language: str) -> str:
+    """Catalog language for a requested one; unknown languages get English"""
+    language = (language or "").strip().lower()
+    return language if language in CATALOGS else DEFAULT_LANGUAGE
+
+
+def recommendations_body(season: str, language: str) -> Tuple[bytes, str]:
+    """(pre-serialized JSON body, strong ETag); unknown seasons get winter"""
+    language = language_of(language)
+    body = _RECOMMENDATION_BODIES.get((season, language))
+    if body is None:
+        body = _RECOMMENDATION_BODIES.get((DEFAULT_SEASON, language)) or _RECOMMENDATION_BODIES[(DEFAULT_SEASON, DEFAULT_LANGUAGE)]
+    return body
+
+
+def translate(texts: Iterable[str], language: str) -> List[str]:
+    """Texts in ``language``; texts without a translation stay in English"""
+    messages = CATALOGS[language_of(language)].get("messages", {})
+    return [messages.get(text, text) for text in texts]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check; weak comparison as RFC 9110 requires for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,239 @@
+"""Shared response cache for GET routes that depend only on their query string.
+
+A route opts in by decorating its endpoint with :func:`cache_response`,
+passing a TTL and optional invalidation tags::
+
+    @router.get("/categories")
+    @cache_response(ttl=3600)
+    async def get_categories(): ...
+
+:class:`ResponseCacheMiddleware` finds the matching route before the
+request runs. Cached routes are keyed by path plus the sorted query
+string, and a hit replays the stored body. There is no handler call and
+no serialization. Every cached response carries an ETag and a
+Cache-Control max-age, and a matching If-None-Match gets a 304. On a
+miss the If-None-Match header is withheld from the route, so a
+revalidating client still gets the full response stored, and the
+conditional is answered from it afterwards. Anything
+that changes the data behind a tag must call
+:meth:`ResponseCache.invalidate` with that tag. Only complete 200
+responses are stored.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.routing import Match
+
+from app.utils.locales import etag_matches
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(1024 * 1024)))
+
+# Response headers that are replayed on a hit
+_STORED_HEADERS = {b"content-type", b"etag", b"cache-control", b"x-next-cursor", b"content-language"}
+
+
+class CachePolicy:
+    __slots__ = ("ttl", "tags")
+
+    def __init__(self, ttl: float, tags: Tuple[str, ...]):
+        self.ttl = ttl
+        self.tags = tags
+
+
+def cache_response(ttl: float, tags: Iterable[str] = ()) -> Callable:
+    """Opt a GET endpoint into the response cache for ``ttl`` seconds"""
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.__response_cache__ = CachePolicy(ttl, tuple(tags))
+        return endpoint
+    return decorate
+
+
+def cache_key(path: str, query_string: bytes) -> str:
+    """Path plus the query with parameters sorted, so ?a=1&b=2 and ?b=2&a=1 share an entry"""
+    params = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+class ResponseCache:
+    """LRU of cache key -> (status, headers, body, etag, expires_at, tags)"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_body: int = RESPONSE_CACHE_MAX_BODY):
+        self.max_entries = max(0, max_entries)
+        self.max_body = max_body
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._by_tag: Dict[str, set] = {}
+        # Bumped by invalidate(); a response started before the bump is not stored
+        self._generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0,
+                      "evictions": 0, "invalidations": 0, "uncacheable": 0}
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[4] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def generation(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key: str, headers: list, body: bytes, etag: bytes, policy: CachePolicy,
+            generation: Tuple[int, ...]):
+        with self._lock:
+            if self.max_entries == 0 or generation != tuple(self._generations.get(tag, 0) for tag in policy.tags):
+                return
+            self._drop(key)
+            self._entries[key] = (200, headers, body, etag, time.monotonic() + policy.ttl, policy.tags)
+            for tag in policy.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for tag in entry[5]:
+                self._by_tag.get(tag, set()).discard(key)
+
+    def invalidate(self, tag: str) -> int:
+        """Drop every entry stored under ``tag``; returns how many were dropped"""
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            keys = self._by_tag.pop(tag, set())
+            for key in keys:
+                self._drop(key)
+            self.stats["invalidations"] += 1
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": sum(len(entry[2]) for entry in self._entries.values()),
+                "max_entries": self.max_entries
+            }
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving opted-in GET routes from ``response_cache``"""
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+        self._policies: Dict[str, Optional[CachePolicy]] = {}
+
+    def _policy(self, scope) -> Optional[CachePolicy]:
+        path = scope["path"]
+        if path in self._policies:
+            return self._policies[path]
+        policy = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                policy = getattr(getattr(route, "endpoint", None), "__response_cache__", None)
+                break
+        if len(self._policies) < 10000:
+            self._policies[path] = policy
+        return policy
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        policy = self._policy(scope)
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        key = cache_key(scope["path"], scope.get("query_string", b""))
+        if_none_match = _header(scope, b"if-none-match")
+        entry = self.cache.get(key)
+        if entry is not None:
+            _, headers, body, etag, expires_at, _ = entry
+            max_age = max(0, int(expires_at - time.monotonic()))
+            headers = headers + [(b"cache-control", f"public, max-age={max_age}".encode()), (b"x-cache", b"HIT")]
+            return await self._send(send, headers, body, etag, if_none_match)
+
+        generation = self.cache.generation(policy.tags)
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        # The route must produce the full 200 even for a revalidating client
+        if if_none_match is not None:
+            scope = {**scope, "headers": [(name, value) for name, value in scope["headers"]
+                                          if name != b"if-none-match"]}
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        if start["status"] != 200:
+            self.cache.stats["uncacheable"] += 1
+            await send(start)
+            return await send({"type": "http.response.body", "body": body})
+
+        headers = [(name, value) for name, value in start.get("headers", [])
+                   if name.lower() != b"content-length"]
+        names = {name.lower() for name, _ in headers}
+
+        etag = next((value for name, value in headers if name.lower() == b"etag"), None)
+        if etag is None:
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'.encode()
+            headers.append((b"etag", etag))
+        if b"cache-control" not in names:
+            headers.append((b"cache-control", f"public, max-age={int(policy.ttl)}".encode()))
+        if len(body) <= self.cache.max_body:
+            stored = [(name, value) for name, value in headers
+                      if name.lower() in _STORED_HEADERS and name.lower() != b"cache-control"]
+            self.cache.put(key, stored, body, etag, policy, generation)
+        else:
+            self.cache.stats["uncacheable"] += 1
+        await self._send(send, headers + [(b"x-cache", b"MISS")], body, etag, if_none_match)
+
+    async def _send(self, send, headers: list, body: bytes, etag: bytes, if_none_match: Optional[str]):
+        if etag_matches(if_none_match, etag.decode("latin-1")):
+            self.cache.stats["not_modified"] += 1
+            keep = {b"etag", b"cache-control", b"x-cache"}
+            # Content-Length of the 200, so compression can tell whether it was encoded
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(name, value) for name, value in headers if name.lower() in keep]
+                        + [(b"content-length", str(len(body)).encode())]})
+            return await send({"type": "http.response.body", "body": b""})
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": headers + [(b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
@@ -0,0 +1,177 @@
+"""Response encoding: fast JSON rendering and negotiated compression.
+
+``FastJSONResponse`` is the app-wide default response class. It renders
+with orjson, which is several times faster than the stdlib encoder and
+also serializes NumPy values and ObjectIds.
+
+``CompressionMiddleware`` compresses responses of at least
+``COMPRESSION_MIN_SIZE`` bytes. It picks brotli or gzip from the client's
+Accept-Encoding, honouring q-values. Brotli is used only when the
+optional ``brotli`` package is installed. Streaming responses are
+compressed chunk by chunk and flushed after every chunk, so NDJSON
+clients still receive rows as they are produced. A compressed response
+gets its encoding appended to the ETag. That suffix is removed from
+If-None-Match before the request reaches the app, so conditional
+requests keep working. A 304 has no body, so its ETag is tagged only
+when its Content-Length shows the full response would have been
+compressed.
+"""
+import os
+import zlib
+from typing import Any, List, Optional, Tuple
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Already compressed formats are sent as they are
+_COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                       "application/xml", "image/svg+xml")
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson-rendered JSON; NumPy values, ObjectIds and non-string keys are allowed"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported content coding for an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    # Server preference (brotli first) breaks ties between equal q-values
+    for coding in available_encodings():
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the client's preferred encoding"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = scope.get("headers", [])
+        encoding = negotiate_encoding((_header(request_headers, b"accept-encoding") or b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        if_none_match = _header(request_headers, b"if-none-match")
+        if if_none_match is not None:
+            # The app only knows its own, uncompressed ETags
+            stripped = if_none_match.replace(f'-{encoding}"'.encode(), b'"')
+            scope = {**scope, "headers": [(k, stripped if k == b"if-none-match" else v) for k, v in request_headers]}
+
+        start = None
+        compressor: Optional[_Compressor] = None
+
+        async def compressing_send(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = list(start.get("headers", []))
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                compressible = (
+                    _header(headers, b"content-encoding") is None
+                    and content_type.startswith(_COMPRESSIBLE_TYPES)
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if start["status"] == 304:
+                    # No body to measure: the representation's Content-Length tells
+                    # whether the 200 went out compressed. Unknown means it did not.
+                    length = _header(headers, b"content-length")
+                    if (_header(headers, b"content-encoding") is None and length is not None
+                            and length.isdigit() and int(length) >= self.minimum_size):
+                        headers = [(k, v) for k, v in self._tag_etag(headers, encoding)
+                                   if k.lower() != b"content-length"]
+                if not compressible:
+                    await send({**start, "headers": headers + [(b"vary", b"Accept-Encoding")]})
+                    start = None  # pass the rest through untouched
+                    return await send(message)
+                compressor = _Compressor(encoding)
+                headers = [(k, v) for k, v in self._tag_etag(headers, encoding) if k.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                data = compressor.compress(body, final=not more_body)
+                if not more_body:
+                    headers.append((b"content-length", str(len(data)).encode()))
+                await send({**start, "headers": headers})
+                return await send({"type": "http.response.body", "body": data, "more_body": more_body})
+            data = compressor.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    @staticmethod
+    def _tag_etag(headers: list, encoding: str) -> list:
+        """Give each encoded representation its own strong ETag"""
+        suffix = f'-{encoding}"'.encode()
+        return [(k, v[:-1] + suffix if k.lower() == b"etag" and v.endswith(b'"') and not v.endswith(suffix) else v)
+                for k, v in headers]
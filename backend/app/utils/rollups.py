@@ -0,0 +1,351 @@
+"""Time-bucketed rollups of platform events per Indian state.
+
+Every registration and order is added, as it happens, to minute, hour,
+day and month buckets for its state and for the platform total. Each
+(state, resolution) pair owns a fixed-size NumPy ring buffer: a slot is
+reused once its bucket falls out of the retention window, which is
+detected by comparing the bucket number stored next to the slot. Range
+queries therefore read a few array slices and never touch raw user or
+order records. The buffers are saved to an ``.npz`` file periodically
+and on shutdown, and loaded when the store is first used (at startup,
+not on import, so importing this module touches no files). Worker processes share that
+file: every save merges the worker's new counts into it under a file
+lock. The file also records the backfill cutoff, so counts of earlier
+records are never added twice.
+"""
+import asyncio
+import calendar
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.journal import file_lock
+
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", "rollups.npz")
+ROLLUP_SAVE_INTERVAL = float(os.getenv("ROLLUP_SAVE_INTERVAL", "60"))
+
+METRICS = ("users", "farmers", "consumers", "orders", "revenue")
+
+# Resolution -> number of buckets kept
+RETENTION = {
+    "minute": 24 * 60,   # one day
+    "hour": 30 * 24,     # one month
+    "day": 400,          # a little over a year
+    "month": 10 * 12,    # ten years
+}
+
+ALL_STATES = "ALL"
+UNKNOWN_STATE = "Unknown"
+
+# States and union territories; anything else is counted under UNKNOWN_STATE
+STATES = (
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan",
+    "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry",
+)
+# Abbreviations and cities used as product locations
+_STATE_ALIASES = {
+    "up": "Uttar Pradesh", "mp": "Madhya Pradesh", "hp": "Himachal Pradesh", "j&k": "Jammu and Kashmir",
+    "new delhi": "Delhi", "bangalore": "Karnataka", "bengaluru": "Karnataka", "mumbai": "Maharashtra",
+    "pune": "Maharashtra", "chennai": "Tamil Nadu", "hyderabad": "Telangana", "kolkata": "West Bengal",
+    "orissa": "Odisha", "pondicherry": "Puducherry",
+    **{state.lower(): state for state in STATES},
+}
+
+
+def state_of(place: Optional[str]) -> str:
+    """State for a state name, abbreviation or known city; UNKNOWN_STATE otherwise"""
+    if not place:
+        return UNKNOWN_STATE
+    return _STATE_ALIASES.get(place.strip().lower(), UNKNOWN_STATE)
+
+
+def bucket_of(resolution: str, when: datetime) -> int:
+    """Bucket number of ``when`` (UTC) at ``resolution``"""
+    if resolution == "month":
+        return when.year * 12 + when.month - 1
+    seconds = int(calendar.timegm(when.utctimetuple()))
+    return seconds // {"minute": 60, "hour": 3600, "day": 86400}[resolution]
+
+
+def month_label(bucket: int) -> str:
+    return calendar.month_abbr[bucket % 12 + 1]
+
+
+class _Ring:
+    """Fixed number of buckets of METRICS sums, addressed by bucket number"""
+
+    def __init__(self, size: int, values: Optional[np.ndarray] = None, buckets: Optional[np.ndarray] = None):
+        self.size = size
+        self.values = values if values is not None else np.zeros((size, len(METRICS)), dtype=np.float64)
+        self.buckets = buckets if buckets is not None else np.full(size, -1, dtype=np.int64)
+
+    def add(self, bucket: int, amounts: np.ndarray):
+        slot = bucket % self.size
+        if self.buckets[slot] != bucket:
+            # Slot last held a bucket that is now outside the retention window
+            self.values[slot] = 0
+            self.buckets[slot] = bucket
+        self.values[slot] += amounts
+
+    def range(self, first: int, last: int) -> np.ndarray:
+        """(last - first + 1, len(METRICS)) sums; buckets no longer retained read as zero"""
+        first = max(first, last - self.size + 1)
+        wanted = np.arange(first, last + 1)
+        slots = wanted % self.size
+        live = self.buckets[slots] == wanted
+        return self.values[slots] * live[:, None]
+
+    def merge(self, other: "_Ring"):
+        """Add ``other``'s buckets; where the two hold different buckets the newer one wins"""
+        same = self.buckets == other.buckets
+        newer = other.buckets > self.buckets
+        self.values[same] += other.values[same]
+        self.values[newer] = other.values[newer]
+        self.buckets[newer] = other.buckets[newer]
+
+
+class RollupStore:
+    """Per-state minute/hour/day/month rollups of registrations and orders"""
+
+    def __init__(self, path: str = ROLLUP_PATH):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.Lock()
+        # Documents created before this are counted by backfill(), later ones by ingest()
+        self.cutoff = datetime.utcnow()
+        self._rings: Dict[Tuple[str, str], _Ring] = {}
+        # Counts added since the last save, merged into the file by the next one
+        self._pending: Dict[Tuple[str, str], _Ring] = {}
+        self._history: Optional[Dict[Tuple[str, str], _Ring]] = None
+        with file_lock(self.lock_path, exclusive=False):
+            saved = self._read()
+        self.loaded = saved is not None
+        if saved is not None:
+            self._rings = saved[0]
+        # Until this process first merges into the file, its events are also kept whole:
+        # the ones older than the file's cutoff are already in that file's backfill
+        self._unmerged: Optional[list] = None if self.loaded else []
+        self.dirty = False
+
+    def ingest(self, state: Optional[str], when: Optional[datetime] = None, **amounts: float):
+        """Add ``amounts`` (keyword per metric) to every resolution for state and the total"""
+        when = when or datetime.utcnow()
+        vector = np.array([amounts.get(metric, 0.0) for metric in METRICS], dtype=np.float64)
+        with self._lock:
+            _add(self._rings, state, when, vector)
+            _add(self._pending, state, when, vector)
+            if self._unmerged is not None:
+                self._unmerged.append((state, when, vector))
+            self.dirty = True
+
+    def series(self, resolution: str, periods: int, state: str = ALL_STATES,
+               now: Optional[datetime] = None) -> List[Tuple[int, Dict[str, float]]]:
+        """(bucket, {metric: sum}) for the last ``periods`` buckets, oldest first"""
+        last = bucket_of(resolution, now or datetime.utcnow())
+        first = last - periods + 1
+        with self._lock:
+            ring = self._rings.get((state, resolution))
+            rows = ring.range(first, last) if ring is not None else np.zeros((periods, len(METRICS)))
+        first = last - len(rows) + 1
+        return [(first + i, dict(zip(METRICS, row.tolist()))) for i, row in enumerate(rows)]
+
+    def totals_by_state(self, resolution: str = "month", periods: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """Sums per state over the last ``periods`` buckets (everything retained by default)"""
+        last = bucket_of(resolution, datetime.utcnow())
+        first = last - (periods or RETENTION[resolution]) + 1
+        with self._lock:
+            sums = {
+                state: ring.range(first, last).sum(axis=0)
+                for (state, ring_resolution), ring in self._rings.items()
+                if ring_resolution == resolution and state != ALL_STATES
+            }
+        return {state: dict(zip(METRICS, row.tolist())) for state, row in sums.items()}
+
+    def _read(self) -> Optional[Tuple[Dict[Tuple[str, str], _Ring], datetime]]:
+        """(rings, cutoff) from ``path``; None if there is no usable file"""
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                if tuple(saved["metrics"].tolist()) != METRICS:
+                    print(f"⚠️ Ignoring rollups in {self.path}: metrics changed")
+                    return None
+                rings = {}
+                for i, (state, resolution) in enumerate(saved["keys"].tolist()):
+                    buckets = saved[f"buckets_{i}"]
+                    if RETENTION.get(resolution) != len(buckets):
+                        continue
+                    rings[(state, resolution)] = _Ring(len(buckets), saved[f"values_{i}"].copy(), buckets.copy())
+                cutoff = datetime.fromisoformat(str(saved["cutoff"])) if "cutoff" in saved else datetime.min
+            return rings, cutoff
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Could not load rollups from {self.path}: {e}")
+            return None
+
+    def _write(self, rings: Dict[Tuple[str, str], _Ring], cutoff: datetime):
+        keys = list(rings)
+        arrays = {}
+        for i, key in enumerate(keys):
+            arrays[f"values_{i}"] = rings[key].values
+            arrays[f"buckets_{i}"] = rings[key].buckets
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, metrics=np.array(METRICS), keys=np.array(keys, dtype=str).reshape(-1, 2),
+                            cutoff=np.array(cutoff.isoformat()), **arrays)
+        os.replace(tmp_path, self.path)
+
+    def save(self):
+        """Merge the counts added since the last save into ``path``
+
+        Workers share the file: each one re-reads it under an exclusive
+        lock, adds only its own new counts and replaces it atomically, then
+        serves the merged totals, so every worker's history is kept.
+        """
+        with file_lock(self.lock_path, exclusive=True):
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                unmerged = list(self._unmerged) if self._unmerged is not None else None
+                history = self._history
+                self.dirty = False
+            try:
+                merged = self._merged(pending, unmerged, history)
+                if merged is not None:
+                    self._write(*merged)
+            except BaseException:
+                merged = None
+                raise
+            finally:
+                if merged is None:
+                    # Kept for the next save
+                    with self._lock:
+                        _merge(self._pending, pending)
+                        self.dirty = True
+        if merged is None:
+            return
+        with self._lock:
+            self._unmerged = None
+            self._history = None
+            self.loaded = True
+            # The file now has every worker's counts; add what arrived during the save
+            rings = merged[0]
+            _merge(rings, self._pending)
+            self._rings = rings
+
+    def _merged(self, pending, unmerged, history):
+        """(rings, cutoff) to write: the file plus this process's new counts; None if not ready"""
+        saved = self._read()
+        if saved is not None:
+            rings, cutoff = saved
+            if unmerged is not None:
+                # Whatever happened before the file's cutoff is in its backfill already
+                pending = {}
+                for state, when, vector in unmerged:
+                    if when >= cutoff:
+                        _add(pending, state, when, vector)
+        elif history is not None:
+            rings, cutoff = _copy(history), self.cutoff
+        else:
+            # Not backfilled yet, and the database still holds everything counted so far
+            return None
+        _merge(rings, pending)
+        return rings, cutoff
+
+    async def backfill(self, db):
+        """Rebuild rollups from stored users and orders created before ``cutoff``, e.g. on first start"""
+        history: Dict[Tuple[str, str], _Ring] = {}
+
+        def add(state, created_at, **amounts):
+            when = _as_datetime(created_at) or self.cutoff
+            if when < self.cutoff:
+                _add(history, state, when, np.array([amounts.get(metric, 0.0) for metric in METRICS], dtype=np.float64))
+
+        try:
+            async for user in db.users.find({}, {"user_type": 1, "state": 1, "created_at": 1}):
+                user_type = user.get("user_type")
+                add(user.get("state"), user.get("created_at"), users=1,
+                    farmers=int(user_type == "farmer"), consumers=int(user_type == "consumer"))
+            async for order in db.orders.find({}, {"state": 1, "total_amount": 1, "created_at": 1}):
+                add(order.get("state"), order.get("created_at"), orders=1, revenue=order.get("total_amount", 0))
+        except Exception:
+            # Go on with live counts only rather than never saving
+            history = {}
+            raise
+        finally:
+            with self._lock:
+                # Another worker's file already holds the history once this process merged into it
+                if not self.loaded:
+                    self._history = history
+                    _merge(self._rings, history)
+                    self.dirty = True
+
+
+def _ring(rings: Dict[Tuple[str, str], _Ring], state: str, resolution: str) -> _Ring:
+    ring = rings.get((state, resolution))
+    if ring is None:
+        ring = rings[(state, resolution)] = _Ring(RETENTION[resolution])
+    return ring
+
+
+def _add(rings: Dict[Tuple[str, str], _Ring], state: Optional[str], when: datetime, vector: np.ndarray):
+    for resolution in RETENTION:
+        bucket = bucket_of(resolution, when)
+        for key in {state_of(state), ALL_STATES}:
+            _ring(rings, key, resolution).add(bucket, vector)
+
+
+def _merge(into: Dict[Tuple[str, str], _Ring], rings: Dict[Tuple[str, str], _Ring]):
+    for (state, resolution), ring in rings.items():
+        _ring(into, state, resolution).merge(ring)
+
+
+def _copy(rings: Dict[Tuple[str, str], _Ring]) -> Dict[Tuple[str, str], _Ring]:
+    return {key: _Ring(ring.size, ring.values.copy(), ring.buckets.copy()) for key, ring in rings.items()}
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    # Mock collections store datetimes as strings once reloaded from disk
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+_rollups: Optional[RollupStore] = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups() -> RollupStore:
+    """Lazily create the process-wide store, loading ``ROLLUP_PATH`` on first use"""
+    global _rollups
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                _rollups = RollupStore()
+    return _rollups
+
+
+async def run_rollup_persister(get_db, interval: float = ROLLUP_SAVE_INTERVAL):
+    """Backfill if nothing was saved yet, then save changed rollups every ``interval`` seconds"""
+    rollups = get_rollups()
+    if not rollups.loaded:
+        try:
+            await rollups.backfill(get_db())
+        except Exception as e:
+            print(f"⚠️ Rollup backfill failed: {e}")
+    while True:
+        await asyncio.sleep(interval)
+        if rollups.dirty:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, rollups.save)
+            except OSError as e:
+                print(f"⚠️ Could not save rollups: {e}")
@@ -0,0 +1,171 @@
+"""Incremental inverted index with BM25 ranking for marketplace search.
+
+Documents are indexed by field (name, description, seller, location) with
+per-field weights. Query tokens match indexed terms exactly, as a prefix or
+anywhere inside them (via a sorted list of term suffixes), or, when longer
+than four characters, within one edit (via a single-deletion neighbourhood
+index). Documents must match every query token. Tokenization keeps Devanagari vowel signs and
+viramas inside words so Hindi listings are searchable too.
+"""
+import bisect
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Word characters plus the Devanagari block, minus the danda punctuation marks
+TOKEN_RE = re.compile(r"[\w\u0900-\u0963\u0966-\u097F]+")
+
+FIELD_WEIGHTS = {"name": 3.0, "seller": 1.5, "location": 1.5, "description": 1.0}
+
+# How much a non-exact match counts compared with an exact one
+PREFIX_WEIGHT = 0.8
+INFIX_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.5
+# Shorter tokens have too many neighbours within one edit ("rice" -> "rich")
+MIN_FUZZY_LEN = 5
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized, case-folded tokens"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(unicodedata.normalize("NFC", str(text)).casefold())
+
+
+def _deletions(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchIndex:
+    """Field-weighted inverted index supporting add, remove and ranked search"""
+
+    def __init__(self, field_weights: Dict[str, float] = FIELD_WEIGHTS):
+        self.field_weights = field_weights
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_len: Dict[int, float] = {}
+        self._total_len = 0.0
+        # (suffix, term) for every suffix of every indexed term, sorted; new
+        # entries wait in _pending_suffixes and are merged in by the next search
+        self._suffixes: List[Tuple[str, str]] = []
+        self._pending_suffixes: List[Tuple[str, str]] = []
+        self._fuzzy: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def _add_term(self, term: str):
+        self._pending_suffixes.extend((term[i:], term) for i in range(len(term)))
+        if len(term) >= MIN_FUZZY_LEN:
+            for variant in _deletions(term) | {term}:
+                self._fuzzy.setdefault(variant, set()).add(term)
+
+    def _merge_suffixes(self) -> List[Tuple[str, str]]:
+        if self._pending_suffixes:
+            # Timsort merges the sorted run with the sorted batch in linear time
+            self._pending_suffixes.sort()
+            self._suffixes += self._pending_suffixes
+            self._suffixes.sort()
+            self._pending_suffixes = []
+        return self._suffixes
+
+    def _drop_term(self, term: str):
+        self._merge_suffixes()
+        for i in range(len(term)):
+            entry = (term[i:], term)
+            index = bisect.bisect_left(self._suffixes, entry)
+            if index < len(self._suffixes) and self._suffixes[index] == entry:
+                del self._suffixes[index]
+        if len(term) >= MIN_FUZZY_LEN:
+            for variant in _deletions(term) | {term}:
+                bucket = self._fuzzy.get(variant)
+                if bucket is not None:
+                    bucket.discard(term)
+                    if not bucket:
+                        del self._fuzzy[variant]
+
+    def add(self, doc_id: int, document: dict):
+        """Index ``document`` under ``doc_id``, replacing any previous version"""
+        self.remove(doc_id)
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            tokens = tokenize(document.get(field, ""))
+            length += weight * len(tokens)
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[doc_id] = frequency
+        self._doc_terms[doc_id] = frequencies
+        self._doc_len[doc_id] = length
+        self._total_len += length
+
+    def remove(self, doc_id: int):
+        """Remove ``doc_id`` from the index if present"""
+        frequencies = self._doc_terms.pop(doc_id, None)
+        if frequencies is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id)
+        for term in frequencies:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+
+    def _expand(self, token: str) -> Iterable[Tuple[str, float]]:
+        """Indexed terms matching ``token`` with their match weight"""
+        matches: Dict[str, float] = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        suffixes = self._merge_suffixes()
+        index = bisect.bisect_left(suffixes, (token,))
+        while index < len(suffixes) and suffixes[index][0].startswith(token):
+            suffix, term = suffixes[index]
+            weight = PREFIX_WEIGHT if suffix == term else INFIX_WEIGHT
+            if weight > matches.get(term, 0.0):
+                matches[term] = weight
+            index += 1
+        if len(token) >= MIN_FUZZY_LEN:
+            for variant in _deletions(token) | {token}:
+                for term in self._fuzzy.get(variant, ()):
+                    matches.setdefault(term, FUZZY_WEIGHT)
+                if variant in self._postings:
+                    matches.setdefault(variant, FUZZY_WEIGHT)
+        return matches.items()
+
+    def search(self, query: str) -> Dict[int, float]:
+        """BM25 scores of documents matching every token of ``query``"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self._doc_len:
+            return {}
+        doc_count = len(self._doc_len)
+        avg_len = self._total_len / doc_count or 1.0
+        scores: Dict[int, float] = {}
+        for i, token in enumerate(tokens):
+            token_scores: Dict[int, float] = {}
+            for term, match_weight in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if i and doc_id not in scores:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[doc_id] / avg_len)
+                    score = match_weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    if score > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = score
+            if not token_scores:
+                return {}
+            if i:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items()}
+            else:
+                scores = token_scores
+        return scores
@@ -0,0 +1,173 @@
+"""Materialized platform statistics for the admin dashboard.
+
+Registrations, logins, orders and listings bump in-memory counters as
+they happen, so the dashboard reads them in O(1) instead of scanning
+collections. Counters are per process and only see that process's
+events; a background job periodically recounts users and orders from the
+database and replaces the counters with the recounted values, which
+corrects drift from other workers, restarts and missed events.
+:class:`ResponseTimeMiddleware` records how long this process takes to
+answer HTTP requests.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, datetime
+from typing import Callable, Iterable, Optional
+
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "300"))
+# Response times kept for the dashboard's average
+RESPONSE_TIME_WINDOW = int(os.getenv("RESPONSE_TIME_WINDOW", "1000"))
+
+# Orders whose items travel at most this far on average count as locally sourced
+LOCAL_SOURCING_KM = 50
+
+
+class PlatformStats:
+    """Incrementally maintained counters behind GET /api/admin/stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.users = defaultdict(int)  # user_type -> count
+        self.orders = defaultdict(float)  # totals over all orders
+        self.sellers = set()
+        self.listings = 0
+        self._day = date.today()
+        self.today = defaultdict(float)
+        self.active_today = set()
+        self.reconciled_at: Optional[datetime] = None
+        self.reconciliations = 0
+        self.started_at = time.monotonic()
+        self.response_times = deque(maxlen=RESPONSE_TIME_WINDOW)
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.today = defaultdict(float)
+            self.active_today = set()
+
+    def record_registration(self, user_type: str):
+        with self._lock:
+            self._roll_day()
+            self.users[user_type or "farmer"] += 1
+            self.today["registrations"] += 1
+
+    def record_login(self, username: str):
+        with self._lock:
+            self._roll_day()
+            self.active_today.add(username)
+
+    @staticmethod
+    def _order_totals(order: dict) -> dict:
+        items = order.get("total_items", 0)
+        return {
+            "count": 1,
+            "revenue": order.get("total_amount", 0),
+            "items": items,
+            "organic_items": order.get("organic_items", 0),
+            "distance_km": order.get("total_distance_km", 0),
+            "carbon_footprint_kg": order.get("carbon_footprint_kg", 0),
+            "carbon_saved_kg": order.get("carbon_saved_kg", 0),
+            "local_orders": int(items > 0 and order.get("total_distance_km", 0) / items <= LOCAL_SOURCING_KM)
+        }
+
+    def record_orders(self, orders: Iterable[dict]):
+        with self._lock:
+            self._roll_day()
+            for order in orders:
+                for name, value in self._order_totals(order).items():
+                    self.orders[name] += value
+                self.today["orders"] += 1
+                self.today["revenue"] += order.get("total_amount", 0)
+                self.sellers.update(order.get("seller_ids", []))
+
+    def record_listing(self, delta: int = 1):
+        with self._lock:
+            self.listings += delta
+
+    def record_response(self, seconds: float):
+        self.response_times.append(seconds)
+
+    async def reconcile(self, db, listings: int):
+        """Recount users and orders from the database and replace the counters"""
+        users = defaultdict(int)
+        async for user in db.users.find({}, {"user_type": 1}):
+            users[user.get("user_type") or "farmer"] += 1
+        orders = defaultdict(float)
+        sellers = set()
+        projection = {field: 1 for field in (
+            "total_amount", "total_items", "organic_items", "total_distance_km",
+            "carbon_footprint_kg", "carbon_saved_kg", "seller_ids"
+        )}
+        async for order in db.orders.find({}, projection):
+            for name, value in self._order_totals(order).items():
+                orders[name] += value
+            sellers.update(order.get("seller_ids", []))
+        with self._lock:
+            # Events recorded while scanning may be missing here; the next pass picks them up
+            self.users = users
+            self.orders = orders
+            self.sellers = sellers
+            self.listings = listings
+            self.reconciled_at = datetime.utcnow()
+            self.reconciliations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._roll_day()
+            orders = dict(self.orders)
+            items = orders.get("items", 0)
+            count = orders.get("count", 0)
+            response_times = list(self.response_times)
+            return {
+                "users": dict(self.users),
+                "total_users": sum(self.users.values()),
+                "orders": orders,
+                "avg_order_value": round(orders.get("revenue", 0) / count, 2) if count else 0,
+                "organic_percentage": round(orders.get("organic_items", 0) / items * 100, 1) if items else 0,
+                "local_sourcing_percentage": round(orders.get("local_orders", 0) / count * 100, 1) if count else 0,
+                "avg_delivery_distance_km": round(orders.get("distance_km", 0) / items, 1) if items else 0,
+                "farmers_supported": len(self.sellers),
+                "listings": self.listings,
+                "today": dict(self.today),
+                "active_users_today": len(self.active_today),
+                "avg_response_time_ms": round(sum(response_times) / len(response_times) * 1000, 1) if response_times else None,
+                "uptime_seconds": int(time.monotonic() - self.started_at),
+                "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None
+            }
+
+
+platform_stats = PlatformStats()
+
+
+class ResponseTimeMiddleware:
+    """ASGI middleware timing each HTTP request into ``platform_stats``"""
+
+    def __init__(self, app, stats: PlatformStats = platform_stats):
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.stats.record_response(time.perf_counter() - started)
+
+
+async def run_reconciler(get_db: Callable, listings_count: Callable[[], int],
+                         interval: float = STATS_RECONCILE_INTERVAL):
+    """Reconcile platform_stats now and then every ``interval`` seconds"""
+    while True:
+        try:
+            await platform_stats.reconcile(get_db(), listings_count())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Stats reconciliation failed: {e}")
+        await asyncio.sleep(interval)
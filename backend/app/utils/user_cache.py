@@ -0,0 +1,85 @@
+"""Per-process read-through cache of user records keyed by username.
+
+Authenticated routes look the caller up on every request. Records are
+cached for ``USER_CACHE_TTL`` seconds, and lookups of unknown usernames
+are remembered for a shorter ``USER_CACHE_NEGATIVE_TTL`` so repeated
+requests with a stale token do not hit the database either. Anything that
+changes a user must call :meth:`UserCache.invalidate`.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "10"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+
+
+class UserCache:
+    """LRU of username -> user document (or None for unknown users) with TTLs"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, negative_ttl: float = USER_CACHE_NEGATIVE_TTL,
+                 max_size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max(0, max_size)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # username -> (user, expires_at)
+        self._db = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, db, username: str) -> Optional[dict]:
+        """User document for ``username`` from the cache, else from ``db.users``"""
+        if db is not self._db:
+            # A different backend (e.g. MongoDB came up) means cached records are stale
+            self._entries.clear()
+            self._db = db
+        entry = self._entries.get(username)
+        if entry is not None and entry[1] > time.time():
+            self._entries.move_to_end(username)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[0]
+        self.misses += 1
+        user = await db.users.find_one({"username": username})
+        self._store(username, user)
+        return user
+
+    def _store(self, username: str, user: Optional[dict]):
+        ttl = self.ttl if user is not None else self.negative_ttl
+        if not self.max_size or ttl <= 0:
+            return
+        self._entries[username] = (user, time.time() + ttl)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        """Forget ``username`` so the next lookup reads the database"""
+        if self._entries.pop(username, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+user_cache = UserCache()
@@ -0,0 +1,106 @@
+"""Paginated and streaming reads of the users collection for admin listings.
+
+Pages are keyset based: they are ordered by ``_id`` and the next page
+starts after the last ``_id`` returned, so deep pages cost the same as
+the first one. Exports stream NDJSON or CSV rows straight off the cursor,
+one batch at a time, without building the full list in memory.
+"""
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+USER_EXPORT_BATCH_SIZE = int(os.getenv("USER_EXPORT_BATCH_SIZE", "500"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+USER_FIELDS = ["id", "username", "email", "full_name", "user_type", "phone", "created_at", "is_active"]
+
+# Never read password hashes for listings
+USER_PROJECTION = {field: 1 for field in USER_FIELDS if field != "id"}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def user_row(user: dict) -> dict:
+    """Public listing fields of a user document"""
+    return {
+        "id": str(user.get("_id", "")),
+        "username": user.get("username", ""),
+        "email": user.get("email", ""),
+        "full_name": user.get("full_name", ""),
+        "user_type": user.get("user_type", ""),
+        "phone": user.get("phone", ""),
+        "created_at": user.get("created_at", ""),
+        "is_active": user.get("is_active", True)
+    }
+
+
+def _users_cursor(db, after: Optional[str] = None, limit: Optional[int] = None):
+    query = {}
+    if after:
+        try:
+            query["_id"] = {"$gt": ObjectId(after)}
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    cursor = db.users.find(query, USER_PROJECTION).sort("_id", 1).batch_size(USER_EXPORT_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+async def list_users(db, limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of user rows and the cursor for the next page (None on the last page)"""
+    # One extra row tells whether another page follows
+    rows = [user_row(user) async for user in _users_cursor(db, after, limit + 1 if limit else None)]
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]["id"]
+    return rows, next_cursor
+
+
+async def _ndjson_chunks(cursor) -> AsyncIterator[str]:
+    chunk = []
+    size = 0
+    async for user in cursor:
+        line = json.dumps(user_row(user), default=str) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+async def _csv_chunks(cursor) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=USER_FIELDS)
+    writer.writeheader()
+    async for user in cursor:
+        writer.writerow(user_row(user))
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_users(db, export_format: str, after: Optional[str] = None, limit: Optional[int] = None) -> StreamingResponse:
+    """Stream users as NDJSON or CSV in ``_id`` order"""
+    cursor = _users_cursor(db, after, limit)
+    chunks = _csv_chunks(cursor) if export_format == "csv" else _ndjson_chunks(cursor)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="users.{export_format}"'}
+    )
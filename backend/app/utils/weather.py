@@ -0,0 +1,205 @@
+"""Async weather client with caching for the advisory service.
+
+Current conditions are fetched from an OpenWeatherMap-compatible API at
+``WEATHER_BASE_URL`` through one pooled ``httpx.AsyncClient``. Results
+are cached per (city, hour bucket) for ``WEATHER_CACHE_TTL`` seconds.
+After that they are still served, for up to ``WEATHER_STALE_TTL``
+seconds, while a single background refresh runs. Concurrent misses for
+the same city share one upstream request, and after a failed request the
+city is not retried for ``WEATHER_RETRY_AFTER`` seconds: stale readings
+keep being served and misses fail fast. When a database is available,
+the latest reading per city is also kept in ``db.weather_cache`` so
+other worker processes can start from it instead of calling upstream.
+
+Point ``WEATHER_BASE_URL`` at a local stub server to test without the
+real provider.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import httpx
+from cachetools import TTLCache
+
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "demo_key")
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5")
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "300"))
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "3600"))
+WEATHER_RETRY_AFTER = float(os.getenv("WEATHER_RETRY_AFTER", "30"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20"))
+
+
+class WeatherUnavailable(Exception):
+    """Raised when no cached reading exists and the upstream call failed"""
+
+
+def _hour_bucket(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // 3600)
+
+
+def parse_current_weather(payload: dict, city: str) -> dict:
+    """Advisory weather fields from an OpenWeatherMap /weather response"""
+    main = payload.get("main", {})
+    return {
+        "city": payload.get("name") or city,
+        "temperature": round(main["temp"]),
+        "humidity": round(main.get("humidity", 0)),
+        # Rain over the last hour in mm; absent when it is dry
+        "rainfall": round(payload.get("rain", {}).get("1h", 0)),
+        # m/s to km/h
+        "wind_speed": round(payload.get("wind", {}).get("speed", 0) * 3.6),
+        "uv_index": payload.get("uvi"),
+        "soil_temperature": None,
+        "description": (payload.get("weather") or [{}])[0].get("description")
+    }
+
+
+class WeatherClient:
+    """Cached, request-coalescing client for current weather by city"""
+
+    def __init__(self, base_url: str = WEATHER_BASE_URL, api_key: str = WEATHER_API_KEY,
+                 ttl: float = WEATHER_CACHE_TTL, stale_ttl: float = WEATHER_STALE_TTL,
+                 retry_after: float = WEATHER_RETRY_AFTER,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.transport = transport
+        # (city, hour bucket) -> (reading, fetched_at)
+        self.cache: TTLCache = TTLCache(maxsize=1000, ttl=self.stale_ttl)
+        # city -> time of its last failed upstream request, while cooling down
+        self._failures: TTLCache = TTLCache(maxsize=1000, ttl=retry_after)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                      "upstream_calls": 0, "upstream_errors": 0, "shared_hits": 0,
+                      "cooldown_skips": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Real data needs an API key, or an explicitly configured (e.g. stub) server"""
+        return self.api_key != "demo_key" or "WEATHER_BASE_URL" in os.environ
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=WEATHER_TIMEOUT,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=WEATHER_MAX_CONNECTIONS,
+                                    max_keepalive_connections=WEATHER_MAX_CONNECTIONS)
+            )
+        return self._client
+
+    def _cached(self, key: str) -> Tuple[Optional[Tuple[dict, float]], bool]:
+        """(entry, is_fresh) for ``key``"""
+        bucket = _hour_bucket()
+        entry = self.cache.get((key, bucket))
+        if entry is not None:
+            return entry, time.time() - entry[1] < self.ttl
+        # The previous hour's reading is still good enough to serve stale
+        return self.cache.get((key, bucket - 1)), False
+
+    async def get(self, city: str, db=None) -> Tuple[dict, bool]:
+        """(reading, is_stale) for ``city``; WeatherUnavailable if nothing can be served"""
+        key = city.strip().casefold()
+        entry, fresh = self._cached(key)
+        if entry is not None:
+            reading = entry[0]
+            if fresh:
+                self.stats["hits"] += 1
+                return reading, False
+            # Stale: answer now and refresh in the background
+            self.stats["stale_hits"] += 1
+            if key in self._failures:
+                self.stats["cooldown_skips"] += 1
+            else:
+                self._refresh(key, city, db)
+            return reading, True
+        self.stats["misses"] += 1
+        if key in self._failures and key not in self._inflight:
+            self.stats["cooldown_skips"] += 1
+            raise WeatherUnavailable(f"Weather provider failed recently for {city}; retrying later")
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+        reading = await asyncio.shield(self._refresh(key, city, db))
+        return reading, False
+
+    def _refresh(self, key: str, city: str, db) -> asyncio.Task:
+        """Start one fetch per city; concurrent callers share the same task"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key, city, db))
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved; background refresh errors are counted, not raised
+
+    async def _fetch(self, key: str, city: str, db) -> dict:
+        shared = await self._load_shared(key, db)
+        if shared is not None:
+            return shared
+        self.stats["upstream_calls"] += 1
+        try:
+            response = await self._http().get(
+                "/weather", params={"q": f"{city},IN", "appid": self.api_key, "units": "metric"}
+            )
+            response.raise_for_status()
+            reading = parse_current_weather(response.json(), city)
+        except (httpx.HTTPError, KeyError, TypeError, ValueError) as e:
+            self.stats["upstream_errors"] += 1
+            self._failures[key] = time.time()
+            raise WeatherUnavailable(f"Weather provider error for {city}: {e}") from e
+        fetched_at = time.time()
+        self._failures.pop(key, None)
+        self.cache[(key, _hour_bucket(fetched_at))] = (reading, fetched_at)
+        await self._store_shared(key, reading, fetched_at, db)
+        return reading
+
+    async def _load_shared(self, key: str, db) -> Optional[dict]:
+        """Fresh reading another worker saved in db.weather_cache, if any"""
+        if db is None:
+            return None
+        try:
+            doc = await db.weather_cache.find_one({"key": key})
+        except Exception:
+            return None
+        if not doc or doc.get("bucket") != _hour_bucket() or time.time() - doc.get("fetched_at", 0) >= self.ttl:
+            return None
+        self.stats["shared_hits"] += 1
+        self.cache[(key, doc["bucket"])] = (doc["reading"], doc["fetched_at"])
+        return doc["reading"]
+
+    async def _store_shared(self, key: str, reading: dict, fetched_at: float, db):
+        if db is None:
+            return
+        doc = {
+            "key": key,
+            "bucket": _hour_bucket(fetched_at),
+            "reading": reading,
+            "fetched_at": fetched_at,
+            # TTL index on expires_at removes cities nobody asks about any more
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.stale_ttl)
+        }
+        try:
+            await db.weather_cache.replace_one({"key": key}, doc, upsert=True)
+        except Exception as e:
+            print(f"⚠️ Could not share weather reading for {key}: {e}")
+
+    def metrics(self) -> dict:
+        return {**self.stats, "cached_entries": len(self.cache), "refreshing": len(self._inflight)}
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+weather_client = WeatherClient()
@@ -0,0 +1,144 @@
+"""Bounded worker pools for running blocking work off the event loop.
+
+A :class:`BoundedExecutor` wraps a thread or process pool with a cap on
+how much work may wait for a worker. Once ``max_workers + max_queue``
+calls are in flight, new calls fail fast with :class:`PoolSaturated`, so
+callers can shed load instead of piling up an unbounded backlog.
+Calls that time out or whose awaiting task is cancelled are withdrawn
+from the queue if no worker has picked them up yet. If a worker process
+dies, the pool is broken for good. The failing calls raise
+``BrokenExecutor`` and the next call starts a fresh pool.
+"""
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool's queue is full"""
+
+
+def _timed_call(fn: Callable, *args):
+    """Run ``fn`` and report when it started, to measure time spent queued"""
+    return time.time(), fn(*args)
+
+
+class BoundedExecutor:
+    """Thread or process pool with queue-depth backpressure and metrics"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, use_processes: bool = False,
+                 start_method: Optional[str] = None):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.use_processes = use_processes
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self._queue_wait_total = 0.0
+        self._run_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                context = multiprocessing.get_context(self.start_method) if self.start_method else None
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _discard(self, executor: Executor):
+        """Drop a broken pool so the next call builds a new one"""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            print(f"⚠️ {self.name} pool broke (a worker died); starting a fresh one on next use")
+
+    def _finished(self, future: Future):
+        self._in_flight -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.failed += 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """Run ``fn(*args)`` in the pool; PoolSaturated if the queue is full
+
+        On timeout the call is cancelled if it has not started yet and
+        ``asyncio.TimeoutError`` is raised. ``BrokenExecutor`` is raised if
+        a worker process died.
+        """
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.name} pool is saturated")
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(functools.partial(_timed_call, fn, *args))
+        except BrokenExecutor:
+            self.failed += 1
+            self._discard(executor)
+            raise
+        self._in_flight += 1
+
+        def on_done(done: Future):
+            try:
+                loop.call_soon_threadsafe(self._finished, done)
+            except RuntimeError:
+                pass  # event loop already closed
+
+        future.add_done_callback(on_done)
+        try:
+            started, result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            # Caller went away, e.g. the client disconnected
+            future.cancel()
+            self.cancelled += 1
+            raise
+        except BrokenExecutor:
+            # Counted as failed by _finished
+            self._discard(executor)
+            raise
+        finished = time.time()
+        self.completed += 1
+        self._queue_wait_total += max(0.0, started - submitted)
+        self._run_total += max(0.0, finished - started)
+        return result
+
+    def metrics(self) -> dict:
+        busy = min(self._in_flight, self.max_workers)
+        done = self.completed or 1
+        return {
+            "kind": "process" if self.use_processes else "thread",
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "busy_workers": busy,
+            "queued": max(0, self._in_flight - self.max_workers),
+            "utilization": round(busy / self.max_workers, 2),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "avg_queue_wait_ms": round(self._queue_wait_total / done * 1000, 2),
+            "avg_run_ms": round(self._run_total / done * 1000, 2)
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
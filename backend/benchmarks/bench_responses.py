@@ -0,0 +1,98 @@
+"""Encode time and response size per route: stdlib JSON vs orjson, plain vs gzip/brotli.
+
+Run from the backend directory:
+
+    python benchmarks/bench_responses.py [--repeat 200]
+
+Each route is called once through the app to get its payload. The payload
+is then encoded three ways: the old default (jsonable_encoder, then
+stdlib json), the new default (jsonable_encoder, then orjson), and orjson
+alone, as routes that return a FastJSONResponse themselves do. Finally it
+is compressed with each available encoding.
+"""
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# The mock database writes its files to the working directory
+os.chdir(tempfile.mkdtemp(prefix="krishi-bench-"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+from app.utils.responses import FastJSONResponse, brotli, GZIP_LEVEL, BROTLI_QUALITY  # noqa: E402
+
+ROUTES = [
+    ("GET", "/api/marketplace/products", None),
+    ("GET", "/api/marketplace/products?limit=5&fields=id,name,price", None),
+    ("GET", "/api/marketplace/categories", None),
+    ("POST", "/api/advisory/predict?crop=rice&season=monsoon&soil_type=clay", None),
+    ("GET", "/api/advisory/weather?city=Delhi&language=hi", None),
+    ("GET", "/api/advisory/recommendations?season=summer&language=hi", None),
+    ("GET", "/api/advisory/sustainability-metrics?crop=rice&farming_method=organic", None),
+    ("GET", "/api/admin/stats", None),
+]
+
+
+def best_of(fn, repeat: int) -> float:
+    """Fastest of ``repeat`` runs, in microseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    encodings = [("gzip", lambda body: gzip.compress(body, GZIP_LEVEL))]
+    if brotli is not None:
+        encodings.append(("br", lambda body: brotli.compress(body, quality=BROTLI_QUALITY)))
+
+    stdlib = JSONResponse(None)
+    fast = FastJSONResponse(None)
+    # before: stdlib JSONResponse after jsonable_encoder (the old default)
+    # default: FastJSONResponse after jsonable_encoder (routes returning dicts)
+    # direct: FastJSONResponse alone (routes returning the response themselves)
+    header = f"{'route':<72}{'before µs':>10}{'default µs':>11}{'direct µs':>10}{'bytes':>8}"
+    header += "".join(f"{name + ' bytes':>11}{name + ' µs':>9}" for name, _ in encodings)
+    print(header)
+    print("-" * len(header))
+
+    with TestClient(app) as client:
+        # Admin routes need a token
+        client.post("/auth/register", json={"username": "bench-admin", "email": "bench@example.com",
+                                            "password": "bench-password", "full_name": "Bench Admin",
+                                            "user_type": "admin"})
+        token = client.post("/auth/login", data={"username": "bench-admin", "password": "bench-password"}).json()
+        headers = {"Accept-Encoding": "identity", "Authorization": f"Bearer {token.get('access_token')}"}
+        for method, url, body in ROUTES:
+            response = client.request(method, url, json=body, headers=headers)
+            if response.status_code != 200:
+                print(f"{url:<72} skipped: HTTP {response.status_code}")
+                continue
+            payload = response.json()
+            before_us = best_of(lambda: stdlib.render(jsonable_encoder(payload)), args.repeat)
+            default_us = best_of(lambda: fast.render(jsonable_encoder(payload)), args.repeat)
+            direct_us = best_of(lambda: fast.render(payload), args.repeat)
+            raw = fast.render(payload)
+            row = f"{method + ' ' + url:<72}{before_us:>10.1f}{default_us:>11.1f}{direct_us:>10.1f}{len(raw):>8}"
+            for _, compress in encodings:
+                compressed = compress(raw)
+                row += f"{len(compressed):>11}{best_of(lambda: compress(raw), max(1, args.repeat // 10)):>9.1f}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
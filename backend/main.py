@@ -3,18 +3,33 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes import auth, farmers, marketplace, advisory, admin, location
 from app.database import connect_to_mongo, close_mongo_connection, get_database
+from app.utils.stats import run_reconciler, ResponseTimeMiddleware
+from app.utils.rollups import get_rollups, run_rollup_persister
+from app.utils.weather import weather_client
+from app.ml_models.plant_disease_model import image_pool
+from app.utils.response_cache import ResponseCacheMiddleware
+from app.utils.responses import FastJSONResponse, CompressionMiddleware
 from datetime import datetime
+import asyncio
 import os
 
-app = FastAPI(title="Krishi API", version="1.0.0", description="AI-Powered Agricultural Intelligence Platform")
+app = FastAPI(title="Krishi API", version="1.0.0", description="AI-Powered Agricultural Intelligence Platform",
+              default_response_class=FastJSONResponse)
 
+# Inside CORS, so replayed responses still get CORS headers; cached bodies are
+# stored uncompressed and encoded per client on the way out
+app.add_middleware(ResponseCacheMiddleware)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Plot-Count", "ETag", "X-Cache"],
 )
+# Outermost, so the dashboard's response time covers every middleware
+app.add_middleware(ResponseTimeMiddleware)
 
 
 
@@ -22,12 +37,29 @@ app.add_middleware(
 async def startup_event():
     print("🌾 Starting Krishi API...")
     await connect_to_mongo()
+    # Materialized admin statistics: recount now, then periodically correct drift
+    app.state.stats_reconciler = asyncio.create_task(
+        run_reconciler(get_database, lambda: len(marketplace.catalog))
+    )
+    app.state.rollup_persister = asyncio.create_task(run_rollup_persister(get_database))
+    app.state.listing_sync = asyncio.create_task(marketplace.run_listing_sync())
+    app.state.location_sync = asyncio.create_task(location.run_location_sync())
     print("✅ Krishi API started successfully!")
     print("🌐 Server running at: http://localhost:8001")
     print("📚 API docs at: http://localhost:8001/docs")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    app.state.stats_reconciler.cancel()
+    app.state.rollup_persister.cancel()
+    app.state.listing_sync.cancel()
+    app.state.location_sync.cancel()
+    try:
+        get_rollups().save()
+    except OSError as e:
+        print(f"⚠️ Could not save rollups: {e}")
+    await weather_client.close()
+    image_pool.shutdown(wait=False)
     await close_mongo_connection()
 
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -0,0 +1,130 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.utils.advisory_rules import assess_crop_health, farming_tips, score_batch, weather_advice
+
+CROPS = ["wheat", "rice", "corn", "tomato", "millet"]
+SEASONS = ["winter", "summer", "monsoon", "spring"]
+SOILS = ["loamy", "clay", "sandy", "silt"]
+
+
+def baseline_assessment(crop, season, soil_type, variability):
+    """The /predict logic as it was written before the rule tables"""
+    crop_factors = {
+        "wheat": {"winter": 10, "summer": -5, "monsoon": 0},
+        "rice": {"winter": -10, "summer": 5, "monsoon": 15},
+        "corn": {"winter": -5, "summer": 10, "monsoon": 5},
+        "tomato": {"winter": 5, "summer": -10, "monsoon": -5}
+    }
+    soil_factors = {"loamy": 5, "clay": -3, "sandy": -2}
+    health_score = 85 + crop_factors.get(crop, {}).get(season, 0) + soil_factors.get(soil_type, 0) + variability
+    health_score = max(60, min(95, health_score))
+    recommendations = [
+        f"Optimal {crop} cultivation detected for {season} season",
+        "Apply organic fertilizer every 2 weeks for better yield",
+        "Monitor soil moisture levels daily using smart sensors"
+    ]
+    if season == "winter":
+        recommendations.extend(["Protect crops from frost damage", "Reduce watering frequency in cold weather"])
+    elif season == "summer":
+        recommendations.extend(["Increase irrigation frequency due to high temperatures",
+                                "Use mulching to retain soil moisture"])
+    elif season == "monsoon":
+        recommendations.extend(["Ensure proper drainage to prevent waterlogging",
+                                "Monitor for fungal diseases due to high humidity"])
+    if soil_type == "clay":
+        recommendations.append("Improve soil drainage with organic matter")
+    elif soil_type == "sandy":
+        recommendations.append("Add compost to improve water retention")
+    if health_score < 75:
+        recommendations.extend(["Consider soil pH testing immediately",
+                                "Consult agricultural expert for detailed analysis",
+                                "Implement integrated pest management"])
+    elif health_score < 85:
+        recommendations.extend(["Regular pest monitoring recommended", "Consider nutrient supplementation"])
+    risk_factors = []
+    if health_score < 80:
+        risk_factors.append("Nutrient deficiency detected")
+    if season == "monsoon" and soil_type == "clay":
+        risk_factors.append("High waterlogging risk")
+    if season == "summer" and soil_type == "sandy":
+        risk_factors.append("Water stress risk")
+    return {
+        "health_score": health_score,
+        "status": "excellent" if health_score > 90 else "healthy" if health_score > 80 else "needs_attention",
+        "recommendations": recommendations[:6],
+        "risk_factors": risk_factors,
+        "next_check": "5 days" if health_score < 80 else "7 days",
+    }
+
+
+def baseline_weather(weather):
+    """The /weather advisory logic as it was written before the rule tables"""
+    advisory, priority_alerts = [], []
+    if weather["temperature"] > 35:
+        priority_alerts.append("🌡️ HEAT ALERT: Extreme temperature detected")
+        advisory.extend(["Increase irrigation frequency to 2-3 times daily",
+                         "Provide shade nets for sensitive crops", "Avoid field work during 11 AM - 4 PM"])
+    elif weather["temperature"] > 30:
+        advisory.append("High temperature - increase watering frequency")
+    elif weather["temperature"] < 15:
+        priority_alerts.append("❄️ FROST WARNING: Protect sensitive crops")
+        advisory.extend(["Cover young plants with protective sheets", "Delay irrigation until temperature rises"])
+    if weather["humidity"] > 85:
+        advisory.extend(["Very high humidity - high fungal disease risk",
+                         "Improve air circulation around plants", "Apply preventive fungicide spray"])
+    elif weather["humidity"] > 75:
+        advisory.append("High humidity - monitor for fungal diseases")
+    elif weather["humidity"] < 50:
+        advisory.append("Low humidity - increase soil moisture retention")
+    if weather["rainfall"] > 50:
+        priority_alerts.append("🌧️ HEAVY RAIN ALERT: Waterlogging risk")
+        advisory.extend(["Ensure proper field drainage immediately", "Postpone fertilizer application",
+                         "Harvest mature crops before rain"])
+    elif weather["rainfall"] > 20:
+        advisory.extend(["Moderate rainfall expected - check drainage systems",
+                         "Good time for transplanting if soil is ready"])
+    elif weather["rainfall"] == 0 and weather["temperature"] > 30:
+        advisory.append("No rain with high temperature - ensure adequate irrigation")
+    if weather["wind_speed"] > 20:
+        advisory.extend(["High wind speed - avoid pesticide spraying", "Provide support to tall crops"])
+    if (weather["uv_index"] or 0) > 8:
+        advisory.append("High UV levels - consider shade protection for sensitive crops")
+    return priority_alerts, advisory
+
+
+@pytest.mark.parametrize("crop,season,soil_type", list(itertools.product(CROPS, SEASONS, SOILS)))
+def test_crop_assessment_matches_the_baseline(crop, season, soil_type):
+    variabilities = range(-8, 13)
+    for variability in variabilities:
+        assert assess_crop_health(crop, season, soil_type, variability) == \
+            baseline_assessment(crop, season, soil_type, variability)
+    scores = score_batch([crop] * len(variabilities), [season] * len(variabilities),
+                         [soil_type] * len(variabilities), np.array(variabilities))
+    assert scores.tolist() == [baseline_assessment(crop, season, soil_type, v)["health_score"] for v in variabilities]
+
+
+def test_weather_advice_matches_the_baseline():
+    # Values on and around every threshold, plus a missing UV index
+    readings = itertools.product([10, 15, 16, 30, 31, 35, 36], [40, 50, 75, 76, 85, 86], [0, 1, 20, 21, 50, 51],
+                                 [20, 21], [None, 8, 9])
+    for temperature, humidity, rainfall, wind_speed, uv_index in readings:
+        weather = {"temperature": temperature, "humidity": humidity, "rainfall": rainfall,
+                   "wind_speed": wind_speed, "uv_index": uv_index}
+        assert weather_advice(weather) == baseline_weather(weather)
+
+
+@pytest.mark.parametrize("month", range(1, 13))
+def test_farming_tips_follow_the_season(month):
+    tips = farming_tips(month)
+    assert tips[:3] == ["Best sowing time: Early morning (6-8 AM) when temperature is optimal",
+                        "Avoid field operations during extreme weather conditions",
+                        "Monitor crop health daily using mobile apps for early detection"]
+    if month in (12, 1, 2):
+        assert tips[3] == "Winter season: Focus on rabi crop management"
+    elif month in (6, 7, 8, 9):
+        assert tips[3] == "Monsoon season: Ensure proper drainage in fields"
+    else:
+        assert len(tips) == 3
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import MockDatabase
+from app.utils import auth
+from app.utils.auth import TokenCache, create_access_token, get_password_hash
+from app.utils.workers import BoundedExecutor
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    database = MockDatabase()
+    monkeypatch.setattr(auth, "get_database", lambda: database)
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    return database
+
+
+def test_revocation_is_seen_by_other_workers(db):
+    token = create_access_token({"sub": "ram"}, timedelta(minutes=5))
+    assert asyncio.run(auth.verify_token(token)) == "ram"
+    assert asyncio.run(auth.revoke_token(token)) == "ram"
+
+    # A fresh token cache stands in for another worker, or this one after a restart
+    auth.token_cache = TokenCache()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.verify_token(token))
+    assert error.value.status_code == 401
+    assert auth.token_cache.is_revoked(TokenCache.digest(token))
+
+
+def test_cached_tokens_are_rechecked_after_ttl(db, monkeypatch):
+    token = create_access_token({"sub": "ram"}, timedelta(minutes=5))
+    auth.token_cache = TokenCache(ttl=0)
+    assert asyncio.run(auth.verify_token(token)) == "ram"
+
+    # Revoked elsewhere: only the database knows
+    other = TokenCache()
+    monkeypatch.setattr(auth, "token_cache", other)
+    asyncio.run(auth.revoke_token(token))
+    monkeypatch.setattr(auth, "token_cache", TokenCache(ttl=0))
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.verify_token(token))
+
+
+def test_expired_revocations_are_pruned(db):
+    cache = TokenCache()
+    cache.revoke("old", 1)
+    cache.revoke("new", 2 ** 40)
+    assert not cache.is_revoked("old")
+    assert cache.stats()["revoked"] == 1
+
+    asyncio.run(db.revoked_tokens.insert_one({"digest": "old", "exp": 1}))
+    asyncio.run(auth.revoke_token(create_access_token({"sub": "ram"})))
+    assert asyncio.run(db.revoked_tokens.find_one({"digest": "old"})) is None
+
+
+def test_password_checks_answer_503_when_the_pool_is_saturated(monkeypatch):
+    pool = BoundedExecutor("test-password", max_workers=1, max_queue=1)
+    monkeypatch.setattr(auth, "password_pool", pool)
+    monkeypatch.setattr(auth, "PASSWORD_HASH_TIMEOUT", 0.2)
+    hashed = get_password_hash("secret123")
+    release = threading.Event()
+
+    async def scenario():
+        # One job running and one queued fill the pool
+        busy = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(auth.verify_password_async("secret123", hashed))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as rejected:
+            await auth.verify_password_async("secret123", hashed)
+        # The queued check never gets a worker before its timeout
+        with pytest.raises(HTTPException) as timed_out:
+            await queued
+        release.set()
+        await busy
+        # A real bcrypt check needs more time than the shortened timeout
+        monkeypatch.setattr(auth, "PASSWORD_HASH_TIMEOUT", 10)
+        return rejected.value, timed_out.value, await auth.verify_password_async("secret123", hashed)
+
+    try:
+        rejected, timed_out, verified = asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+    assert rejected.status_code == timed_out.status_code == 503
+    assert rejected.headers["Retry-After"] == "2"
+    assert verified is True
+    assert pool.rejected == 1 and pool.timeouts == 1
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import advisory
+from app.utils.advisory_rules import assessment_for
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(advisory.router, prefix="/api/advisory")
+    return TestClient(app)
+
+
+def rows(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def check_prediction(row):
+    assert 60 <= row["health_score"] <= 95
+    expected = assessment_for(row["crop"], row["season"], row["soil_type"], row["health_score"])
+    assert {key: row[key] for key in expected} == expected
+    assert 88 <= row["confidence"] <= 96
+
+
+def test_json_batch_streams_one_prediction_per_plot(client):
+    plots = [{"plot_id": "A1", "crop": "rice", "season": "monsoon", "soil_type": "clay"},
+             {"plot_id": "A2"},
+             {"crop": " tomato ", "season": "summer"}]
+    response = client.post("/api/advisory/predict/batch", json={"plots": plots})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-plot-count"] == "3"
+    results = rows(response)
+    assert [(r["plot_id"], r["crop"], r["season"], r["soil_type"]) for r in results] == [
+        ("A1", "rice", "monsoon", "clay"), ("A2", "wheat", "winter", "loamy"), (None, "tomato", "summer", "loamy")]
+    for row in results:
+        check_prediction(row)
+
+
+def test_csv_upload_is_scored_like_json(client):
+    csv_body = "\ufeffPlot_ID,Crop,Season,Soil_Type\nP1,corn,summer,sandy\nP2,wheat,,\n"
+    response = client.post("/api/advisory/predict/batch/csv",
+                           files={"file": ("plots.csv", csv_body.encode("utf-8"), "text/csv")})
+
+    assert response.status_code == 200
+    results = rows(response)
+    assert [(r["plot_id"], r["crop"], r["season"], r["soil_type"]) for r in results] == [
+        ("P1", "corn", "summer", "sandy"), ("P2", "wheat", "winter", "loamy")]
+    for row in results:
+        check_prediction(row)
+
+
+@pytest.mark.parametrize("body", [{}, {"plots": []}, {"plots": "wheat"}, {"plots": [{"crop": "rice"}, "rice"]}])
+def test_bad_json_batches_are_rejected(client, body):
+    assert client.post("/api/advisory/predict/batch", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("content", [b"season,soil_type\nwinter,loamy\n", b"", "crop\nb\xe4jra\n".encode("latin-1")])
+def test_bad_csv_uploads_are_rejected(client, content):
+    response = client.post("/api/advisory/predict/batch/csv", files={"file": ("plots.csv", content, "text/csv")})
+    assert response.status_code == 422
+
+
+def test_batches_over_the_limit_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(advisory, "MAX_BATCH_PLOTS", 3)
+    assert client.post("/api/advisory/predict/batch", json={"plots": [{}] * 3}).status_code == 200
+    assert client.post("/api/advisory/predict/batch", json={"plots": [{}] * 4}).status_code == 413
+    csv_body = "crop\n" + "wheat\n" * 4
+    response = client.post("/api/advisory/predict/batch/csv", files={"file": ("plots.csv", csv_body, "text/csv")})
+    assert response.status_code == 413
@@ -0,0 +1,140 @@
+import base64
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.utils.catalog import CatalogEngine, FacetAggregates, SORT_FIELDS, summarize
+from app.routes.marketplace import MOCK_PRODUCTS
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def catalog():
+    return CatalogEngine([dict(product) for product in MOCK_PRODUCTS])
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # The mock database writes its files to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("db"))
+    try:
+        from main import app
+    finally:
+        os.chdir(cwd)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("sort_by,search", [(name, None) for name in SORT_FIELDS] + [("name", None), ("name", "rice")])
+def test_cursor_round_trip_pages_through_everything(catalog, sort_by, search):
+    bits, scores = catalog.match(search=search)
+    expected = catalog.ordered(bits, sort_by, scores)
+    seen, after = [], None
+    while True:
+        page = catalog.ordered(bits, sort_by, scores, after=after, limit=2)
+        seen += page
+        if len(page) < 2:
+            break
+        after = catalog.decode_cursor(catalog.encode_cursor(page[-1], sort_by, scores), sort_by, scores)
+    assert seen == expected
+    assert expected
+
+
+@pytest.mark.parametrize("payload,sort_by", [
+    (["catalog", -5], "name"),
+    (["catalog", 10 ** 15], "name"),
+    (["catalog", True], "name"),
+    (["catalog"], "name"),
+    (["price_low", [1], 3], "price_low"),
+    (["price_low", None, 3], "price_low"),
+    (["price_low", "cheap", 3], "price_low"),
+    (["price_low", 10, 3.5], "price_low"),
+    (["rating", {"a": 1}, 3], "rating"),
+    (["rating", True, 3], "rating"),
+    (["freshness", 20240101, 3], "freshness"),
+    (["price_high", 10, 3], "price_low"),
+])
+def test_malformed_cursor_is_rejected(catalog, payload, sort_by):
+    with pytest.raises(ValueError):
+        catalog.decode_cursor(raw_cursor(payload), sort_by)
+
+
+def test_non_finite_cursor_values_are_rejected(catalog):
+    cursor = base64.urlsafe_b64encode(b'["price_low",NaN,3]').decode()
+    with pytest.raises(ValueError):
+        catalog.decode_cursor(cursor, "price_low")
+
+
+@pytest.mark.parametrize("payload,sort_by", [
+    (["catalog", -5], "name"),
+    (["catalog", 10 ** 15], "name"),
+    (["price_low", [1], 3], "price_low"),
+    (["price_low", None, 3], "price_low"),
+    (["rating", {"a": 1}, 3], "rating"),
+])
+def test_products_route_answers_bad_cursor_with_400(client, payload, sort_by):
+    response = client.get("/api/marketplace/products",
+                          params={"limit": 2, "sort_by": sort_by, "cursor": raw_cursor(payload)})
+    assert response.status_code == 400
+
+
+def test_products_route_pages_with_cursor(client):
+    first = client.get("/api/marketplace/products", params={"limit": 3, "sort_by": "price_low"}).json()
+    second = client.get("/api/marketplace/products",
+                        params={"limit": 3, "sort_by": "price_low", "cursor": first["next_cursor"]}).json()
+    prices = [p["price"] for p in first["products"] + second["products"]]
+    assert prices == sorted(prices)
+    assert not {p["id"] for p in first["products"]} & {p["id"] for p in second["products"]}
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"category": "vegetables", "organic_only": True},
+    {"max_distance": 30},
+    {"min_sustainability": 90},
+    {"min_sustainability": 87, "max_distance": 40},
+    {"search": "rice"},
+    {"search": "organic", "category": "grains", "min_sustainability": 93},
+    {"category": "nonexistent"},
+])
+def test_sustainability_metrics_match_a_scan_of_the_listings(catalog, filters):
+    catalog.upsert({**catalog.get(1), "sustainability_score": 70, "distance_km": 2.5})
+    catalog.remove(2)
+    totals = [0, 0, 0, 0.0, 0]
+    for product in catalog.query(**filters):
+        for i, value in enumerate(FacetAggregates.contribution(product)):
+            totals[i] += value
+
+    assert catalog.sustainability_metrics(**filters) == summarize(totals)
+
+
+@pytest.mark.parametrize("filters", [
+    {"max_distance": 25}, {"max_distance": 1}, {"min_sustainability": 92}, {"min_sustainability": 101},
+])
+def test_range_filters_match_a_scan_after_updates(catalog, filters):
+    catalog.upsert({**catalog.get(1), "distance_km": 24.5, "sustainability_score": 91})
+    catalog.upsert({**catalog.get(3), "distance_km": 25.25})
+    catalog.remove(4)
+    live = [catalog.get(p["id"]) for p in MOCK_PRODUCTS if catalog.get(p["id"])]
+    if "max_distance" in filters:
+        expected = {p["id"] for p in live if p["distance_km"] <= filters["max_distance"]}
+    else:
+        expected = {p["id"] for p in live if p["sustainability_score"] >= filters["min_sustainability"]}
+
+    assert {p["id"] for p in catalog.query(**filters)} == expected
+
+
+def test_removed_slots_are_reused(catalog):
+    slots = len(catalog._products)
+    product = catalog.remove(2)
+    catalog.upsert({**product, "id": 999, "name": "Kodo Millet"})
+    catalog.upsert({**catalog.get(1), "price": 1.0})
+
+    assert len(catalog._products) == slots
+    assert [p["id"] for p in catalog.query(search="kodo")] == [999]
+    assert catalog.query(sort_by="price_low")[0]["id"] == 1
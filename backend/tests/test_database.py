@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.database import MockDatabase
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    collection = MockDatabase().users
+    asyncio.run(collection.insert_many([
+        {"username": f"user{i}", "email": f"user{i}@example.com", "user_type": "farmer"} for i in range(50)
+    ]))
+    return collection
+
+
+def test_find_one_by_username_uses_the_index(users):
+    before = users.index_stats()
+    user = asyncio.run(users.find_one({"username": "user7"}))
+    after = users.index_stats()
+
+    assert user["email"] == "user7@example.com"
+    assert after["indexes"]["username"]["hits"] == before["indexes"]["username"]["hits"] + 1
+    assert after["collection_scans"] == before["collection_scans"]
+
+
+def test_unindexed_query_scans(users):
+    scans = users.index_stats()["collection_scans"]
+    assert len(asyncio.run(users.find({"user_type": "farmer"}).to_list(None))) == 50
+    assert users.index_stats()["collection_scans"] == scans + 1
+
+
+def test_update_moves_the_document_between_index_keys(users):
+    asyncio.run(users.update_one({"username": "user3"}, {"$set": {"username": "renamed"}}))
+
+    assert asyncio.run(users.find_one({"username": "user3"})) is None
+    assert asyncio.run(users.find_one({"username": "renamed"}))["email"] == "user3@example.com"
+    assert users.index_stats()["indexes"]["username"]["keys"] == 50
+    # The new key is taken and the old one is free again
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(users.insert_one({"username": "renamed", "email": "other@example.com"}))
+    asyncio.run(users.insert_one({"username": "user3", "email": "new3@example.com"}))
+    assert asyncio.run(users.find_one({"username": "user3"}))["email"] == "new3@example.com"
+
+
+def test_delete_removes_index_entries(users):
+    asyncio.run(users.delete_one({"username": "user4"}))
+    assert asyncio.run(users.find_one({"username": "user4"})) is None
+    assert users.index_stats()["indexes"]["username"]["keys"] == 49
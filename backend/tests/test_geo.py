@@ -0,0 +1,96 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.routes.location import calculate_distance
+from app.utils.geo import CoalescingUpdates, GeoGridIndex, distance_matrix, haversine_km, nearest_in_matrix
+
+
+def random_points(count, seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(count)]
+
+
+def test_distance_matrix_matches_calculate_distance_elementwise():
+    origins = random_points(40, 1) + [(28.6139, 77.2090), (90, 0), (0, 179.9)]
+    destinations = random_points(30, 2) + [(28.6139, 77.2090), (-90, 0), (0, -179.9)]
+    # Small blocks so the result is stitched together from several pieces
+    matrix = np.vstack([block for _, block in distance_matrix(origins, destinations, block_cells=100)])
+    expected = np.array([[calculate_distance(*o, *d) for d in destinations] for o in origins])
+    np.testing.assert_allclose(matrix, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_nearest_in_matrix_agrees_with_sorted_distances():
+    origins, destinations = random_points(10, 3), random_points(25, 4)
+    indices, distances = nearest_in_matrix(origins, destinations, 5, block_cells=50)
+    for row, origin in enumerate(origins):
+        expected = sorted(calculate_distance(*origin, *d) for d in destinations)[:5]
+        np.testing.assert_allclose(distances[row], expected, rtol=1e-9)
+        np.testing.assert_allclose([calculate_distance(*origin, *destinations[i]) for i in indices[row]],
+                                   distances[row], rtol=1e-9)
+
+
+def brute_force(points, lat, lng, radius_km):
+    return sorted((haversine_km(lat, lng, p_lat, p_lng), point_id)
+                  for point_id, (p_lat, p_lng) in points.items()
+                  if haversine_km(lat, lng, p_lat, p_lng) <= radius_km)
+
+
+@pytest.fixture
+def grid():
+    rng = random.Random(5)
+    # Clustered around Delhi, plus points spread across the globe
+    points = {f"d{i}": (28.6 + rng.uniform(-0.5, 0.5), 77.2 + rng.uniform(-0.5, 0.5)) for i in range(300)}
+    points.update({f"w{i}": point for i, point in enumerate(random_points(100, 6))})
+    index = GeoGridIndex()
+    for point_id, (lat, lng) in points.items():
+        index.insert(point_id, lat, lng)
+    return index, points
+
+
+@pytest.mark.parametrize("center,radius", [
+    ((28.6, 77.2), 5), ((28.6, 77.2), 40), ((28.65, 77.25), 0.5),
+    ((0.0, 179.95), 500), ((89.9, 10.0), 300), ((-45.0, -60.0), 3000),
+])
+def test_within_matches_a_brute_force_scan(grid, center, radius):
+    index, points = grid
+    assert index.within(*center, radius) == brute_force(points, *center, radius)
+
+
+def test_within_includes_points_just_across_a_cell_boundary():
+    index = GeoGridIndex(cell_degrees=0.1)
+    # 28.6 is a cell boundary: these points sit in neighbouring cells
+    index.insert("north", 28.6001, 77.2)
+    index.insert("south", 28.5999, 77.2)
+    index.insert("east", 28.65, 77.3001)
+    found = [point_id for _, point_id in index.within(28.6, 77.2, 0.05)]
+    assert found in (["north", "south"], ["south", "north"])
+    assert [point_id for _, point_id in index.within(28.65, 77.2999, 0.1)] == ["east"]
+
+
+@pytest.mark.parametrize("center,k", [((28.6, 77.2), 1), ((28.6, 77.2), 25), ((0.0, 0.0), 3), ((28.6, 77.2), 400)])
+def test_nearest_matches_a_brute_force_scan(grid, center, k):
+    index, points = grid
+    # Far from the cluster the first radius holds nothing, so it has to keep doubling
+    assert index.nearest(*center, k) == brute_force(points, *center, float("inf"))[:k]
+
+
+def test_nearest_stops_at_max_radius():
+    index = GeoGridIndex()
+    index.insert("near", 28.6, 77.2)
+    index.insert("far", 19.07, 72.87)
+    assert [point_id for _, point_id in index.nearest(28.6, 77.2, 2, max_radius_km=100)] == ["near"]
+
+
+def test_moves_and_removals_update_queries():
+    index = GeoGridIndex()
+    updates = CoalescingUpdates(index, max_pending=10)
+    updates.submit("cart", 28.6, 77.2)
+    updates.submit("cart", 28.7, 77.3)
+    assert updates.flush() == 1
+    assert index.within(28.6, 77.2, 1) == []
+    assert [point_id for _, point_id in index.within(28.7, 77.3, 1)] == ["cart"]
+    index.remove("cart")
+    assert index.nearest(28.7, 77.3, 1) == []
+    assert updates.stats()["coalesced"] == 1
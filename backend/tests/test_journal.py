@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+from app.utils.journal import JournalStore
+
+
+def test_put_and_delete_are_durable_once_the_future_resolves(tmp_path):
+    path = str(tmp_path / "docs.json")
+    store = JournalStore(path)
+    store.put("a", {"name": "wheat"}).result(timeout=5)
+    store.put("b", {"name": "rice"}).result(timeout=5)
+    store.delete("a").result(timeout=5)
+
+    # Another store reads only what reached the files
+    assert JournalStore(path).data == {"b": {"name": "rice"}}
+    store.close()
+
+
+def test_reopen_replays_snapshot_plus_journal(tmp_path):
+    path = str(tmp_path / "docs.json")
+    store = JournalStore(path)
+    store.put("a", {"v": 1}).result(timeout=5)
+    store._compact()
+    store.put("b", {"v": 2}).result(timeout=5)
+    store.put("a", {"v": 3}).result(timeout=5)
+
+    with open(path) as f:
+        assert json.load(f) == {"a": {"v": 1}}
+    assert JournalStore(path).data == {"a": {"v": 3}, "b": {"v": 2}}
+    store.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "docs.json")
+    store = JournalStore(path)
+    store.put("a", {"v": 1}).result(timeout=5)
+    store.close()
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"op": "put", "id": "b", "doc": {"v"')  # interrupted append
+
+    assert JournalStore(path).data == {"a": {"v": 1}}
+
+
+def test_own_writes_do_not_trigger_a_reload(tmp_path):
+    store = JournalStore(str(tmp_path / "docs.json"))
+    created = datetime.utcnow()
+    store.put("a", {"created_at": created}).result(timeout=5)
+    store.refresh()
+
+    assert store.stats["reloads"] == 0
+    assert store.stats["replayed"] == 0
+    assert store.data["a"]["created_at"] is created
+    store.close()
+
+
+def test_other_workers_appends_and_compaction_are_picked_up_by_refresh(tmp_path):
+    path = str(tmp_path / "docs.json")
+    reader, writer = JournalStore(path), JournalStore(path)
+    changes = []
+    reader.subscribe(lambda doc_id, old, new: changes.append((doc_id, new)))
+    reader.put("a", {"v": 1}).result(timeout=5)
+
+    writer.put("b", {"v": 2}).result(timeout=5)
+    reader.refresh()
+    assert reader.data == {"a": {"v": 1}, "b": {"v": 2}}
+    assert reader.stats["replayed"] == 1
+
+    writer.put("c", {"v": 3}).result(timeout=5)
+    writer._compact()
+    reader.refresh()
+    assert reader.data == {"a": {"v": 1}, "b": {"v": 2}, "c": {"v": 3}}
+    assert reader.stats["reloads"] == 1
+    assert ("c", {"v": 3}) in changes
+    reader.close()
+    writer.close()
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.database import MockDatabase
+from app.routes import marketplace
+from app.schemas.marketplace import ListingCreate
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    database = MockDatabase()
+    monkeypatch.setattr(marketplace, "get_database", lambda: database)
+    monkeypatch.setattr(marketplace, "_listings_synced_at", 0.0)
+    known = {p["id"] for p in marketplace.MOCK_PRODUCTS}
+    yield database
+    # Leave the shared catalog as it was
+    for product in [p for p in marketplace.MOCK_PRODUCTS if p["id"] not in known]:
+        marketplace.catalog.remove(product["id"])
+        marketplace.MOCK_PRODUCTS.remove(product)
+        marketplace._mock_positions.pop(product["id"])
+    marketplace._mock_positions.update({p["id"]: i for i, p in enumerate(marketplace.MOCK_PRODUCTS)})
+
+
+def test_listings_get_store_allocated_ids(db):
+    first = marketplace._build_listing(ListingCreate(name="Jaggery", category="spices"))
+    second = marketplace._build_listing(ListingCreate(name="Honey", category="spices"))
+    asyncio.run(marketplace._store_listing(first, new=True))
+    asyncio.run(marketplace._store_listing(second, new=True))
+
+    assert second["id"] == first["id"] + 1 > max(p["id"] for p in marketplace.MOCK_PRODUCTS)
+    stored = asyncio.run(db.products.find({}).to_list(None))
+    assert sorted(doc["id"] for doc in stored) == [first["id"], second["id"]]
+
+
+def test_sync_applies_listings_stored_by_other_workers(db):
+    listing = marketplace._build_listing(ListingCreate(name="Jaggery", category="spices", price=60.0))
+    # Stored by "another worker": this catalog has not seen it
+    asyncio.run(marketplace._store_listing(listing, new=True))
+    assert marketplace.catalog.get(listing["id"]) is None
+    listings = marketplace.platform_stats.listings
+
+    asyncio.run(marketplace.sync_listings())
+    assert marketplace.catalog.get(listing["id"])["price"] == 60.0
+    assert marketplace.platform_stats.listings == listings + 1
+
+    asyncio.run(marketplace._store_listing({**listing, "price": 65.0}, new=False))
+    asyncio.run(marketplace.sync_listings())
+    assert marketplace.catalog.get(listing["id"])["price"] == 65.0
+    assert marketplace.platform_stats.listings == listings + 1
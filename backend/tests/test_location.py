@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from app.database import MockDatabase
+from app.routes import location
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    database = MockDatabase()
+    monkeypatch.setattr(location, "get_database", lambda: database)
+    monkeypatch.setattr(location, "_locations_synced_at", 0.0)
+    monkeypatch.setattr(location, "_location_times", {})
+    yield database
+    # Leave the shared grid with only the mock users
+    location.location_updates.flush()
+    for user_id in list(location.users_by_id):
+        if not user_id.startswith("mock-"):
+            location.user_locations.remove(user_id)
+            del location.users_by_id[user_id]
+
+
+def save_location(db, username, lat, lng, updated_at):
+    """A location update as another worker stores it"""
+    asyncio.run(db.users.update_one({"username": username}, {"$set": {
+        "location": {"type": "Point", "coordinates": [lng, lat]},
+        "location_updated_at": updated_at
+    }}))
+
+
+def nearby(lat, lng):
+    location.location_updates.flush()
+    return [user_id for _, user_id in location.user_locations.within(lat, lng, 1)]
+
+
+def test_sync_picks_up_other_workers_location_updates(db):
+    asyncio.run(db.users.insert_one({"username": "1", "full_name": "Asha", "user_type": "farmer"}))
+    save_location(db, "1", 12.97, 77.59, time.time())
+    asyncio.run(location.sync_locations())
+    # A real user named "1" no longer collides with the mock user ids
+    assert nearby(12.97, 77.59) == ["1"]
+    assert location.users_by_id["1"]["name"] == "Asha"
+    assert location.users_by_id["mock-1"]["name"] == "Ram Singh"
+
+    save_location(db, "1", 13.08, 80.27, time.time())
+    asyncio.run(location.sync_locations())
+    assert nearby(12.97, 77.59) == []
+    assert nearby(13.08, 80.27) == ["1"]
+
+
+def test_sync_does_not_undo_a_newer_local_update(db):
+    asyncio.run(db.users.insert_one({"username": "asha", "user_type": "farmer"}))
+    save_location(db, "asha", 12.97, 77.59, 100.0)
+    location._submit_location("asha", 13.08, 80.27, {}, 200.0)
+    asyncio.run(location.sync_locations())
+    assert nearby(13.08, 80.27) == ["asha"]
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import advisory
+from app.utils.advisory_rules import WEATHER_RULES
+from app.utils.locales import translate
+
+URL = "/api/advisory/recommendations"
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(advisory.router, prefix="/api/advisory")
+    return TestClient(app)
+
+
+def test_etag_round_trip_answers_304(client):
+    first = client.get(URL, params={"season": "summer"})
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == f"public, max-age={advisory.RECOMMENDATIONS_MAX_AGE}"
+
+    again = client.get(URL, params={"season": "summer"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    # Weak validators and lists match too; another season's tag does not
+    assert client.get(URL, params={"season": "summer"}, headers={"If-None-Match": f'"x", W/{etag}'}).status_code == 304
+    assert client.get(URL, params={"season": "monsoon"}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_english_and_hindi_recommendations(client):
+    english = client.get(URL, params={"season": "winter"}).json()
+    hindi = client.get(URL, params={"season": "winter", "language": "hi"})
+    assert english["crops"] == ["Wheat", "Mustard", "Peas", "Potato", "Barley", "Gram"]
+    assert english["tips"][0] == "Prepare soil for rabi crops with proper plowing"
+    assert hindi.json() == {
+        "crops": ["गेहूं", "सरसों", "मटर", "आलू", "जौ", "चना"],
+        "tips": [
+            "रबी फसलों के लिए उचित जुताई के साथ मिट्टी तैयार करें",
+            "बुवाई से 2-3 सप्ताह पहले जैविक खाद डालें",
+            "उचित सिंचाई का समय निर्धारण करें",
+            "पाला से बचाव के लिए तापमान की निगरानी करें",
+            "बेहतर उत्पादन के लिए प्रमाणित बीजों का उपयोग करें",
+            "संतुलित NPK उर्वरक का प्रयोग करें"
+        ]
+    }
+    assert hindi.headers["etag"] != client.get(URL, params={"season": "winter"}).headers["etag"]
+
+
+def test_unknown_season_and_language_fall_back(client):
+    assert client.get(URL, params={"season": "spring", "language": "hi"}).json()["crops"][0] == "गेहूं"
+    assert client.get(URL, params={"season": "monsoon", "language": "fr"}).json()["crops"][0] == "Rice"
+
+
+def test_every_weather_advisory_has_a_hindi_translation():
+    texts = [text for group in WEATHER_RULES for _, alerts, advisory_texts in group for text in alerts + advisory_texts]
+    translated = translate(texts, "hi")
+    assert all(hindi != english for hindi, english in zip(translated, texts))
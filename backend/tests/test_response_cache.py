@@ -0,0 +1,50 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.utils.response_cache import ResponseCache, ResponseCacheMiddleware, cache_response
+
+ETAG = '"v1"'
+
+
+def make_client():
+    app = FastAPI()
+    calls = []
+
+    @app.get("/data")
+    @cache_response(ttl=60)
+    async def data(request: Request):
+        calls.append(request.headers.get("if-none-match"))
+        # Like the recommendations route, answer conditionals itself
+        if request.headers.get("if-none-match") == ETAG:
+            return Response(status_code=304, headers={"ETag": ETAG})
+        return Response(b'{"ok":true}', media_type="application/json", headers={"ETag": ETAG})
+
+    cache = ResponseCache()
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    return TestClient(app), cache, calls
+
+
+def test_revalidating_miss_warms_the_cache():
+    client, cache, calls = make_client()
+
+    response = client.get("/data", headers={"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.headers["etag"] == ETAG
+    assert calls == [None]
+    assert cache.metrics()["entries"] == 1
+
+    response = client.get("/data")
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "HIT"
+    assert response.content == b'{"ok":true}'
+    assert len(calls) == 1
+
+
+def test_stale_validator_on_miss_gets_full_response():
+    client, cache, calls = make_client()
+
+    response = client.get("/data", headers={"If-None-Match": '"old"'})
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "MISS"
+    assert response.content == b'{"ok":true}'
+    assert cache.metrics()["entries"] == 1
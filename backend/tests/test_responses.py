@@ -0,0 +1,49 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.response_cache import ResponseCache, ResponseCacheMiddleware, cache_response
+from app.utils.responses import CompressionMiddleware
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.get("/small")
+    @cache_response(ttl=60)
+    async def small():
+        return {"ok": True}
+
+    @app.get("/large")
+    @cache_response(ttl=60)
+    async def large():
+        return {"rows": ["x" * 40] * 100}
+
+    app.add_middleware(ResponseCacheMiddleware, cache=ResponseCache())
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def test_not_modified_keeps_plain_etag_for_uncompressed_response():
+    client = make_client()
+    response = client.get("/small", headers=GZIP)
+    assert "content-encoding" not in response.headers
+    etag = response.headers["etag"]
+
+    response = client.get("/small", headers={**GZIP, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_not_modified_tags_etag_for_compressed_response():
+    client = make_client()
+    response = client.get("/large", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    response = client.get("/large", headers={**GZIP, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert "content-length" not in response.headers
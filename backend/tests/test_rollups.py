@@ -0,0 +1,108 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from app.utils.rollups import RollupStore
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find(self, query, projection):
+        for document in self.documents:
+            yield document
+
+
+class FakeDatabase:
+    def __init__(self, users=(), orders=()):
+        self.users = FakeCollection(list(users))
+        self.orders = FakeCollection(list(orders))
+
+
+def total(store: RollupStore, metric: str, state: str = "ALL") -> float:
+    return sum(row[metric] for _, row in store.series("day", 3, state))
+
+
+def test_workers_sharing_a_file_keep_each_others_counts(tmp_path):
+    path = str(tmp_path / "rollups.npz")
+    first = RollupStore(path)
+    asyncio.run(first.backfill(FakeDatabase(orders=[{"state": "Punjab", "total_amount": 10,
+                                                     "created_at": first.cutoff - timedelta(hours=1)}])))
+    first.save()
+
+    a, b = RollupStore(path), RollupStore(path)
+    a.ingest("Punjab", orders=1, revenue=5)
+    b.ingest("Kerala", orders=1, revenue=7)
+    a.save()
+    b.save()
+
+    merged = RollupStore(path)
+    assert total(merged, "orders") == 3
+    assert total(merged, "revenue") == 22
+    assert total(merged, "orders", "Kerala") == 1
+    # The last writer serves everyone's counts
+    assert total(b, "orders") == 3
+
+
+def test_backfill_skips_documents_ingested_live(tmp_path):
+    store = RollupStore(str(tmp_path / "rollups.npz"))
+    live = datetime.utcnow()
+    store.ingest("Punjab", live, orders=1, revenue=5)
+    db = FakeDatabase(orders=[
+        {"state": "Punjab", "total_amount": 10, "created_at": store.cutoff - timedelta(minutes=5)},
+        {"state": "Punjab", "total_amount": 5, "created_at": live},
+    ])
+    asyncio.run(store.backfill(db))
+    assert total(store, "orders") == 2
+    assert total(store, "revenue") == 15
+
+    store.save()
+    assert total(RollupStore(store.path), "orders") == 2
+
+
+def test_first_start_does_not_count_another_workers_backfill_twice(tmp_path):
+    path = str(tmp_path / "rollups.npz")
+    early = RollupStore(path)
+    order_time = datetime.utcnow()
+    early.ingest("Punjab", order_time, orders=1, revenue=5)
+
+    # Started later, so its backfill already contains that order
+    late = RollupStore(path)
+    db = FakeDatabase(orders=[{"state": "Punjab", "total_amount": 5, "created_at": order_time}])
+    asyncio.run(late.backfill(db))
+    late.save()
+
+    early.save()
+    assert total(RollupStore(path), "orders") == 1
+
+
+def test_save_waits_for_history_before_creating_the_file(tmp_path):
+    store = RollupStore(str(tmp_path / "rollups.npz"))
+    store.ingest("Punjab", orders=1)
+    store.save()
+    assert not (tmp_path / "rollups.npz").exists()
+    assert store.dirty
+
+    asyncio.run(store.backfill(FakeDatabase()))
+    store.save()
+    assert total(RollupStore(store.path), "orders") == 1
+
+
+def test_product_locations_are_counted_under_their_state(tmp_path):
+    store = RollupStore(str(tmp_path / "rollups.npz"))
+    for place in ("Bangalore", "UP", "uttar pradesh", "Local", None):
+        store.ingest(place, orders=1)
+    assert total(store, "orders", "Karnataka") == 1
+    assert total(store, "orders", "Uttar Pradesh") == 2
+    assert total(store, "orders", "Unknown") == 2
+    assert total(store, "orders", "Bangalore") == 0
+
+
+def test_importing_the_app_creates_no_rollup_files(tmp_path):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, check=True,
+                   env={**os.environ, "PYTHONPATH": backend})
+    assert not list(tmp_path.glob("rollups*"))
@@ -0,0 +1,53 @@
+import pytest
+
+from app.routes.marketplace import MOCK_PRODUCTS
+from app.utils.search import SearchIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = SearchIndex()
+    for pos, product in enumerate(MOCK_PRODUCTS):
+        index.add(pos, product)
+    return index
+
+
+def names(index, query):
+    return {MOCK_PRODUCTS[pos]["name"] for pos in index.search(query)}
+
+
+def substring_matches(query):
+    """What the products endpoint matched before it had a search index"""
+    return {p["name"] for p in MOCK_PRODUCTS
+            if query in p["name"].lower() or query in p["description"].lower()}
+
+
+@pytest.mark.parametrize("query", ["a", "ri", "to", "mato", "rice", "seed"])
+def test_short_tokens_keep_substring_matches(index, query):
+    assert substring_matches(query)
+    assert substring_matches(query) <= names(index, query)
+
+
+def test_short_tokens_are_not_fuzzy_matched(index):
+    # "rich" is one edit away but is not what a buyer searching for rice wants
+    assert names(index, "rice") == {"Basmati Rice", "Black Rice"}
+    assert names(index, "mato") == {"Fresh Tomatoes"}
+
+
+def test_long_tokens_tolerate_one_typo(index):
+    assert names(index, "whaet") == {"Organic Wheat"}
+    assert names(index, "tomatos") == {"Fresh Tomatoes"}
+
+
+def test_prefix_hits_rank_above_infix_hits(index):
+    scores = index.search("to")
+    best = max(scores, key=scores.get)
+    assert MOCK_PRODUCTS[best]["name"] == "Fresh Tomatoes"
+
+
+def test_removed_documents_stop_matching(index):
+    index.remove(0)
+    try:
+        assert MOCK_PRODUCTS[0]["name"] not in names(index, MOCK_PRODUCTS[0]["name"].split()[-1].lower())
+    finally:
+        index.add(0, MOCK_PRODUCTS[0])
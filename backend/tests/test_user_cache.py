@@ -0,0 +1,82 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+
+from app.database import MockDatabase
+from app.routes import auth as auth_routes
+from app.utils import auth
+from app.utils.auth import TokenCache, create_access_token
+from app.utils.user_cache import UserCache
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    database = MockDatabase()
+    cache = UserCache(ttl=60, negative_ttl=60)
+    for module in (auth, auth_routes):
+        monkeypatch.setattr(module, "get_database", lambda: database)
+        monkeypatch.setattr(module, "user_cache", cache)
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    return database
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(auth_routes.router, prefix="/auth")
+    return TestClient(app)
+
+
+def _bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_unknown_users_are_remembered_until_the_negative_ttl(db):
+    cache = UserCache(ttl=60, negative_ttl=0.05)
+    assert asyncio.run(cache.get(db, "sita")) is None
+    asyncio.run(db.users.insert_one({"username": "sita", "user_type": "farmer"}))
+
+    # Still negatively cached: the insert bypassed invalidate()
+    assert asyncio.run(cache.get(db, "sita")) is None
+    assert cache.stats()["negative_hits"] == 1
+
+    time.sleep(0.1)
+    assert asyncio.run(cache.get(db, "sita"))["user_type"] == "farmer"
+    assert asyncio.run(cache.get(db, "sita"))["user_type"] == "farmer"
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (2, 1)
+
+
+def test_registration_clears_a_cached_unknown_user(db, client):
+    token = create_access_token({"sub": "sita"}, timedelta(minutes=5))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.get_current_user(_bearer(token)))
+    assert error.value.status_code == 401
+    assert auth.user_cache.stats()["size"] == 1
+
+    response = client.post("/auth/register", json={
+        "username": "sita", "email": "sita@example.com", "full_name": "Sita Devi",
+        "password": "secret123", "user_type": "farmer", "state": "Bihar"
+    })
+    assert response.status_code == 200
+    assert asyncio.run(auth.get_current_user(_bearer(token)))["full_name"] == "Sita Devi"
+    assert auth.user_cache.stats()["invalidations"] == 1
+
+
+def test_profile_update_invalidates_the_cached_record(db, client):
+    asyncio.run(db.users.insert_one({"username": "ram", "full_name": "Ram", "user_type": "farmer"}))
+    token = create_access_token({"sub": "ram"}, timedelta(minutes=5))
+    assert asyncio.run(auth.get_current_user(_bearer(token)))["full_name"] == "Ram"
+
+    response = client.put("/auth/profile", params={"full_name": "Ram Kumar"},
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert asyncio.run(auth.get_current_user(_bearer(token)))["full_name"] == "Ram Kumar"
+    assert auth.user_cache.stats()["invalidations"] == 1
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.database import MockDatabase
+from app.utils.user_export import list_users
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Mock collections write their files to the working directory
+    monkeypatch.chdir(tmp_path)
+    database = MockDatabase()
+    asyncio.run(database.users.insert_many([{"username": f"user{i}"} for i in range(4)]))
+    return database
+
+
+def pages(db, limit):
+    result, after = [], None
+    while True:
+        rows, after = asyncio.run(list_users(db, limit, after))
+        result.append([row["username"] for row in rows])
+        if after is None:
+            return result
+
+
+def test_last_full_page_has_no_next_cursor(db):
+    assert pages(db, 2) == [["user0", "user1"], ["user2", "user3"]]
+    assert pages(db, 4) == [["user0", "user1", "user2", "user3"]]
+
+
+def test_partial_last_page(db):
+    assert pages(db, 3) == [["user0", "user1", "user2"], ["user3"]]
+    assert pages(db, None) == [["user0", "user1", "user2", "user3"]]
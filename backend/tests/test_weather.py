@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.weather import WeatherClient, WeatherUnavailable
+
+STUB_URL = "http://weather.stub"
+
+
+def payload(temp: float) -> dict:
+    return {"name": "Delhi", "main": {"temp": temp, "humidity": 40}, "weather": [{"description": "clear sky"}]}
+
+
+class Stub:
+    """Stands in for the provider at WEATHER_BASE_URL"""
+
+    def __init__(self):
+        self.calls = 0
+        self.temp = 30.0
+        self.failing = False
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await self.release.wait()
+        if self.failing:
+            return httpx.Response(503)
+        return httpx.Response(200, json=payload(self.temp))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv("WEATHER_BASE_URL", STUB_URL)
+    return Stub()
+
+
+def make_client(stub: Stub, **kwargs) -> WeatherClient:
+    return WeatherClient(base_url=STUB_URL, api_key="demo_key", transport=httpx.MockTransport(stub), **kwargs)
+
+
+def expire(client: WeatherClient):
+    """Age every cached reading past the fresh TTL, keeping it servable as stale"""
+    for key, (reading, fetched_at) in list(client.cache.items()):
+        client.cache[key] = (reading, fetched_at - client.ttl - 1)
+
+
+async def settle(client: WeatherClient):
+    await asyncio.gather(*client._inflight.values(), return_exceptions=True)
+
+
+def test_concurrent_misses_share_one_upstream_call(stub):
+    async def scenario():
+        client = make_client(stub)
+        assert client.enabled
+        stub.release.clear()
+        pending = [asyncio.create_task(client.get("Delhi")) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        stub.release.set()
+        results = await asyncio.gather(*pending)
+        await client.close()
+        return client, results
+
+    client, results = asyncio.run(scenario())
+    assert stub.calls == 1
+    assert client.stats["coalesced"] == 4
+    assert all(reading["temperature"] == 30 and not stale for reading, stale in results)
+
+
+def test_expired_reading_is_served_while_it_refreshes(stub):
+    async def scenario():
+        client = make_client(stub)
+        await client.get("Delhi")
+        expire(client)
+        stub.temp = 25.0
+        stale = await client.get("Delhi")
+        await settle(client)
+        fresh = await client.get("Delhi")
+        await client.close()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale == ({**stale[0], "temperature": 30}, True)
+    assert fresh[0]["temperature"] == 25 and not fresh[1]
+    assert stub.calls == 2
+
+
+def test_stale_reading_is_served_when_upstream_fails_and_retries_wait(stub):
+    async def scenario():
+        client = make_client(stub)
+        await client.get("Delhi")
+        expire(client)
+        stub.failing = True
+        first = await client.get("Delhi")
+        await settle(client)
+        # Cooling down: still stale, and upstream is left alone
+        second = await client.get("Delhi")
+        await settle(client)
+        with pytest.raises(WeatherUnavailable):
+            await client.get("Mumbai")
+        with pytest.raises(WeatherUnavailable):
+            await client.get("Mumbai")
+        await client.close()
+        return client, first, second
+
+    client, first, second = asyncio.run(scenario())
+    assert first[0]["temperature"] == second[0]["temperature"] == 30
+    assert first[1] and second[1]
+    assert stub.calls == 3
+    assert client.stats["upstream_errors"] == 2
+    assert client.stats["cooldown_skips"] == 2
+
+
+def test_failed_city_is_retried_after_the_cooldown(stub):
+    async def scenario():
+        client = make_client(stub, retry_after=0.05)
+        stub.failing = True
+        with pytest.raises(WeatherUnavailable):
+            await client.get("Delhi")
+        stub.failing = False
+        await asyncio.sleep(0.1)
+        reading, stale = await client.get("Delhi")
+        await client.close()
+        return reading, stale
+
+    reading, stale = asyncio.run(scenario())
+    assert reading["temperature"] == 30 and not stale
+    assert stub.calls == 2
@@ -0,0 +1,26 @@
+import asyncio
+import os
+from concurrent.futures import BrokenExecutor
+
+import pytest
+
+from app.utils.workers import BoundedExecutor
+
+
+def test_broken_process_pool_is_replaced():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=2, use_processes=True)
+
+    async def scenario():
+        with pytest.raises(BrokenExecutor):
+            await pool.run(os._exit, 1, timeout=30)
+        # The next call gets a fresh pool instead of failing forever
+        assert await pool.run(abs, -3, timeout=30) == 3
+
+    try:
+        asyncio.run(scenario())
+        metrics = pool.metrics()
+        assert metrics["failed"] == 1
+        assert metrics["completed"] == 1
+        assert metrics["in_flight"] == 0
+    finally:
+        pool.shutdown()